@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+So sánh recall và độ trễ của các index ANN (IVF-Flat, IVF-PQ, HNSW) với index flat
+trên vector của knowledge base hiện tại, dùng câu hỏi trong ViBidLQA làm truy vấn.
+
+Index IVF được train trên FAISS_TRAIN_SIZE vector lấy mẫu đều từ toàn corpus, giống lúc build
+(rebuild_kb.py lấy mẫu reservoir trên mọi batch). Train chỉ trên các file đầu tiên thì nhanh hơn
+nhưng centroid lệch về các văn bản đó, recall của các văn bản sau giảm rõ; đổi lại, lấy mẫu toàn
+corpus khiến lúc build phải ghi tạm toàn bộ vector đã embed ra đĩa và chỉ tạo index khi embed xong.
+
+Ví dụ:
+    python ann_report.py --limit 300 --k 5 --output ann_report.json
+"""
+
+import csv
+import json
+import time
+import argparse
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+import vector_index
+from legal_rag import LegalRAGSystem
+
+
+def load_questions(csv_path: str, limit: int) -> list:
+    with open(csv_path, "r", encoding="utf-8") as file:
+        questions = [row["question"] for row in csv.DictReader(file)]
+    return questions[:limit] if limit else questions
+
+
+def timed_search(index, queries: np.ndarray, k: int):
+    """Tìm từng câu một (giống lúc phục vụ) và trả về kết quả + độ trễ từng câu (ms)."""
+    results = np.empty((len(queries), k), dtype=np.int64)
+    latencies = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results[i] = ids[0]
+    return results, latencies
+
+
+def summarize(name: str, params: dict, results, latencies, baseline) -> dict:
+    k = baseline.shape[1]
+    recall = float(np.mean([len(set(r) & set(b)) / k for r, b in zip(results, baseline)]))
+    return {
+        "index": name,
+        "params": params,
+        "recall_at_k": recall,
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ANN recall-vs-latency report")
+    parser.add_argument("--questions", default="ViBidLQA/test.csv")
+    parser.add_argument("--limit", type=int, default=300, help="Số câu hỏi dùng để đo (0 = tất cả)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--types", default="ivf_flat,ivf_pq,hnsw")
+    parser.add_argument("--nprobe", default="1,4,16,64", help="Các giá trị nprobe cho IVF")
+    parser.add_argument("--ef-search", default="16,64,128", help="Các giá trị efSearch cho HNSW")
+    parser.add_argument("--output", default=None, help="Ghi báo cáo JSON ra file")
+    args = parser.parse_args()
+
+    load_dotenv()
+    rag = LegalRAGSystem()
+    if not rag.load_knowledge_base():
+        raise SystemExit("❌ Knowledge base chưa sẵn sàng. Chạy 'python rebuild_kb.py' trước.")
+
+    index = rag.vector_store.index
+    if not isinstance(index, faiss.IndexFlat):
+        raise SystemExit("❌ Cần knowledge base dùng index flat (FAISS_INDEX_TYPE=flat) để làm baseline.")
+    vectors = index.reconstruct_n(0, index.ntotal)
+    dim = vectors.shape[1]
+
+    questions = load_questions(args.questions, args.limit)
+    print(f"🔄 Embedding {len(questions)} câu hỏi...")
+    queries = np.asarray([rag.embeddings.embed_query(q) for q in questions], dtype=np.float32)
+
+    baseline, flat_latencies = timed_search(index, queries, args.k)
+    report = [summarize("flat", {}, baseline, flat_latencies, baseline)]
+
+    for index_type in [t.strip() for t in args.types.split(",") if t.strip()]:
+        settings = {**vector_index.index_settings(), "type": index_type}
+        sample = vectors[np.random.default_rng(0).permutation(len(vectors))[:settings["train_size"]]]
+        start = time.perf_counter()
+        ann_index = vector_index.create_index(settings, dim, sample)
+        ann_index.add(vectors)
+        build_seconds = time.perf_counter() - start
+
+        if index_type == "hnsw":
+            sweep = [("ef_search", int(v)) for v in args.ef_search.split(",")]
+        else:
+            sweep = [("nprobe", int(v)) for v in args.nprobe.split(",")]
+        for param, value in sweep:
+            settings[param] = value
+            vector_index.apply_search_params(ann_index, settings)
+            results, latencies = timed_search(ann_index, queries, args.k)
+            row = summarize(index_type, {param: value}, results, latencies, baseline)
+            row["build_seconds"] = build_seconds
+            report.append(row)
+
+    print(f"\n{'index':<10} {'params':<18} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for row in report:
+        params = ",".join(f"{k}={v}" for k, v in row["params"].items()) or "-"
+        print(f"{row['index']:<10} {params:<18} {row['recall_at_k']:>9.3f} "
+              f"{row['latency_ms_p50']:>8.3f} {row['latency_ms_p95']:>8.3f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"vectors": int(index.ntotal), "dim": int(dim), "queries": len(questions),
+                       "k": args.k, "results": report}, file, indent=2)
+        print(f"💾 Đã ghi báo cáo: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+API HTTP (ASGI) cho LegalRAGSystem, dùng cho client lập trình thay vì giao diện Streamlit.
+
+Các request đến gần như cùng lúc được gom thành micro-batch: câu hỏi được embed chung một lần
+gọi model và tìm trong FAISS bằng một lần search nhiều truy vấn; LLM vẫn được gọi riêng cho
+từng câu hỏi nên câu trả lời nhanh không phải chờ câu chậm.
+
+Chạy (một process để mọi request dùng chung một index):
+    python api_server.py --port 8000
+    uvicorn api_server:app --port 8000
+"""
+
+import os
+import time
+import asyncio
+import argparse
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel, Field
+
+from legal_rag import LegalRAGSystem, PreparedQuery
+
+# Giới hạn đầu vào: k lớn làm FAISS search, rerank và response phình theo; câu hỏi dài thì tốn embedding
+MAX_K = int(os.getenv("API_MAX_K", "50"))
+MAX_QUESTION_CHARS = int(os.getenv("API_MAX_QUESTION_CHARS", "2000"))
+
+
+class QueryRequest(BaseModel):
+    question: str = Field(min_length=1, max_length=MAX_QUESTION_CHARS)
+
+
+class RelatedRequest(BaseModel):
+    query: str = Field(min_length=1, max_length=MAX_QUESTION_CHARS)
+    k: int = Field(3, ge=1, le=MAX_K)
+
+
+class DebugRequest(BaseModel):
+    question: str = Field(min_length=1, max_length=MAX_QUESTION_CHARS)
+    k: int = Field(5, ge=1, le=MAX_K)
+
+
+class MicroBatcher:
+    """Gom các câu hỏi đến trong API_BATCH_WINDOW_MS (tối đa API_MAX_BATCH câu) thành một lần prepare_queries."""
+
+    def __init__(self, rag: LegalRAGSystem, window_ms: Optional[float] = None, max_batch: Optional[int] = None):
+        self.rag = rag
+        window_ms = window_ms if window_ms is not None else float(os.getenv("API_BATCH_WINDOW_MS", "5"))
+        self.window = window_ms / 1000
+        self.max_batch = max_batch or int(os.getenv("API_MAX_BATCH", "32"))
+        # Batch đang gom, theo (k, dùng cache câu trả lời hay không)
+        self._pending: Dict[Tuple[int, bool], List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple[int, bool], asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+        self.batches = 0
+        self.questions = 0
+
+    async def submit(self, question: str, k: int, use_answer_cache: bool = True) -> PreparedQuery:
+        loop = asyncio.get_running_loop()
+        key = (k, use_answer_cache)
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((question, future))
+        if len(batch) >= self.max_batch:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key: Tuple[int, bool]):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            task = asyncio.ensure_future(self._run(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Tuple[int, bool], batch: List[Tuple[str, asyncio.Future]]):
+        k, use_answer_cache = key
+        self.batches += 1
+        self.questions += len(batch)
+        try:
+            prepared = await asyncio.to_thread(
+                self.rag.prepare_queries, [question for question, _ in batch], k, use_answer_cache
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), item in zip(batch, prepared):
+            # Client có thể đã ngắt kết nối (future bị hủy)
+            if not future.done():
+                future.set_result(item)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "questions": self.questions,
+            "avg_batch_size": self.questions / self.batches if self.batches else 0.0,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+        }
+
+
+class LatencyStats:
+    """Số request, lỗi và phân vị độ trễ (trên API_STATS_WINDOW request gần nhất) theo từng endpoint."""
+
+    def __init__(self, window: Optional[int] = None):
+        self.window = window or int(os.getenv("API_STATS_WINDOW", "10000"))
+        self.started = time.time()
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, path: str, seconds: float, ok: bool):
+        self.counts[path] += 1
+        if not ok:
+            self.errors[path] += 1
+        self.latencies[path].append(seconds * 1000)
+
+    def summary(self) -> dict:
+        uptime = time.time() - self.started
+        endpoints = {}
+        for path, count in self.counts.items():
+            latencies = np.asarray(self.latencies[path])
+            endpoints[path] = {
+                "requests": count,
+                "errors": self.errors[path],
+                "throughput_rps": count / uptime if uptime else 0.0,
+                "latency_ms_p50": float(np.percentile(latencies, 50)),
+                "latency_ms_p95": float(np.percentile(latencies, 95)),
+                "latency_ms_p99": float(np.percentile(latencies, 99)),
+            }
+        return {"uptime_seconds": uptime, "endpoints": endpoints}
+
+
+def create_app(rag: Optional[LegalRAGSystem] = None) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        system = rag
+        if system is None:
+            load_dotenv()
+            system = LegalRAGSystem()
+            # Không build trong server: knowledge base phải được dựng trước bằng rebuild_kb.py
+            if not await asyncio.to_thread(system.load_knowledge_base):
+                raise RuntimeError("Knowledge base chưa sẵn sàng. Chạy 'python rebuild_kb.py' trước.")
+            # Client LLM được tạo lười; tạo trước để request đầu tiên không phải chờ import SDK
+            # (đồng thời kiểm tra số chiều của model embedding với index)
+            await asyncio.to_thread(system.warm_up)
+        app.state.rag = system
+        app.state.batcher = MicroBatcher(system)
+        app.state.stats = LatencyStats()
+        yield
+
+    app = FastAPI(title="Legal RAG API", lifespan=lifespan)
+
+    @app.middleware("http")
+    async def record_latency(request: Request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        if request.url.path in ("/query", "/related", "/debug"):
+            request.app.state.stats.record(request.url.path, time.perf_counter() - start, response.status_code < 400)
+        return response
+
+    def ready_system(request: Request) -> LegalRAGSystem:
+        system = request.app.state.rag
+        if not system.vector_store:
+            raise HTTPException(status_code=503, detail=LegalRAGSystem.NOT_READY_ANSWER)
+        return system
+
+    @app.post("/query")
+    async def query(body: QueryRequest, request: Request) -> dict:
+        system = ready_system(request)
+        try:
+            prepared = await request.app.state.batcher.submit(body.question, system.answer_k)
+            return await system.agenerate(prepared)
+        except Exception as e:
+            print(f"❌ Lỗi khi xử lý câu hỏi: {e}")
+            raise HTTPException(status_code=500, detail=f"Có lỗi xảy ra khi xử lý câu hỏi: {e}")
+
+    @app.post("/related")
+    async def related(body: RelatedRequest, request: Request) -> list:
+        system = ready_system(request)
+        prepared = await request.app.state.batcher.submit(body.query, body.k, use_answer_cache=False)
+        return system.related_articles_from(prepared.documents)
+
+    @app.post("/debug")
+    async def debug(body: DebugRequest, request: Request) -> dict:
+        system = ready_system(request)
+        prepared = await request.app.state.batcher.submit(body.question, body.k, use_answer_cache=False)
+        return system.debug_inputs_from(body.question, prepared.documents)
+
+    @app.get("/health")
+    async def health(request: Request) -> dict:
+        system = request.app.state.rag
+        return {"ready": bool(system.vector_store),
+                "vectors": system.vector_store.index.ntotal if system.vector_store else 0,
+                "bundle_id": system.bundle["bundle_id"] if system.bundle else None}
+
+    @app.get("/stats")
+    async def stats(request: Request) -> dict:
+        reranker = request.app.state.rag.reranker
+        return {**request.app.state.stats.summary(), "batching": request.app.state.batcher.stats(),
+                "reranker": reranker.stats() if reranker is not None else None}
+
+    return app
+
+
+app = create_app()
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Legal RAG HTTP API")
+    parser.add_argument("--host", default=os.getenv("API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8000")))
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
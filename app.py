@@ -2,6 +2,7 @@ import streamlit as st
 import os
 from dotenv import load_dotenv
 from legal_rag import LegalRAGSystem
+import kb_manifest
 
 # Load environment variables
 load_dotenv()
@@ -57,57 +58,84 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource(show_spinner="🔄 Đang khởi tạo hệ thống...")
+def get_shared_rag_system():
+    """Một LegalRAGSystem dùng chung cho mọi session của server (model embedding + FAISS chỉ load một lần)"""
+    print("🔄 Đang khởi tạo LegalRAGSystem...")
+    rag_system = LegalRAGSystem()
+    print("✅ LegalRAGSystem đã khởi tạo")
+
+    # Chỉ load knowledge base dựng sẵn (bundle); không build trong request vì có thể mất nhiều phút
+    print("🔄 Đang load knowledge base...")
+    if not rag_system.load_knowledge_base():
+        raise RuntimeError("Knowledge base chưa sẵn sàng hoặc không khớp cấu hình embedding. Chạy 'python rebuild_kb.py' trước.")
+    rag_system.warm_up()
+    return rag_system
+
 def initialize_rag_system():
-    """Khởi tạo RAG system"""
+    """Lấy RAG system dùng chung cho session hiện tại"""
     if 'rag_system' not in st.session_state:
-        with st.spinner("🔄 Đang khởi tạo hệ thống..."):
-            try:
-                # Kiểm tra API key trước
-                api_key = os.getenv("GOOGLE_API_KEY")
-                if not api_key:
-                    st.error("❌ Chưa cấu hình GOOGLE_API_KEY trong file .env")
-                    return None
-
-                print("🔄 Đang khởi tạo LegalRAGSystem...")
-                rag_system = LegalRAGSystem()
-                print("✅ LegalRAGSystem đã khởi tạo")
-                
-                # Thử load knowledge base đã có
-                print("🔄 Đang thử load knowledge base...")
-                if not rag_system.load_knowledge_base():
-                    st.warning("⚠️ Không tìm thấy knowledge base. Đang xây dựng mới...")
-                    
-                    # Kiểm tra thư mục data
-                    if not os.path.exists("data") or not os.listdir("data"):
-                        st.error("❌ Không tìm thấy file dữ liệu trong thư mục 'data'")
-                        return None
-                    
-                    # Thử xây dựng mới
-                    with st.spinner("🔄 Đang xây dựng knowledge base mới (có thể mất vài phút)..."):
-                        rag_system.build_knowledge_base()
-                        st.success("✅ Knowledge base đã được xây dựng thành công!")
-                else:
-                    st.success("✅ Đã load knowledge base thành công!")
-                
-                st.session_state.rag_system = rag_system
-                return rag_system
-                
-            except Exception as e:
-                st.error(f"❌ Lỗi khởi tạo hệ thống: {str(e)}")
-                st.error("Vui lòng kiểm tra:")
-                st.error("1. API key Google AI đã được cấu hình đúng")
-                st.error("2. Các thư viện đã được cài đặt đầy đủ")
-                st.error("3. File dữ liệu có tồn tại trong thư mục 'data'")
-                
-                # Hiển thị chi tiết lỗi nếu ở chế độ debug
-                if st.checkbox("Hiển thị chi tiết lỗi"):
-                    import traceback
-                    st.code(traceback.format_exc())
-                
+        try:
+            # Kiểm tra API key trước
+            api_key = os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                st.error("❌ Chưa cấu hình GOOGLE_API_KEY trong file .env")
                 return None
+
+            st.session_state.rag_system = get_shared_rag_system()
+            st.success("✅ Đã load knowledge base thành công!")
+        except Exception as e:
+            st.error(f"❌ Lỗi khởi tạo hệ thống: {str(e)}")
+            st.error("Vui lòng kiểm tra:")
+            st.error("1. API key Google AI đã được cấu hình đúng")
+            st.error("2. Các thư viện đã được cài đặt đầy đủ")
+            st.error("3. Knowledge base đã được dựng sẵn bằng 'python rebuild_kb.py' với cùng model embedding")
+            
+            # Hiển thị chi tiết lỗi nếu ở chế độ debug
+            if st.checkbox("Hiển thị chi tiết lỗi"):
+                import traceback
+                st.code(traceback.format_exc())
+            
+            return None
     
     return st.session_state.rag_system
 
+def render_sources(sources):
+    """Hiển thị danh sách nguồn tham khảo"""
+    if sources:
+        with st.expander("📚 Nguồn tham khảo"):
+            for i, source in enumerate(sources):
+                st.markdown(f"""
+                <div class="source-box">
+                    <strong>Nguồn {i+1}:</strong> {source['source']}<br>
+                    <small>{source['content']}</small>
+                </div>
+                """, unsafe_allow_html=True)
+
+def stream_response(rag_system, question):
+    """Hiển thị nguồn ngay khi tìm kiếm xong, sau đó hiện câu trả lời dần theo từng token"""
+    answer_placeholder = st.empty()
+    sources_container = st.container()
+    answer_placeholder.markdown("🔎 Đang tìm kiếm thông tin...")
+
+    response = {"answer": "", "sources": []}
+    answer = ""
+    for event in rag_system.stream_query(question):
+        if event["type"] == "sources":
+            response["sources"] = event["sources"]
+            with sources_container:
+                render_sources(event["sources"])
+        elif event["type"] == "token":
+            answer += event["content"]
+            answer_placeholder.markdown(answer + "▌")
+        elif event["type"] == "done":
+            response = {"answer": event["answer"], "sources": event["sources"]}
+        elif event["type"] == "error":
+            response = {"answer": event["content"], "sources": response["sources"]}
+
+    answer_placeholder.markdown(response["answer"])
+    return response
+
 def main():
     # Header
     st.markdown("""
@@ -140,11 +168,10 @@ def main():
         if st.button("📋 Kiểm tra dữ liệu", type="secondary"):
             data_folder = "data"
             if os.path.exists(data_folder):
-                files = os.listdir(data_folder)
+                files = kb_manifest.list_data_files(data_folder)
                 if files:
                     st.success(f"Tìm thấy {len(files)} file:")
-                    for file in files:
-                        file_path = os.path.join(data_folder, file)
+                    for file, file_path in files.items():
                         file_size = os.path.getsize(file_path) / 1024  # KB
                         st.info(f"📄 {file} ({file_size:.1f} KB)")
                 else:
@@ -152,18 +179,20 @@ def main():
             else:
                 st.error("Không tìm thấy thư mục data")
         
-        if st.button("🔄 Xây dựng lại Knowledge Base", type="primary"):
+        # Mặc định giao diện chỉ đọc knowledge base; ALLOW_UI_REBUILD=1 để bật nút cập nhật (chỉ dùng khi chạy một máy)
+        allow_rebuild = os.getenv("ALLOW_UI_REBUILD", "0") == "1"
+        if not allow_rebuild:
+            st.caption("Knowledge base chỉ đọc. Cập nhật bằng 'python rebuild_kb.py' rồi khởi động lại.")
+        elif st.button("🔄 Xây dựng lại Knowledge Base", type="primary"):
             if 'rag_system' in st.session_state:
-                with st.spinner("Đang xóa knowledge base cũ và xây dựng mới..."):
+                with st.spinner("Đang cập nhật knowledge base (chỉ các file thay đổi)..."):
                     try:
-                        # Xóa vectorstore cũ
-                        import shutil
-                        if os.path.exists("vectorstore"):
-                            shutil.rmtree("vectorstore")
-                            st.info("✅ Đã xóa knowledge base cũ")
-                        
-                        # Xây dựng mới
-                        st.session_state.rag_system.build_knowledge_base()
+                        # Đồng bộ tăng dần: chỉ embed file mới/thay đổi, xóa vector của file đã xóa
+                        summary = st.session_state.rag_system.sync_knowledge_base()
+                        st.info(
+                            f"✅ {len(summary['added'])} file mới, {len(summary['updated'])} file thay đổi, "
+                            f"{len(summary['removed'])} file đã xóa, {len(summary['unchanged'])} file không đổi"
+                        )
                         st.success("✅ Knowledge base đã được xây dựng lại thành công!")
                         
                         # Test với câu hỏi đơn giản
@@ -237,15 +266,7 @@ def main():
             st.markdown(message["content"])
             
             # Hiển thị nguồn tham khảo nếu có
-            if "sources" in message and message["sources"]:
-                with st.expander("📚 Nguồn tham khảo"):
-                    for i, source in enumerate(message["sources"]):
-                        st.markdown(f"""
-                        <div class="source-box">
-                            <strong>Nguồn {i+1}:</strong> {source['source']}<br>
-                            <small>{source['content']}</small>
-                        </div>
-                        """, unsafe_allow_html=True)
+            render_sources(message.get("sources"))
 
     # Chat input
     if prompt := st.chat_input("Nhập câu hỏi pháp luật của bạn..."):
@@ -256,23 +277,9 @@ def main():
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Generate assistant response
+        # Generate assistant response (stream: nguồn trước, câu trả lời hiện dần)
         with st.chat_message("assistant"):
-            with st.spinner("Đang tìm kiếm thông tin..."):
-                response = rag_system.query(prompt)
-                
-                st.markdown(response["answer"])
-                
-                # Hiển thị nguồn tham khảo
-                if response["sources"]:
-                    with st.expander("📚 Nguồn tham khảo"):
-                        for i, source in enumerate(response["sources"]):
-                            st.markdown(f"""
-                            <div class="source-box">
-                                <strong>Nguồn {i+1}:</strong> {source['source']}<br>
-                                <small>{source['content']}</small>
-                            </div>
-                            """, unsafe_allow_html=True)
+            response = stream_response(rag_system, prompt)
         
         # Add assistant response to chat history
         st.session_state.messages.append({
@@ -307,8 +314,8 @@ def main():
         # Add to chat
         st.session_state.messages.append({"role": "user", "content": question})
         
-        with st.spinner("Đang tìm kiếm thông tin..."):
-            response = rag_system.query(question)
+        with st.chat_message("assistant"):
+            response = stream_response(rag_system, question)
             st.session_state.messages.append({
                 "role": "assistant",
                 "content": response["answer"],
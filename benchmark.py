@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Benchmark hiệu năng: trích xuất, chia chunk, embed, tìm kiếm FAISS và truy vấn end-to-end.
+
+Chạy trên corpus giả do synthetic_corpus.py sinh ra (cùng --seed → cùng corpus), với LLM giả
+(LLM_PROVIDER=fake) và tắt mọi cache (extraction, embedding, câu trả lời), nên kết quả giữa các
+commit so sánh được với nhau. Kết quả là một file JSON; --baseline so với một báo cáo cũ và trả mã
+lỗi nếu chỉ số nào tệ hơn quá --tolerance.
+
+Các phần đo (--sections):
+    extraction   trang/giây của read_pdf theo từng extractor (PyMuPDF, pdfplumber, PyPDF2), tốc độ
+                 raster hóa trang và OCR trên PDF chỉ có ảnh (bỏ qua nếu chưa cài Tesseract)
+    processing   chunk/giây của process_documents theo định dạng (txt, docx, pdf)
+    embedding    text/giây của embed_documents và độ trễ embed_query
+    faiss        độ trễ p50/p95/p99 và QPS của index.search ở nhiều kích thước corpus (vector ngẫu nhiên)
+    query        thời gian build knowledge base từ corpus, độ trễ query() và time-to-first-token
+
+Ví dụ:
+    python benchmark.py --output bench.json
+    python benchmark.py --sections faiss --sizes 10000,100000,1000000
+    python benchmark.py --corpus bench_data --baseline bench_main.json --tolerance 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+
+SECTIONS = ("extraction", "processing", "embedding", "faiss", "query")
+
+
+def latency_summary(latencies_ms: list) -> dict:
+    return {
+        "p50": float(np.percentile(latencies_ms, 50)),
+        "p95": float(np.percentile(latencies_ms, 95)),
+        "p99": float(np.percentile(latencies_ms, 99)),
+        "mean": float(np.mean(latencies_ms)),
+    }
+
+
+def _pdf_files(folder: str) -> list:
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".pdf"))
+
+
+def bench_extraction(corpus: str, ocr_pages: int) -> dict:
+    from document_processor import LegalDocumentProcessor, _render_page_fitz
+    import fitz
+
+    processor = LegalDocumentProcessor(extraction_cache=None)
+    text_pdfs = _pdf_files(os.path.join(corpus, "text", "pdf"))
+    extractors = {
+        # Đường chính: PyMuPDF + phân loại trang (text / image / garbled / blank)
+        "pymupdf": lambda path: processor.read_pdf(path, return_pages=True)[1],
+        "pdfplumber": lambda path: list(LegalDocumentProcessor._plumber_pages(path, 0)),
+        "pypdf2": lambda path: list(LegalDocumentProcessor._pypdf2_pages(path, 0)),
+    }
+    results = {}
+    for name, extract in extractors.items():
+        try:
+            start = time.perf_counter()
+            pages = sum(len(extract(path)) for path in text_pdfs)
+            seconds = time.perf_counter() - start
+            results[name] = {"pages": pages, "seconds": seconds, "pages_per_sec": pages / seconds}
+        except Exception as e:
+            results[name] = {"skipped": str(e)}
+
+    scanned = _pdf_files(os.path.join(corpus, "scanned"))
+    dpi = int(os.getenv("PDF_OCR_DPI", "300"))
+    rendered, start = 0, time.perf_counter()
+    for path in scanned:
+        doc = fitz.open(path)
+        for idx in range(min(len(doc), ocr_pages - rendered)):
+            _render_page_fitz(doc, idx, dpi)
+            rendered += 1
+        doc.close()
+        if rendered >= ocr_pages:
+            break
+    seconds = time.perf_counter() - start
+    results["ocr_render"] = {"pages": rendered, "dpi": dpi, "seconds": seconds,
+                             "pages_per_sec": rendered / seconds if seconds else 0.0}
+
+    try:
+        import pytesseract
+
+        if os.getenv("TESSERACT_CMD"):
+            pytesseract.pytesseract.tesseract_cmd = os.environ["TESSERACT_CMD"]
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        results["ocr"] = {"skipped": f"Tesseract not available: {e}"}
+        return results
+    # OCR cả file (adaptive gate + song song theo PDF_OCR_WORKERS) cho tới khi đủ ocr_pages trang
+    pages = failed = 0
+    start = time.perf_counter()
+    for path in scanned:
+        pages += len(processor.read_pdf(path, return_pages=True)[1])
+        failed += len(processor.last_failed_pages)
+        if pages >= ocr_pages:
+            break
+    seconds = time.perf_counter() - start
+    results["ocr"] = {"pages": pages, "failed_pages": failed, "workers": processor.ocr_workers,
+                      "seconds": seconds, "pages_per_sec": pages / seconds}
+    return results
+
+
+def bench_processing(corpus: str) -> tuple:
+    """chunk/giây của process_documents cho từng định dạng; trả về (kết quả, text các chunk)."""
+    from document_processor import LegalDocumentProcessor
+
+    processor = LegalDocumentProcessor(extraction_cache=None)
+    results, texts = {}, []
+    for fmt in ("txt", "docx", "pdf"):
+        folder = os.path.join(corpus, "text", fmt)
+        if not os.path.isdir(folder):
+            continue
+        start = time.perf_counter()
+        documents = processor.process_documents(folder)
+        seconds = time.perf_counter() - start
+        chars = sum(len(doc.page_content) for doc in documents)
+        results[fmt] = {"files": len(os.listdir(folder)), "chunks": len(documents), "seconds": seconds,
+                        "chunks_per_sec": len(documents) / seconds, "chars_per_sec": chars / seconds}
+        texts.extend(doc.page_content for doc in documents)
+    return results, texts
+
+
+def bench_embedding(embeddings, texts: list, limit: int, queries: list) -> dict:
+    texts = texts[:limit]
+    batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    embeddings.embed_documents(texts[:1])  # load model
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        embeddings.embed_documents(texts[i:i + batch_size])
+    seconds = time.perf_counter() - start
+    latencies = []
+    for query in queries:
+        start_query = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append((time.perf_counter() - start_query) * 1000)
+    return {
+        "texts": len(texts),
+        "batch_size": batch_size,
+        "seconds": seconds,
+        "texts_per_sec": len(texts) / seconds,
+        "chars_per_sec": sum(len(text) for text in texts) / seconds,
+        "query_latency_ms": latency_summary(latencies),
+    }
+
+
+def bench_faiss(dim: int, sizes: list, queries: int, k: int, seed: int) -> dict:
+    import vector_index
+
+    settings = vector_index.index_settings()
+    rng = np.random.default_rng(seed)
+    results = {}
+    for size in sizes:
+        vectors = rng.standard_normal((size, dim), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        start = time.perf_counter()
+        train = vector_index.training_size(settings)
+        sample = vectors[rng.choice(size, min(size, train), replace=False)] if train else None
+        index = vector_index.create_index(settings, dim, sample)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+
+        # Truy vấn là vector của corpus cộng nhiễu, để có hàng xóm gần như truy vấn thật
+        query_vectors = vectors[rng.choice(size, queries)] + rng.normal(0, 0.05, (queries, dim)).astype(np.float32)
+        query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        latencies = []
+        for query in query_vectors:
+            start = time.perf_counter()
+            index.search(query.reshape(1, -1), k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        index.search(query_vectors, k)
+        batch_seconds = time.perf_counter() - start
+        results[str(size)] = {"index": settings["type"], "dim": dim, "k": k, "build_seconds": build_seconds,
+                              "latency_ms": latency_summary(latencies), "batch_qps": queries / batch_seconds}
+        del index, vectors
+    return results
+
+
+def bench_query(corpus: str, workdir: str, questions: list) -> dict:
+    from legal_rag import LegalRAGSystem
+
+    # Index chỉ được ghi trong workdir
+    rag = LegalRAGSystem(vectorstore_path=os.path.join(workdir, "vectorstore"))
+    start = time.perf_counter()
+    rag.build_knowledge_base(os.path.join(corpus, "text"))
+    build_seconds = time.perf_counter() - start
+    rag.warm_up()
+
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        result = rag.query(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if result["answer"].startswith("Có lỗi xảy ra"):
+            raise RuntimeError(result["answer"])
+
+    first_token = []
+    for question in questions:
+        start = time.perf_counter()
+        for event in rag.stream_query(question):
+            if event["type"] == "token":
+                first_token.append((time.perf_counter() - start) * 1000)
+                break
+    return {
+        "vectors": rag.vector_store.index.ntotal,
+        "build_seconds": build_seconds,
+        "build_chunks_per_sec": rag.vector_store.index.ntotal / build_seconds,
+        "questions": len(questions),
+        "latency_ms": latency_summary(latencies),
+        "time_to_first_token_ms": latency_summary(first_token),
+    }
+
+
+def _flatten(report: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Chỉ số tệ hơn baseline quá tolerance: throughput (*_per_sec, *_qps) giảm hoặc độ trễ p50/p95/p99 tăng."""
+    current, previous = _flatten(report["results"]), _flatten(baseline["results"])
+    regressions = []
+    for key in sorted(set(current) & set(previous)):
+        old, new = previous[key], current[key]
+        if old <= 0:
+            continue
+        if key.endswith(("_per_sec", "_qps")):
+            change = (old - new) / old
+        elif "latency_ms" in key or "first_token_ms" in key:
+            if not key.endswith((".p50", ".p95", ".p99")):
+                continue
+            change = (new - old) / old
+        else:
+            continue
+        if change > tolerance:
+            regressions.append({"metric": key, "baseline": old, "current": new, "worse_by": change})
+    return regressions
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, retrieval and end-to-end query latency")
+    parser.add_argument("--sections", default=",".join(SECTIONS))
+    parser.add_argument("--corpus", default=None, help="Corpus đã sinh sẵn (mặc định sinh vào thư mục tạm)")
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--articles", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ocr-pages", type=int, default=10, help="Số trang PDF ảnh dùng để đo raster hóa/OCR")
+    parser.add_argument("--embed-limit", type=int, default=512, help="Số chunk tối đa dùng để đo embed")
+    parser.add_argument("--sizes", default="10000,50000,100000", help="Các kích thước corpus cho FAISS")
+    parser.add_argument("--dim", type=int, default=None, help="Số chiều vector cho FAISS (mặc định theo model embedding)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", default=None, help="Báo cáo cũ để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Mức tệ hơn tối đa cho phép so với baseline")
+    args = parser.parse_args()
+    sections = [name for name in args.sections.split(",") if name]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        raise SystemExit(f"❌ Không có phần đo: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="legal_bench_")
+    # Kết quả phải so sánh được giữa các lần chạy: LLM giả, không cache nào được dùng lại;
+    # thư mục cache (nếu có gì bật lại) cũng nằm trong workdir chứ không phải thư mục hiện tại
+    os.environ.update({"LLM_PROVIDER": "fake", "EXTRACTION_CACHE": "0", "EMBEDDING_CACHE": "0", "ANSWER_CACHE": "0",
+                       "EXTRACTION_CACHE_DIR": os.path.join(workdir, "cache", "extraction"),
+                       "EMBEDDING_CACHE_DIR": os.path.join(workdir, "cache", "embeddings")})
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    try:
+        corpus = args.corpus
+        corpus_stats = None
+        # FAISS dùng vector ngẫu nhiên, không cần corpus
+        needs_corpus = set(sections) - {"faiss"}
+        if needs_corpus and (corpus is None or not os.path.isdir(corpus)):
+            from synthetic_corpus import generate_corpus
+
+            corpus = corpus or os.path.join(workdir, "corpus")
+            print(f"🔄 Đang sinh corpus giả ({args.docs} văn bản, seed {args.seed})...")
+            corpus_stats = generate_corpus(corpus, args.docs, args.articles, args.seed)
+
+        from synthetic_corpus import generate_questions
+
+        results, texts, embeddings = {}, None, None
+        questions = generate_questions(args.queries, args.docs, args.articles, args.seed)
+        if "extraction" in sections:
+            print("⏱️ Trích xuất PDF...")
+            results["extraction"] = bench_extraction(corpus, args.ocr_pages)
+        if "processing" in sections or "embedding" in sections:
+            print("⏱️ process_documents...")
+            processing, texts = bench_processing(corpus)
+            if "processing" in sections:
+                results["processing"] = processing
+        if "embedding" in sections or ("faiss" in sections and args.dim is None):
+            from legal_rag import LegalRAGSystem
+
+            embeddings = LegalRAGSystem().embeddings
+        if "embedding" in sections:
+            print("⏱️ Embedding...")
+            results["embedding"] = bench_embedding(embeddings, texts, args.embed_limit, questions[:50])
+        if "faiss" in sections:
+            dim = args.dim or len(embeddings.embed_query("Điều 1"))
+            print(f"⏱️ FAISS search ({dim} chiều)...")
+            results["faiss"] = bench_faiss(dim, [int(size) for size in args.sizes.split(",")], args.queries, args.k, args.seed)
+        if "query" in sections:
+            print("⏱️ Truy vấn end-to-end (LLM giả)...")
+            results["query"] = bench_query(corpus, workdir, questions)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {name: os.getenv(name) for name in (
+                "EMBEDDING_PROVIDER", "EMBEDDING_MODEL", "FAISS_INDEX_TYPE", "CHUNKER", "PDF_OCR_WORKERS",
+                "PDF_OCR_DPI", "INGEST_FILE_WORKERS", "EMBEDDING_BATCH_SIZE", "HYBRID_SEARCH", "RERANKER",
+                "FAKE_LLM_TOKEN_MS", "FAKE_LLM_FIRST_TOKEN_MS") if os.getenv(name) is not None},
+            "args": vars(args),
+            "corpus": corpus_stats,
+        },
+        "results": results,
+    }
+    print(json.dumps(report["results"], indent=2, ensure_ascii=False))
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    print(f"💾 Đã ghi báo cáo: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.tolerance)
+        for item in regressions:
+            print(f"❌ {item['metric']}: {item['baseline']:.2f} → {item['current']:.2f} (tệ hơn {item['worse_by']:.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"✅ Không có chỉ số nào tệ hơn baseline ({baseline['meta'].get('commit')}) quá {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import mmap
+import pickle
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+# Chunk store dạng cột thay cho index.pkl: text và metadata (JSON gọn) của từng chunk nằm nối tiếp
+# trong hai file nhị phân được mmap, bảng offset (n+1, 2) chỉ ra vị trí của chunk thứ i (theo thứ tự
+# vector trong index.faiss); id của chunk nằm trong một danh sách JSON riêng.
+# Mỗi lần ghi tạo một thế hệ mới (chunks_text.3.bin...) và chuyển CURRENT_FILE sang đó, nên không
+# bao giờ ghi đè file mà docstore đang phục vụ còn mmap (Windows không cho thay file đang được map)
+TEXT_FILE = "chunks_text.bin"
+META_FILE = "chunks_meta.bin"
+OFFSETS_FILE = "chunks_offsets.npy"
+IDS_FILE = "chunks_ids.json"
+CURRENT_FILE = "chunks_current.json"
+LEGACY_FILE = "index.pkl"
+_CHUNK_FILES = {"text": TEXT_FILE, "meta": META_FILE, "offsets": OFFSETS_FILE, "ids": IDS_FILE}
+
+
+def _generation_files(generation: int) -> Dict[str, str]:
+    return {role: f"{os.path.splitext(name)[0]}.{generation}{os.path.splitext(name)[1]}"
+            for role, name in _CHUNK_FILES.items()}
+
+
+def current_generation(folder: str) -> Optional[int]:
+    path = os.path.join(folder, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)["generation"]
+
+
+def chunk_files(folder: str) -> Dict[str, str]:
+    """Tên các file của chunk store đang dùng (text, meta, offsets, ids); store cũ chưa có
+    CURRENT_FILE dùng tên không đánh số."""
+    generation = current_generation(folder)
+    return _generation_files(generation) if generation is not None else dict(_CHUNK_FILES)
+
+
+class MmapDocstore(Docstore, AddableMixin):
+    """Docstore đọc lười từ chunk store đã mmap: Document chỉ được tạo khi được tra tới.
+
+    Chunk thêm vào sau khi load (sync) nằm trong một dict phụ, chunk bị xóa được đánh dấu; cả hai
+    được ghi gộp vào file mới ở lần save_store tiếp theo.
+    """
+
+    def __init__(self, folder: str):
+        files = chunk_files(folder)
+        with open(os.path.join(folder, files["ids"]), "r", encoding="utf-8") as file:
+            self.ids: List[str] = json.load(file)
+        self.rows: Dict[str, int] = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.offsets = np.load(os.path.join(folder, files["offsets"]), mmap_mode="r")
+        self._text = self._map(os.path.join(folder, files["text"]))
+        self._meta = self._map(os.path.join(folder, files["meta"]))
+        self._added: Dict[str, Document] = {}
+        self._deleted: set = set()
+
+    @staticmethod
+    def _map(path: str):
+        with open(path, "rb") as file:
+            # mmap không nhận file rỗng
+            if os.fstat(file.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.rows) - len(self._deleted) + len(self._added)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._added or (doc_id in self.rows and doc_id not in self._deleted)
+
+    def _row(self, row: int) -> Tuple[str, dict]:
+        text_start, meta_start = self.offsets[row]
+        text_end, meta_end = self.offsets[row + 1]
+        return (self._text[text_start:text_end].decode("utf-8"),
+                json.loads(self._meta[meta_start:meta_end].decode("utf-8")))
+
+    def search(self, search: str) -> Union[str, Document]:
+        document = self._added.get(search)
+        if document is not None:
+            return document
+        if search not in self.rows or search in self._deleted:
+            return f"ID {search} not found."
+        text, metadata = self._row(self.rows[search])
+        return Document(id=search, page_content=text, metadata=metadata)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = [doc_id for doc_id in texts if doc_id in self]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {set(overlapping)}")
+        for doc_id, document in texts.items():
+            # Id đã xóa rồi thêm lại thì bản mới nằm trong _added
+            self._added[doc_id] = document
+
+    def delete(self, ids: List) -> None:
+        if not any(doc_id in self for doc_id in ids):
+            raise ValueError(f"Tried to delete ids that does not  exist: {ids}")
+        for doc_id in ids:
+            if self._added.pop(doc_id, None) is None and doc_id in self.rows:
+                self._deleted.add(doc_id)
+
+
+def has_chunk_store(folder: str) -> bool:
+    return all(os.path.exists(os.path.join(folder, name)) for name in chunk_files(folder).values())
+
+
+def write_chunks(folder: str, chunks: Iterator[Tuple[str, str, dict]]):
+    """Ghi (id, text, metadata) theo thứ tự vector ra một thế hệ chunk store mới.
+
+    Các file của thế hệ mới được ghi xong rồi mới đổi CURRENT_FILE (nguyên tử), nên bên đọc luôn
+    thấy trọn một thế hệ; docstore đang mmap thế hệ cũ vẫn đọc tiếp được cho tới khi được thay.
+    """
+    generation = (current_generation(folder) or 0) + 1
+    files = _generation_files(generation)
+    ids, offsets = [], [(0, 0)]
+    text_tmp = os.path.join(folder, files["text"] + ".tmp")
+    meta_tmp = os.path.join(folder, files["meta"] + ".tmp")
+    with open(text_tmp, "wb") as text_file, open(meta_tmp, "wb") as meta_file:
+        text_end = meta_end = 0
+        for doc_id, text, metadata in chunks:
+            text_end += text_file.write(text.encode("utf-8"))
+            meta_end += meta_file.write(json.dumps(metadata, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            ids.append(doc_id)
+            offsets.append((text_end, meta_end))
+    offsets_tmp = os.path.join(folder, files["offsets"] + ".tmp")
+    with open(offsets_tmp, "wb") as file:
+        np.save(file, np.asarray(offsets, dtype=np.int64))
+    ids_tmp = os.path.join(folder, files["ids"] + ".tmp")
+    with open(ids_tmp, "w", encoding="utf-8") as file:
+        json.dump(ids, file, separators=(",", ":"))
+    # Tên file của thế hệ mới chưa được ai mmap nên thay được trên mọi hệ điều hành
+    for tmp, role in ((text_tmp, "text"), (meta_tmp, "meta"), (offsets_tmp, "offsets"), (ids_tmp, "ids")):
+        os.replace(tmp, os.path.join(folder, files[role]))
+    current_tmp = os.path.join(folder, CURRENT_FILE + ".tmp")
+    with open(current_tmp, "w", encoding="utf-8") as file:
+        json.dump({"generation": generation}, file)
+    os.replace(current_tmp, os.path.join(folder, CURRENT_FILE))
+    _remove_old_generations(folder, files)
+
+
+def _remove_old_generations(folder: str, current: Dict[str, str]):
+    patterns = [re.compile(rf"{re.escape(os.path.splitext(name)[0])}(\.\d+)?{re.escape(os.path.splitext(name)[1])}")
+                for name in _CHUNK_FILES.values()]
+    for name in os.listdir(folder):
+        if name in current.values() or not any(pattern.fullmatch(name) for pattern in patterns):
+            continue
+        try:
+            os.remove(os.path.join(folder, name))
+        except OSError:
+            # Trên Windows file còn được docstore cũ mmap thì chưa xóa được; lần ghi sau sẽ dọn
+            pass
+
+
+def _iter_chunks(docstore, index_to_docstore_id: dict) -> Iterator[Tuple[str, str, dict]]:
+    for position in sorted(index_to_docstore_id):
+        doc_id = index_to_docstore_id[position]
+        document = docstore.search(doc_id)
+        yield doc_id, document.page_content, document.metadata
+
+
+def save_store(vector_store: FAISS, folder: str):
+    """Thay cho FAISS.save_local: ghi index.faiss + chunk store, rồi chuyển store sang đọc lười từ file.
+
+    index.pkl cũ (nếu có) bị xóa để load_store không đọc nhầm bản đã lỗi thời.
+    """
+    os.makedirs(folder, exist_ok=True)
+    index_tmp = os.path.join(folder, "index.faiss.tmp")
+    faiss.write_index(vector_store.index, index_tmp)
+    write_chunks(folder, _iter_chunks(vector_store.docstore, vector_store.index_to_docstore_id))
+    os.replace(index_tmp, os.path.join(folder, "index.faiss"))
+    legacy = os.path.join(folder, LEGACY_FILE)
+    if os.path.exists(legacy):
+        os.remove(legacy)
+    # Docstore mới có cùng nội dung nên thay trực tiếp được, kể cả khi truy vấn đang chạy
+    vector_store.docstore = MmapDocstore(folder)
+
+
+def load_store(folder: str, embeddings) -> FAISS:
+    """Load index.faiss + chunk store (không unpickle); chỉ vector được nạp vào RAM."""
+    index = faiss.read_index(os.path.join(folder, "index.faiss"))
+    docstore = MmapDocstore(folder)
+    if len(docstore.ids) != index.ntotal:
+        raise ValueError(f"Chunk store has {len(docstore.ids)} chunks but index.faiss has {index.ntotal} vectors.")
+    return FAISS(embeddings, index, docstore, dict(enumerate(docstore.ids)))
+
+
+def convert_legacy(folder: str, remove_pickle: bool = False) -> int:
+    """Chuyển index.pkl (pickle của LangChain) sang chunk store; trả về số chunk đã ghi."""
+    with open(os.path.join(folder, LEGACY_FILE), "rb") as file:
+        docstore, index_to_docstore_id = pickle.load(file)
+    write_chunks(folder, _iter_chunks(docstore, index_to_docstore_id))
+    if remove_pickle:
+        os.remove(os.path.join(folder, LEGACY_FILE))
+    return len(index_to_docstore_id)
@@ -0,0 +1,142 @@
+import os
+import math
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+# Ngân sách token cho phần văn bản tham khảo trong prompt, theo provider LLM. Ollama mặc định chỉ có
+# num_ctx = 2048 token cho cả prompt lẫn câu trả lời, vượt quá thì đầu prompt bị cắt mất âm thầm
+DEFAULT_TOKEN_BUDGETS = {"google": 4000, "ollama": 1200, "fake": 4000}
+# Hai chunk cùng file cách nhau không quá số ký tự này (khoảng trắng bị strip) được coi là liền kề
+_MERGE_GAP = 3
+# Phần còn lại của ngân sách nhỏ hơn mức này thì không cắt thêm một khối dở dang vào prompt
+_MIN_PARTIAL_TOKENS = 100
+
+
+def token_budget(llm_provider: str) -> int:
+    """CONTEXT_TOKEN_BUDGET nếu có, không thì mặc định của provider (0 = không giới hạn)."""
+    override = os.getenv("CONTEXT_TOKEN_BUDGET")
+    if override:
+        return int(override)
+    return DEFAULT_TOKEN_BUDGETS.get(llm_provider, DEFAULT_TOKEN_BUDGETS["google"])
+
+
+def estimate_tokens(text: str, chars_per_token: float) -> int:
+    # Ước lượng theo số ký tự, không cần tokenizer của từng model (tiếng Việt có dấu khoảng 3 ký tự/token)
+    return math.ceil(len(text) / chars_per_token)
+
+
+def _offsets(doc) -> Optional[tuple]:
+    start, end = doc.metadata.get("start_offset"), doc.metadata.get("end_offset")
+    if isinstance(start, int) and isinstance(end, int) and end > start:
+        return start, end
+    return None
+
+
+def _content(doc) -> str:
+    """Nội dung gốc của chunk, bỏ dòng tiêu đề điều được lặp lại ở đầu (prefix_chars)."""
+    return doc.page_content[doc.metadata.get("prefix_chars", 0):]
+
+
+class _Block:
+    """Đoạn liên tục của một file, ghép từ các chunk chồng lấn hoặc liền kề."""
+
+    def __init__(self, doc, rank: int):
+        self.docs = [doc]
+        self.rank = rank
+        self.text = doc.page_content
+        span = _offsets(doc)
+        self.start, self.end = span if span else (None, None)
+
+    def extend(self, doc, rank: int) -> bool:
+        """Nối doc vào khối nếu chồng lấn/liền kề; trả về False nếu doc nằm tách rời."""
+        span = _offsets(doc)
+        if span is None or self.end is None or span[0] > self.end + _MERGE_GAP:
+            return False
+        self.docs.append(doc)
+        self.rank = min(self.rank, rank)
+        if span[1] <= self.end:
+            # Nằm trọn trong khối (ví dụ chunk overlap hoặc chunk đã được mở rộng thành cả điều)
+            return True
+        content = _content(doc)
+        overlap = self.end - span[0]
+        if overlap > 0 and self.text.endswith(content[:overlap]):
+            # Bỏ phần overlap (200 ký tự của splitter) đã có ở cuối khối
+            self.text += content[overlap:]
+        else:
+            # Liền kề: khoảng trống bị strip giữa hai chunk thường là xuống dòng (2 ký tự trở lên là ngắt đoạn)
+            self.text += ("\n\n" if -overlap >= 2 else "\n") + content.lstrip()
+        self.end = span[1]
+        return True
+
+    def document(self, text: Optional[str] = None):
+        first = self.docs[0]
+        metadata = dict(first.metadata)
+        if self.start is not None:
+            metadata["start_offset"], metadata["end_offset"] = self.start, self.end
+        pages = [page for doc in self.docs
+                 for page in (doc.metadata.get("page_number"), doc.metadata.get("page_end")) if isinstance(page, int)]
+        if pages and max(pages) != metadata.get("page_number"):
+            metadata["page_end"] = max(pages)
+        if len(self.docs) > 1:
+            metadata["merged_chunks"] = [doc.metadata.get("chunk_index") for doc in self.docs]
+        return Document(page_content=text if text is not None else self.text, metadata=metadata)
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Cắt text ở ranh giới dòng (hoặc câu) gần nhất trước max_chars."""
+    cut = text[:max_chars]
+    for separator in ("\n", ". ", "; "):
+        position = cut.rfind(separator)
+        if position > max_chars // 2:
+            return cut[:position + len(separator)].rstrip()
+    return cut.rstrip()
+
+
+def pack_documents(docs: list, budget_tokens: int = 0, chars_per_token: float = 3.0) -> list:
+    """Gộp các chunk đã tìm được thành các khối để đưa vào prompt.
+
+    Chunk cùng file được sắp theo start_offset; chunk chồng lấn hoặc liền kề được ghép thành một khối,
+    phần overlap và tiêu đề điều lặp lại chỉ giữ một lần. Khi vượt budget_tokens, khối có thứ hạng tìm
+    kiếm (của chunk tốt nhất trong khối) thấp hơn bị bỏ trước, khối cuối cùng có thể bị cắt bớt. Kết quả
+    là các Document theo thứ tự: file có chunk xếp hạng cao nhất trước, trong file theo vị trí.
+    """
+    by_source = {}
+    for rank, doc in enumerate(docs):
+        by_source.setdefault(doc.metadata.get("source"), []).append((rank, doc))
+
+    blocks: List[_Block] = []
+    for items in by_source.values():
+        positioned = sorted((item for item in items if _offsets(item[1])), key=lambda item: _offsets(item[1]))
+        current = None
+        for rank, doc in positioned:
+            if current is None or not current.extend(doc, rank):
+                current = _Block(doc, rank)
+                blocks.append(current)
+        # Chunk không có offset (vectorstore cũ) giữ nguyên, mỗi chunk một khối
+        blocks.extend(_Block(doc, rank) for rank, doc in items if not _offsets(doc))
+
+    selected = {}
+    remaining = budget_tokens
+    for block in sorted(blocks, key=lambda block: block.rank):
+        if budget_tokens <= 0:
+            selected[id(block)] = block.document()
+            continue
+        tokens = estimate_tokens(block.text, chars_per_token)
+        if tokens <= remaining:
+            selected[id(block)] = block.document()
+            remaining -= tokens
+        elif remaining >= _MIN_PARTIAL_TOKENS or not selected:
+            selected[id(block)] = block.document(_truncate(block.text, int(remaining * chars_per_token)))
+            break
+
+    source_rank = {}
+    for block in blocks:
+        source = block.docs[0].metadata.get("source")
+        source_rank[source] = min(source_rank.get(source, block.rank), block.rank)
+    ordered = sorted(
+        (block for block in blocks if id(block) in selected),
+        key=lambda block: (source_rank[block.docs[0].metadata.get("source")],
+                           block.start if block.start is not None else float("inf"), block.rank),
+    )
+    return [selected[id(block)] for block in ordered]
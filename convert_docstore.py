@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Chuyển vectorstore định dạng cũ (index.pkl của LangChain) sang chunk store mmap.
+
+index.faiss giữ nguyên; text + metadata của chunk được ghi ra chunk store (chunks_*) theo đúng thứ tự vector.
+Script unpickle index.pkl một lần, nên chỉ chạy với vectorstore do chính mình tạo ra.
+
+Ví dụ:
+    python convert_docstore.py
+    python convert_docstore.py --path vectorstore/legal_faiss --remove-pickle
+"""
+
+import os
+import time
+import argparse
+
+import faiss
+
+import chunk_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chuyển index.pkl sang chunk store mmap")
+    parser.add_argument("--path", default="vectorstore/legal_faiss")
+    parser.add_argument("--remove-pickle", action="store_true", help="Xóa index.pkl sau khi chuyển xong")
+    args = parser.parse_args()
+
+    legacy = os.path.join(args.path, chunk_store.LEGACY_FILE)
+    if not os.path.exists(legacy):
+        raise SystemExit(f"❌ Không tìm thấy {legacy}")
+
+    start = time.perf_counter()
+    count = chunk_store.convert_legacy(args.path, remove_pickle=args.remove_pickle)
+    ntotal = faiss.read_index(os.path.join(args.path, "index.faiss")).ntotal
+    if count != ntotal:
+        print(f"⚠️ {count} chunk nhưng index.faiss có {ntotal} vector, vectorstore có thể đã hỏng")
+    size = sum(os.path.getsize(os.path.join(args.path, name))
+               for name in chunk_store.chunk_files(args.path).values())
+    print(f"✅ Đã chuyển {count} chunk sang chunk store ({size / 1024:.0f} KB) trong {time.perf_counter() - start:.2f}s")
+    if not args.remove_pickle:
+        print(f"ℹ️ {chunk_store.LEGACY_FILE} được giữ lại; load_knowledge_base sẽ ưu tiên chunk store")
+
+
+if __name__ == "__main__":
+    main()
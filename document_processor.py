@@ -1,192 +1,462 @@
 import os
+import re
+import sys
+import unicodedata
+import bisect
 import shutil
-import PyPDF2
-import pdfplumber
-import fitz
-from docx import Document
-from pdf2image import convert_from_path
-import pytesseract
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document as LangchainDocument
-from typing import List, Tuple, Union
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 from tempfile import TemporaryDirectory
-from PIL import ImageFilter, ImageOps
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from PIL import Image, ImageFilter, ImageOps
+from extraction_cache import ExtractionCache
+from legal_chunker import LegalStructureChunker, FALLBACK_CHUNK_SIZE, FALLBACK_CHUNK_OVERLAP
+import kb_manifest
+
+# PyMuPDF, pdfplumber, PyPDF2, python-docx, pdf2image và pytesseract được import trong hàm dùng tới
+# chúng: import các thư viện này mất hàng trăm ms mà file .txt hay file đã có trong cache không cần
+
+
+# Loại trang khi đọc PDF: text layer dùng được / scan cần OCR / lỗi mã hóa / trang trắng
+PAGE_KINDS = ("text", "image", "garbled", "blank")
+
+# Ký tự không bao giờ có trong text tiếng Việt hợp lệ: U+FFFD, vùng Private Use, ký tự điều khiển
+_BROKEN_CHARS_RE = re.compile("[\ufffd\ue000-\uf8ff\x00-\x08\x0b\x0e-\x1f]")
+# UTF-8 bị giải mã như cp1252/latin-1 ("Ä‘iá»u" thay vì "điều")
+_MOJIBAKE_RE = re.compile(
+    "[ÂÃÄÅÆá][\u0080-\u00bf\u0152\u0153\u0160\u0161\u0178\u017d\u017e\u0192\u02c6\u02dc"
+    "\u2013\u2014\u2018-\u201e\u2020-\u2022\u2026\u2030\u2039\u203a\u20ac\u2122]"
+)
+# Font TCVN3 (ABC) và VNI không có bảng ToUnicode ("§iÒu", "Ch\u2212\u00acng", "Ñieàu")
+_LEGACY_FONT_RE = re.compile("[\u00a6\u00a7\u00a8\u00a9\u00aa\u00ab\u00ac\u00ae\u00b5\u00b6\u00b7\u00b8\u00b9\u2212"
+                             "\u00e6\u00ef\u00f1\u00d1\u00f6\u00f8\u00fb]")
+
+
+def garbled_ratio(text: str) -> float:
+    """Tỉ lệ ký tự đáng ngờ (lỗi mã hóa) trên số ký tự khác khoảng trắng của text."""
+    visible = len(text) - sum(ch.isspace() for ch in text)
+    if not visible:
+        return 0.0
+    suspicious = (len(_BROKEN_CHARS_RE.findall(text)) + 2 * len(_MOJIBAKE_RE.findall(text))
+                  + len(_LEGACY_FONT_RE.findall(text)))
+    return suspicious / visible
+
+
+# Cache fitz.Document theo từng process con, để mỗi worker chỉ mở file PDF một lần
+_WORKER_FITZ_DOCS: dict = {}
+
+
+def _get_worker_fitz_doc(file_path: str):
+    import fitz
+    doc = _WORKER_FITZ_DOCS.get(file_path)
+    if doc is None:
+        for cached in _WORKER_FITZ_DOCS.values():
+            cached.close()
+        _WORKER_FITZ_DOCS.clear()
+        doc = fitz.open(file_path)
+        _WORKER_FITZ_DOCS[file_path] = doc
+    return doc
+
+
+def _render_page_fitz(doc, page_idx: int, ocr_dpi: int) -> Image.Image:
+    """Render trang thành ảnh grayscale trong RAM (không subprocess, không encode PNG)."""
+    import fitz
+    pix = doc.load_page(page_idx).get_pixmap(dpi=ocr_dpi, colorspace=fitz.csGRAY, alpha=False)
+    return Image.frombytes("L", (pix.width, pix.height), pix.samples)
+
+
+def _render_page_poppler(file_path: str, page_idx: int, ocr_dpi: int, kwargs_poppler: dict) -> Image.Image:
+    from pdf2image import convert_from_path
+    return convert_from_path(
+        file_path,
+        dpi=ocr_dpi,
+        first_page=page_idx + 1, # pdf2image dùng index 1
+        last_page=page_idx + 1,
+        fmt="png",
+        **kwargs_poppler
+    )[0] # Lấy ảnh duy nhất trong list
+
+
+# Khung âm tiết tiếng Việt (đã bỏ dấu thanh): phụ âm đầu + cụm nguyên âm + phụ âm cuối
+_VI_SYLLABLE_RE = re.compile(
+    "^(ngh|ng|nh|ch|gh|gi|kh|ph|qu|th|tr|[bcdđghklmnpqrstvx])?"
+    "[aăâeêioôơuưy]{1,3}(ch|ng|nh|[cmnpt])?$"
+)
+_TONE_MARKS = {0x0300: None, 0x0301: None, 0x0303: None, 0x0309: None, 0x0323: None}
+
+
+def _word_hit_rate(words: List[str]) -> float:
+    """Tỉ lệ từ OCR là âm tiết tiếng Việt hợp lệ (hoặc số, ký hiệu) - thay cho tra từ điển."""
+    checked = hits = 0
+    for word in words:
+        word = word.strip(".,;:!?()[]{}\"'“”‘’«»-–—/").lower()
+        if not word:
+            continue
+        checked += 1
+        if not any(ch.isalpha() for ch in word):
+            hits += 1
+            continue
+        base = unicodedata.normalize("NFC", unicodedata.normalize("NFD", word).translate(_TONE_MARKS))
+        hits += bool(_VI_SYLLABLE_RE.match(base))
+    return hits / checked if checked else 0.0
+
+
+def _ink_ratio(img: Image.Image) -> float:
+    """Tỉ lệ điểm ảnh tối, dùng để bỏ sớm trang trắng / gần trắng."""
+    histogram = img.histogram()
+    return sum(histogram[:128]) / max(1, sum(histogram))
+
+
+def _tesseract(img: Image.Image, ocr_lang: str, ocr_config: str) -> Tuple[str, float, float]:
+    """OCR một ảnh bằng image_to_data: (text, confidence trung bình theo độ dài từ, tỉ lệ từ hợp lệ)."""
+    import pytesseract
+    data = pytesseract.image_to_data(img, lang=ocr_lang, config=ocr_config, output_type=pytesseract.Output.DICT)
+    lines: dict = {}
+    words, weighted_conf, weight = [], 0.0, 0
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if conf < 0 or not word.strip():
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+        words.append(word)
+        weighted_conf += conf * len(word)
+        weight += len(word)
+    text, previous = "", None
+    for key, line_words in lines.items():
+        if previous is not None:
+            text += "\n\n" if key[:2] != previous[:2] else "\n"
+        text += " ".join(line_words)
+        previous = key
+    return text, (weighted_conf / weight if weight else 0.0), _word_hit_rate(words)
+
+
+def _render_page(file_path: str, page_idx: int, ocr_dpi: int, kwargs_poppler: dict,
+                 rasterizer: str, doc=None) -> Image.Image:
+    image = None
+    if rasterizer == "fitz":
+        try:
+            image = _render_page_fitz(doc if doc is not None else _get_worker_fitz_doc(file_path), page_idx, ocr_dpi)
+        except Exception as e:
+            print(f"⚠️ PyMuPDF render failed for page {page_idx+1}: {e}. Falling back to poppler...")
+    if image is None:
+        image = _render_page_poppler(file_path, page_idx, ocr_dpi, kwargs_poppler)
+    return image.convert("L")
+
+
+def _ocr_page(file_path: str, page_idx: int, ocr_dpi: int, ocr_lang: str, ocr_config: str,
+              kwargs_poppler: dict, tesseract_cmd: Optional[str] = None,
+              rasterizer: str = "fitz", gate: Optional[dict] = None, doc=None) -> Tuple[str, str]:
+    """Render + OCR một trang PDF, trả về (text, lượt OCR được giữ). Đặt ở top-level để chạy được trong process pool.
+
+    gate=None: luôn render ở ocr_dpi và tiền xử lý đầy đủ như cũ. Với gate (PDF_OCR_ADAPTIVE=1):
+    render ở DPI thấp, bỏ trang trắng, chỉ OCR lại ở ocr_dpi + tiền xử lý khi điểm chất lượng thấp.
+    """
+    import pytesseract
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+    fast = None
+    if gate is not None:
+        img = _render_page(file_path, page_idx, min(gate["fast_dpi"], ocr_dpi), kwargs_poppler, rasterizer, doc)
+        if _ink_ratio(img) < gate["blank_ink"]:
+            return "", "blank"
+        fast = _tesseract(img, ocr_lang, ocr_config)
+        if fast[1] >= gate["min_conf"] and fast[2] >= gate["min_word_rate"]:
+            return fast[0], "fast"
+
+    # Tiền xử lý ảnh
+    img = _render_page(file_path, page_idx, ocr_dpi, kwargs_poppler, rasterizer, doc)
+    img = ImageOps.equalize(img)
+    img = img.filter(ImageFilter.MedianFilter())
+
+    if gate is None:
+        page_text = pytesseract.image_to_string(
+            img,
+            lang=ocr_lang,
+            config=ocr_config
+        )
+        return page_text.replace("\x0c", "").strip(), "full"
+    full = _tesseract(img, ocr_lang, ocr_config)
+    # Giữ lượt có điểm tốt hơn (ảnh sạch đôi khi bị tiền xử lý làm xấu đi)
+    if fast[1] * fast[2] > full[1] * full[2]:
+        return fast[0], "fast"
+    return full[0], "full"
+
+
+def _ocr_page_task(args: tuple, doc=None) -> Tuple[int, str, Optional[str], Optional[str]]:
+    """Bọc _ocr_page để lỗi của một trang không làm hỏng cả pool."""
+    page_idx = args[1]
+    try:
+        page_text, ocr_pass = _ocr_page(*args, doc=doc)
+        return page_idx, page_text, None, ocr_pass
+    except Exception as e:
+        return page_idx, "", str(e), None
+
+
+# Processor của từng process con khi trích xuất nhiều file song song
+_WORKER_PROCESSOR = None
+
+
+def _extract_file_task(args: tuple) -> Tuple[Optional[List[str]], List[int], Optional[str]]:
+    """Trích xuất một file trong process con: (pages, trang OCR lỗi, lỗi). Cache do process chính ghi."""
+    global _WORKER_PROCESSOR
+    file_path, = args
+    if _WORKER_PROCESSOR is None:
+        # Đã song song theo file nên OCR trong mỗi worker chạy tuần tự, tránh lồng pool
+        _WORKER_PROCESSOR = LegalDocumentProcessor(ocr_workers=1, file_workers=1)
+    try:
+        pages = _WORKER_PROCESSOR.extract_pages(file_path)
+        return pages, list(_WORKER_PROCESSOR.last_failed_pages), None
+    except Exception as e:
+        return None, [], str(e)
+
 
 class LegalDocumentProcessor:
-    def __init__(self): 
+    def __init__(self, ocr_workers: Optional[int] = None, extraction_cache: Optional[ExtractionCache] = None,
+                 file_workers: Optional[int] = None, buffer_limit_mb: Optional[float] = None):
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
+            chunk_size=FALLBACK_CHUNK_SIZE,
+            chunk_overlap=FALLBACK_CHUNK_OVERLAP,
+            add_start_index=True
         )
+        # CHUNKER=legal: chia theo Chương/Mục/Điều/Khoản/Điểm; CHUNKER=recursive: chia theo độ dài như cũ
+        self.chunker = os.getenv("CHUNKER", "legal").lower()
+        self.legal_chunker = LegalStructureChunker()
+        # Số process OCR song song (PDF_OCR_WORKERS=1 để chạy tuần tự, 0 = theo số CPU)
+        if ocr_workers is None:
+            ocr_workers = int(os.getenv("PDF_OCR_WORKERS", "0"))
+        self.ocr_workers = ocr_workers if ocr_workers > 0 else (os.cpu_count() or 1)
+        # Số process trích xuất nhiều file cùng lúc (INGEST_FILE_WORKERS=1 để chạy tuần tự, 0 = theo số CPU)
+        if file_workers is None:
+            file_workers = int(os.getenv("INGEST_FILE_WORKERS", "0"))
+        self.file_workers = file_workers if file_workers > 0 else (os.cpu_count() or 1)
+        # Ngân sách cho text đã trích xuất nằm trong RAM khi trích xuất song song (xem extract_many);
+        # INGEST_MEMORY_LIMIT_MB là tên cũ của biến này
+        if buffer_limit_mb is None:
+            buffer_limit_mb = float(os.getenv("INGEST_BUFFER_LIMIT_MB") or os.getenv("INGEST_MEMORY_LIMIT_MB", "2048"))
+        self.buffer_limit = int(buffer_limit_mb * 1024 * 1024)
+        # Trang có ảnh mà text layer ngắn hơn PDF_MIN_TEXT_CHARS ký tự thì đi OCR
+        self.min_text_chars = int(os.getenv("PDF_MIN_TEXT_CHARS", "20"))
+        # Trang có tỉ lệ ký tự lỗi mã hóa vượt PDF_GARBLED_RATIO thì thử pdfplumber rồi OCR
+        self.garbled_threshold = float(os.getenv("PDF_GARBLED_RATIO", "0.05"))
+        # Chia chunk dạng stream: chỉ giữ tối đa khoảng STREAM_WINDOW_CHARS ký tự chưa chia trong bộ nhớ
+        self.stream_window = int(os.getenv("STREAM_WINDOW_CHARS", "65536"))
+        # File từ INGEST_STREAM_MIN_MB trở lên được đọc lười từng trang thay vì trích xuất trọn file
+        self.stream_min_bytes = int(float(os.getenv("INGEST_STREAM_MIN_MB", "20")) * 1024 * 1024)
+        # Khi đọc stream, chỉ ghi extraction cache nếu text của file không vượt STREAM_CACHE_MAX_CHARS
+        self.stream_cache_chars = int(os.getenv("STREAM_CACHE_MAX_CHARS", "4000000"))
+        self.extraction_cache = extraction_cache
+        self.last_failed_pages: List[int] = []
     
     def read_pdf(self, file_path: str, return_pages: bool = False) -> Union[str, Tuple[str, List[str]]]: 
-        text_pages: list[str] = []
-        missing_pages: list[int] = []
-        total_pages = 0
+        failed_pages: List[int] = []
+        text_pages = list(self.iter_pdf_pages(file_path, failed_pages))
+        self.last_failed_pages = failed_pages # Trang OCR lỗi của lần đọc gần nhất (không nên cache)
+
+        # Kết hợp text cuối cùng
+        combined_text = "\n".join(page_text for page_text in text_pages if page_text.strip())
+        if combined_text.strip():
+            return (combined_text, text_pages) if return_pages else combined_text
+
+        print(f"❌ No text extracted from {file_path}. All methods failed.")
+        return ("", text_pages) if return_pages else ""
+
+    def iter_pdf_pages(self, file_path: str, failed_pages: Optional[List[int]] = None) -> Iterator[str]:
+        """Trích xuất PDF lần lượt từng trang (text của trang i ở lượt thứ i); trang OCR lỗi được ghi vào failed_pages.
 
-        # --- CÁCH 1: THỬ PyMuPDF (fitz) ĐẦU TIÊN (Rất mạnh) ---
+        Mỗi trang được phân loại ngay trên file đã mở bằng PyMuPDF (text / image / garbled / blank):
+        chỉ trang cần mới đi pdfplumber hoặc OCR. OCR chạy trước tối đa 2 * ocr_workers trang trên
+        process pool, nên bộ nhớ không tăng theo số trang của file.
+        """
+        import fitz
+        failed_pages = failed_pages if failed_pages is not None else []
+        # Mở PyMuPDF một lần, dùng chung cho trích xuất text và render trang cần OCR
         try:
-            with fitz.open(file_path) as doc:
-                total_pages = len(doc)
-                for idx in range(total_pages):
-                    page = doc.load_page(idx)
-                    page_text = page.get_text("text", sort=True) or ""
-                    text_pages.append(page_text)
-                    if not page_text.strip():
-                        missing_pages.append(idx)
-            
-            if text_pages and not all(p.strip() == "" for p in text_pages):
-                print(f"✅ Extracted text with PyMuPDF ({sum(len(p) for p in text_pages)} chars)")
-            else:
-                # PyMuPDF không lấy được gì, reset để thử cách khác
-                text_pages = []
-                missing_pages = []
-                total_pages = 0
-                raise Exception("PyMuPDF extracted no text.") # Chuyển sang Pypdfplumber
-                
+            fitz_doc = fitz.open(file_path)
         except Exception as e:
-            print(f"⚠️ PyMuPDF failed: {e}. Trying pdfplumber...")
-            # --- HẾT CÁCH 1 ---
-
-            # Thử pdfplumber (Code cũ của bạn, không đổi)
-            try:
-                with pdfplumber.open(file_path) as pdf:
-                    total_pages = len(pdf.pages)
-                    for idx, page in enumerate(pdf.pages):
-                        page_text = page.extract_text() or ""
-                        text_pages.append(page_text)
-                        if not page_text.strip():
-                            missing_pages.append(idx)
-                if text_pages and not all(p.strip() == "" for p in text_pages):
-                     print(f"✅ Extracted text with pdfplumber ({sum(len(p) for p in text_pages)} chars)")
-                else:
-                    raise Exception("pdfplumber extracted no text.")
-            except Exception as e:
-                print(f"⚠️ pdfplumber failed: {e}. Trying PyPDF2...")
-                text_pages = []
-                missing_pages = []
-                total_pages = 0
-                
-                # Fallback to PyPDF2 (Code cũ của bạn, không đổi)
-                try:
-                    with open(file_path, 'rb') as file:
-                        reader = PyPDF2.PdfReader(file)
-                        total_pages = len(reader.pages)
-                        if total_pages == 0: # Xử lý file PDF bị mã hóa
-                            raise Exception("PyPDF2 could not read pages (possibly encrypted).")
-                        text_pages = ["" for _ in range(total_pages)] # Khởi tạo list
-                        for idx, page in enumerate(reader.pages):
-                            page_text = page.extract_text() or ""
-                            text_pages[idx] = page_text
-                            if not page_text.strip():
-                                missing_pages.append(idx)
-                    if text_pages and not all(p.strip() == "" for p in text_pages):
-                        print(f"✅ Extracted text with PyPDF2 ({sum(len(p) for p in text_pages)} chars)")
-                    else:
-                         missing_pages = list(range(total_pages)) # Toàn bộ đều rỗng
-                except Exception as e:
-                    print(f"⚠️ PyPDF2 failed: {e}. Will attempt OCR.")
-                    text_pages = []
-                    missing_pages = []
-                    total_pages = 0
+            print(f"⚠️ PyMuPDF cannot open file: {e}")
+            fitz_doc = None
+        try:
+            yield from self._iter_pdf_pages(file_path, fitz_doc, failed_pages)
+        finally:
+            if fitz_doc is not None:
+                fitz_doc.close()
 
+    def _iter_pdf_pages(self, file_path: str, fitz_doc, failed_pages: List[int]) -> Iterator[str]:
+        # pytesseract chỉ được import trong _ocr_page, pdfplumber chỉ khi gặp trang lỗi mã hóa:
+        # PDF toàn text đọc được cả khi máy không cài hai gói này
+        if fitz_doc is not None:
+            extractor = "PyMuPDF"
+            candidates = self._iter_classified_pages(fitz_doc)
+        else:
+            # Không mở được bằng PyMuPDF: đọc một lượt bằng pdfplumber (hoặc PyPDF2), trang rỗng đi OCR
+            extractor = "pdfplumber/PyPDF2"
+            candidates = self._iter_fallback_pages(file_path)
 
-        # --- CÁCH 2: FALLBACK TO OCR (ĐÃ TỐI ƯU HÓA) ---
         poppler_path = os.getenv("POPPLER_PATH")
         tesseract_cmd = os.getenv("TESSERACT_CMD")
-        if tesseract_cmd:
-            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        ocr_dpi = int(os.getenv("PDF_OCR_DPI", "300")) # Giảm DPI trong .env nếu vẫn chậm
+        ocr_lang = os.getenv("PDF_OCR_LANG", "vie+eng")
+        ocr_config = os.getenv("PDF_OCR_CONFIG", "")
+        kwargs_poppler = {"poppler_path": poppler_path} if poppler_path else {}
+        verbose_ocr = os.getenv("PDF_OCR_VERBOSE", "0") == "1"
+        # "fitz" render trực tiếp từ PyMuPDF trong RAM, "poppler" dùng pdftoppm như cũ
+        rasterizer = os.getenv("PDF_OCR_RASTERIZER", "fitz").lower()
+        if rasterizer == "fitz" and fitz_doc is None:
+            rasterizer = "poppler"
+        # PDF_OCR_ADAPTIVE=1: OCR nhanh ở DPI thấp, chỉ làm lại ở PDF_OCR_DPI khi điểm thấp
+        gate = None
+        if os.getenv("PDF_OCR_ADAPTIVE", "1") == "1":
+            gate = {
+                "fast_dpi": int(os.getenv("PDF_OCR_FAST_DPI", "200")),
+                "min_conf": float(os.getenv("PDF_OCR_MIN_CONF", "70")),
+                "min_word_rate": float(os.getenv("PDF_OCR_MIN_WORD_RATE", "0.7")),
+                "blank_ink": float(os.getenv("PDF_OCR_BLANK_INK", "0.0003")),
+            }
 
-        # Nếu không có text_pages (PyMuPDF/Plumber/PDF2 đều thất bại) 
-        # HOẶC có một số trang bị thiếu text
-        needs_ocr = not text_pages or missing_pages
+        kinds: dict = {}
+        passes: dict = {}
+        fixed = 0
+        total_chars = 0
+        plumber = None # pdfplumber chỉ được mở khi gặp trang lỗi mã hóa
+        pool = None
+        lookahead = 2 * self.ocr_workers
+        # Trang theo thứ tự: (idx, text) hoặc (idx, Future/kết quả OCR)
+        window: deque = deque()
 
-        if needs_ocr:
-            print(f"ℹ️ Attempting OCR fallback...")
-            try:
-                # Nếu text_pages rỗng, chúng ta cần biết tổng số trang
-                if total_pages == 0:
-                    try:
-                        # Mở lại bằng PyPDF2 chỉ để đếm trang
-                        with open(file_path, 'rb') as file:
-                            reader = PyPDF2.PdfReader(file)
-                            total_pages = len(reader.pages)
-                    except Exception:
-                        # Nếu vẫn lỗi, thử đếm bằng pdfplumber
+        def resolve(entry) -> str:
+            idx, value = entry
+            if isinstance(value, str):
+                return value
+            if isinstance(value, Future):
+                value = value.result()
+            _, page_text, page_error, ocr_pass = value
+            if page_error is not None:
+                print(f"⚠️ Failed to OCR page {idx+1}: {page_error}")
+                failed_pages.append(idx)
+                return "" # Đánh dấu là rỗng nếu lỗi
+            passes[ocr_pass] = passes.get(ocr_pass, 0) + 1
+            if verbose_ocr:
+                char_count = len(page_text)
+                status = "chars" if char_count else "empty"
+                print(f"   ... OCR page {idx+1}: {char_count} {status} ({ocr_pass})")
+            return page_text
+
+        try:
+            for idx, kind, page_text in candidates:
+                kinds[kind] = kinds.get(kind, 0) + 1
+                if kind == "garbled":
+                    if plumber is None:
                         try:
-                            with pdfplumber.open(file_path) as pdf:
-                                total_pages = len(pdf.pages)
+                            import pdfplumber
+                            plumber = pdfplumber.open(file_path)
                         except Exception as e:
-                            print(f"❌ Cannot determine page count for OCR: {e}")
-                            return "" # Bỏ cuộc
-
-                if not text_pages:
-                    text_pages = ["" for _ in range(total_pages)]
-                    missing_pages = list(range(total_pages))
-                
-                print(f"ℹ️ OCR-ing {len(missing_pages)} pages (one by one)...")
-                
-                ocr_dpi = int(os.getenv("PDF_OCR_DPI", "300")) # Giảm DPI trong .env nếu vẫn chậm
-                ocr_lang = os.getenv("PDF_OCR_LANG", "vie+eng")
-                ocr_config = os.getenv("PDF_OCR_CONFIG", "")
-
-                kwargs_poppler = {"poppler_path": poppler_path} if poppler_path else {}
-
-                verbose_ocr = os.getenv("PDF_OCR_VERBOSE", "0") == "1"
-
-                for page_idx in missing_pages:
-                    # [TỐI ƯU HÓA] Chỉ chuyển đổi 1 trang tại một thời điểm
-                    try:
-                        image = convert_from_path(
-                            file_path,
-                            dpi=ocr_dpi,
-                            first_page=page_idx + 1, # pdf2image dùng index 1
-                            last_page=page_idx + 1,
-                            fmt="png",
-                            **kwargs_poppler
-                        )[0] # Lấy ảnh duy nhất trong list
-
-                        # Tiền xử lý ảnh (code cũ của bạn)
-                        img = image.convert("L")
-                        img = ImageOps.equalize(img)
-                        img = img.filter(ImageFilter.MedianFilter())
-                        
-                        page_text = pytesseract.image_to_string(
-                            img,
-                            lang=ocr_lang,
-                            config=ocr_config
-                        )
-                        page_text = page_text.replace("\x0c", "").strip()
-                        text_pages[page_idx] = page_text
-                        if verbose_ocr:
-                            char_count = len(page_text)
-                            status = "chars" if char_count else "empty"
-                            print(f"   ... OCR page {page_idx+1}: {char_count} {status}")
-                        # print(f"   ... OCR page {page_idx+1} complete.") # Bỏ comment nếu muốn xem tiến trình
-                        
-                    except Exception as page_e:
-                        print(f"⚠️ Failed to OCR page {page_idx+1}: {page_e}")
-                        text_pages[page_idx] = "" # Đánh dấu là rỗng nếu lỗi
-
-                print(f"✅ OCR complete. Total chars: ({sum(len(p) for p in text_pages)})")
-            
+                            print(f"⚠️ pdfplumber failed on garbled pages: {e}")
+                            plumber = False
+                    alt_text = (plumber.pages[idx].extract_text() or "") if plumber else ""
+                    if alt_text.strip() and garbled_ratio(alt_text) <= self.garbled_threshold:
+                        page_text, kind = alt_text, "text"
+                        fixed += 1
+                if kind in ("image", "garbled"):
+                    task = (file_path, idx, ocr_dpi, ocr_lang, ocr_config, kwargs_poppler, tesseract_cmd, rasterizer, gate)
+                    if self.ocr_workers > 1:
+                        if pool is None:
+                            print(f"ℹ️ OCR-ing pages on {self.ocr_workers} processes...")
+                            pool = ProcessPoolExecutor(max_workers=self.ocr_workers)
+                        window.append((idx, pool.submit(_ocr_page_task, task)))
+                    else:
+                        window.append((idx, _ocr_page_task(task, doc=fitz_doc)))
+                else:
+                    window.append((idx, page_text))
+                # Trả các trang đầu hàng đã xong; chỉ chờ OCR khi đã đi trước quá lookahead trang
+                while window and (len(window) > lookahead or not isinstance(window[0][1], Future)
+                                  or window[0][1].done()):
+                    page_text = resolve(window.popleft())
+                    total_chars += len(page_text)
+                    yield page_text
+            while window:
+                page_text = resolve(window.popleft())
+                total_chars += len(page_text)
+                yield page_text
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            if plumber:
+                plumber.close()
+
+        summary = ", ".join(f"{n} {kind}" for kind, n in kinds.items())
+        if fixed:
+            summary += f" ({fixed} garbled fixed by pdfplumber)"
+        if passes:
+            summary += "; OCR " + ", ".join(f"{n} {ocr_pass}" for ocr_pass, n in passes.items())
+        print(f"✅ {extractor}: {sum(kinds.values())} pages ({total_chars} chars) {summary}")
+        if failed_pages and not poppler_path and not shutil.which("pdfinfo") and rasterizer == "poppler":
+            print("ℹ️ Gợi ý: Cài Poppler...")
+
+    def _iter_classified_pages(self, fitz_doc) -> Iterator[Tuple[int, str, str]]:
+        for idx in range(len(fitz_doc)):
+            try:
+                yield (idx, *self._classify_page(fitz_doc.load_page(idx)))
             except Exception as e:
-                # Khối chẩn đoán của bạn (giữ nguyên)
-                pdfinfo_path = shutil.which("pdfinfo")
-                print(f"⚠️ OCR fallback failed entirely: {e}")
-                if not poppler_path and not pdfinfo_path:
-                     print("ℹ️ Gợi ý: Cài Poppler...")
-                # ... (giữ nguyên các gợi ý khác) ...
+                # Trang hỏng với PyMuPDF: để OCR thử (render lỗi sẽ chuyển sang poppler)
+                print(f"⚠️ PyMuPDF failed on page {idx+1}: {e}")
+                yield idx, "image", ""
 
-        # Kết hợp text cuối cùng
-        combined_text = "\n".join(page_text for page_text in text_pages if page_text.strip())
-        if combined_text.strip():
-            return (combined_text, text_pages) if return_pages else combined_text
+    def _classify_page(self, page) -> Tuple[str, str]:
+        """Phân loại một trang fitz (text / image / garbled / blank) và trả kèm text layer của nó."""
+        page_text = page.get_text("text", sort=True) or ""
+        has_images = bool(page.get_images(full=False))
+        # Text layer quá mỏng trên trang có ảnh (số trang, dấu mộc...) thì coi là trang scan
+        if len(page_text.strip()) < self.min_text_chars and has_images:
+            return "image", page_text
+        if page_text.strip():
+            if garbled_ratio(page_text) > self.garbled_threshold:
+                return "garbled", page_text
+            return "text", page_text
+        # Không text, không ảnh: chữ vẽ bằng vector vẫn cần OCR, còn lại là trang trắng
+        if page.get_drawings():
+            return "image", page_text
+        return "blank", page_text
+
+    def _iter_fallback_pages(self, file_path: str) -> Iterator[Tuple[int, str, str]]:
+        """(idx, loại, text) từng trang bằng pdfplumber; lỗi giữa chừng thì đọc tiếp bằng PyPDF2."""
+        done = 0
+        for name, reader in (("pdfplumber", self._plumber_pages), ("PyPDF2", self._pypdf2_pages)):
+            try:
+                for idx, page_text in reader(file_path, done):
+                    yield idx, ("text" if page_text.strip() else "image"), page_text
+                    done = idx + 1
+                return
+            except Exception as e:
+                print(f"⚠️ {name} failed: {e}.")
+        if done == 0:
+            print(f"❌ Cannot determine page count for OCR: {file_path}")
+
+    @staticmethod
+    def _plumber_pages(file_path: str, start: int) -> Iterator[Tuple[int, str]]:
+        import pdfplumber
+        with pdfplumber.open(file_path) as pdf:
+            for idx in range(start, len(pdf.pages)):
+                page = pdf.pages[idx]
+                page_text = page.extract_text() or ""
+                page.close() # Giải phóng cache layout của trang đã đọc
+                yield idx, page_text
+
+    @staticmethod
+    def _pypdf2_pages(file_path: str, start: int) -> Iterator[Tuple[int, str]]:
+        import PyPDF2
+        with open(file_path, 'rb') as file:
+            reader = PyPDF2.PdfReader(file)
+            if len(reader.pages) == 0: # Xử lý file PDF bị mã hóa
+                raise Exception("PyPDF2 could not read pages (possibly encrypted).")
+            for idx in range(start, len(reader.pages)):
+                yield idx, reader.pages[idx].extract_text() or ""
 
-        print(f"❌ No text extracted from {file_path}. All methods failed.")
-        return ("", text_pages) if return_pages else ""
-    
     def read_docx(self, file_path: str) -> str:
+        from docx import Document
         doc = Document(file_path)
         return "\n".join(p.text for p in doc.paragraphs).replace("\ufeff", "")
     
@@ -194,47 +464,284 @@ class LegalDocumentProcessor:
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
             return file.read().replace("\ufeff", "")
 
-    def process_documents(self, data_folder: str) -> List[LangchainDocument]:
-        documents = []
-        total_chunks = 0
-        
-        for filename in os.listdir(data_folder):
-            file_path = os.path.join(data_folder, filename)
-            ext = filename.split('.')[-1].lower()
-
-            try: 
-                if filename.endswith('.pdf'):
-                    text = self.read_pdf(file_path)
-                elif filename.endswith('.docx'):
-                    text = self.read_docx(file_path)
-                elif filename.endswith('.txt'):
-                    text = self.read_txt(file_path)
-                else: 
-                    print(f"⚠️ Skipping unsupported file type: {filename}")
+    def extract_pages(self, file_path: str, content_hash: Optional[str] = None) -> List[str]:
+        """Trích xuất text theo trang (DOCX/TXT tính là một trang), dùng extraction cache nếu có."""
+        cache_key = self._cache_key(file_path, content_hash)
+        if cache_key is not None:
+            cached_pages = self.extraction_cache.get(cache_key)
+            if cached_pages is not None:
+                return cached_pages
+
+        self.last_failed_pages = []
+        ext = file_path.split('.')[-1].lower()
+        if ext == "pdf":
+            _, pages = self.read_pdf(file_path, return_pages=True)
+        elif ext == "docx":
+            pages = [self.read_docx(file_path)]
+        else:
+            pages = [self.read_txt(file_path)]
+        self._cache_pages(cache_key, file_path, pages, self.last_failed_pages)
+        return pages
+
+    def iter_pages(self, file_path: str, content_hash: Optional[str] = None) -> Iterator[str]:
+        """Như extract_pages nhưng trả lười từng trang, để file rất lớn không phải nằm trọn trong RAM."""
+        cache_key = self._cache_key(file_path, content_hash)
+        if cache_key is not None:
+            cached_pages = self.extraction_cache.get(cache_key)
+            if cached_pages is not None:
+                yield from cached_pages
+                return
+
+        failed_pages: List[int] = []
+        ext = file_path.split('.')[-1].lower()
+        if ext == "pdf":
+            pages = self.iter_pdf_pages(file_path, failed_pages)
+        elif ext == "docx":
+            pages = iter([self.read_docx(file_path)])
+        else:
+            pages = iter([self.read_txt(file_path)])
+        # Giữ bản sao để ghi cache, bỏ khi file vượt stream_cache_chars
+        kept: Optional[List[str]] = [] if cache_key is not None else None
+        kept_chars = 0
+        for page in pages:
+            if kept is not None:
+                kept_chars += len(page)
+                if kept_chars > self.stream_cache_chars:
+                    print(f"ℹ️ {os.path.basename(file_path)} is too large for the extraction cache, streaming only")
+                    kept = None
+                else:
+                    kept.append(page)
+            yield page
+        if kept is not None:
+            self._cache_pages(cache_key, file_path, kept, failed_pages)
+
+    def _cache_key(self, file_path: str, content_hash: Optional[str]) -> Optional[str]:
+        ext = file_path.split('.')[-1].lower()
+        if ext not in ("pdf", "docx", "txt"):
+            raise ValueError(f"Unsupported file type: {file_path}")
+        if self.extraction_cache is None:
+            return None
+        content_hash = content_hash or ExtractionCache.file_hash(file_path)
+        return self.extraction_cache.make_key(content_hash, ext)
+
+    def _cache_pages(self, cache_key: Optional[str], file_path: str, pages: List[str], failed_pages: List[int]):
+        # Không cache kết quả rỗng hoặc có trang OCR lỗi: có thể do thiếu Tesseract/Poppler, lần sau cần thử lại
+        if cache_key is not None and any(page.strip() for page in pages) and not failed_pages:
+            self.extraction_cache.put(cache_key, pages, source=os.path.basename(file_path))
+
+    def extract_many(self, files: Iterable[Tuple[str, str]]) -> Iterator[tuple]:
+        """Trích xuất nhiều file (source, path), trả về (source, path, content_hash, pages, lỗi) theo đúng thứ tự vào.
+
+        Với nhiều hơn một worker, các file chưa có trong cache được trích xuất trên process pool,
+        file lớn được gửi trước để không nằm cuối hàng đợi. Kết quả vẫn trả về theo thứ tự `files`
+        nên thứ tự chunk trong index không phụ thuộc file nào xong trước; file chỉ được gửi thêm khi
+        phần text đang giữ chưa vượt buffer_limit. File đã xong mà chưa tới lượt được tính theo đúng
+        dung lượng text trong RAM, file đang trích xuất thì ước lượng bằng dung lượng file (ngoài ra
+        mỗi worker còn giữ ảnh của trang đang OCR, khoảng 26 MB/worker ở 300 DPI); file có trong
+        cache chỉ được đọc khi tới lượt.
+
+        File từ INGEST_STREAM_MIN_MB trở lên không được trích xuất trước: pages là iterator lười
+        (iter_pages) và việc trích xuất diễn ra khi bên gọi duyệt qua nó.
+        """
+        files = list(files)
+        workers = min(self.file_workers, len(files))
+        if workers <= 1:
+            # Một file hoặc chạy tuần tự: giữ pool OCR theo trang
+            for source, file_path in files:
+                try:
+                    content_hash = ExtractionCache.file_hash(file_path)
+                    if os.path.getsize(file_path) >= self.stream_min_bytes:
+                        yield source, file_path, content_hash, self.iter_pages(file_path, content_hash), None
+                        continue
+                    yield source, file_path, content_hash, self.extract_pages(file_path, content_hash), None
+                except Exception as e:
+                    yield source, file_path, None, None, str(e)
+            return
+
+        ready = {}
+        cached = {}
+        todo = []
+        for order, (source, file_path) in enumerate(files):
+            try:
+                content_hash = ExtractionCache.file_hash(file_path)
+                if os.path.getsize(file_path) >= self.stream_min_bytes:
+                    self._cache_key(file_path, content_hash) # Kiểm tra loại file ngay
+                    ready[order] = (source, file_path, content_hash, self.iter_pages(file_path, content_hash), None)
                     continue
+                cache_key = self._cache_key(file_path, content_hash)
+            except Exception as e:
+                ready[order] = (source, file_path, None, None, str(e))
+                continue
+            if cache_key is not None and self.extraction_cache.contains(cache_key):
+                cached[order] = content_hash
+            else:
+                todo.append((os.path.getsize(file_path), order, cache_key, content_hash))
+        todo.sort(key=lambda item: (-item[0], item[1]))
 
-                if not text.strip():
-                    print(f"⚠️ No text extracted from {filename}, skipping.")
+        pool = ProcessPoolExecutor(max_workers=workers)
+        in_flight = {}
+        reserved = {}
+        try:
+            for next_order, (source, file_path) in enumerate(files):
+                if next_order in cached:
+                    # extract_pages đọc lại từ cache (hoặc trích xuất ngay nếu entry vừa bị evict)
+                    content_hash = cached.pop(next_order)
+                    yield source, file_path, content_hash, self.extract_pages(file_path, content_hash), None
                     continue
+                while next_order not in ready:
+                    if next_order not in reserved:
+                        # File đến lượt trả về luôn được gửi ngay, kể cả khi vượt trần, để không bị kẹt
+                        item = next(item for item in todo if item[1] == next_order)
+                        todo.remove(item)
+                        self._submit_file(pool, item, files, in_flight, reserved)
+                    for item in list(todo):
+                        if len(in_flight) >= workers:
+                            break
+                        if sum(reserved.values()) + item[0] <= self.buffer_limit:
+                            todo.remove(item)
+                            self._submit_file(pool, item, files, in_flight, reserved)
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        order, cache_key, content_hash = in_flight.pop(future)
+                        pages, failed_pages, error = future.result()
+                        if pages is not None:
+                            self._cache_pages(cache_key, files[order][1], pages, failed_pages)
+                            # Thay ước lượng bằng dung lượng thật của text đang chờ tới lượt
+                            reserved[order] = sum(sys.getsizeof(page) for page in pages)
+                        else:
+                            reserved.pop(order, None)
+                        ready[order] = (*files[order], content_hash, pages, error)
+                reserved.pop(next_order, None)
+                yield ready.pop(next_order)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _submit_file(pool, item: tuple, files: list, in_flight: dict, reserved: dict):
+        size, order, cache_key, content_hash = item
+        future = pool.submit(_extract_file_task, (files[order][1],))
+        in_flight[future] = (order, cache_key, content_hash)
+        reserved[order] = size
+
+    def process_file(self, file_path: str, source: Optional[str] = None) -> List[LangchainDocument]:
+        """Trích xuất và chia chunk một file. Trả về [] nếu không lấy được text."""
+        return list(self.stream_file(file_path, source))
 
-                # Split into chunks
-                chunks = self.text_splitter.split_text(text)
-                total_chunks += len(chunks)
-
-                for i, chunk in enumerate(chunks):
-                    documents.append(LangchainDocument(
-                        page_content=chunk, 
-                        metadata={
-                            "source": filename,
-                            "chunk_index": i,
-                            "document_type": ext
-                        }
-                    ))
-                print(f"📄 Processed {filename} → {len(chunks)} chunks")
+    def stream_file(self, file_path: str, source: Optional[str] = None) -> Iterator[LangchainDocument]:
+        """Như process_file nhưng trích xuất và chia chunk lười theo từng trang."""
+        filename = source or os.path.basename(file_path)
+        return self.iter_chunks(self.iter_pages(file_path), filename)
+
+    def chunk_pages(self, pages: List[str], source: str) -> List[LangchainDocument]:
+        """Chia chunk text đã trích xuất của một file (xem iter_chunks)."""
+        return list(self.iter_chunks(pages, source))
+
+    def iter_chunks(self, pages: Iterable[str], source: str,
+                    page_table: Optional[List[List[int]]] = None) -> Iterator[LangchainDocument]:
+        """Chia chunk lần lượt khi đọc từng trang, chỉ giữ khoảng stream_window ký tự chưa chia.
+
+        Metadata mỗi chunk có start_offset/end_offset trong text đã ghép của file, và với PDF thêm
+        page_number (trang bắt đầu) cùng page_end nếu chunk kéo sang trang sau. Nếu truyền page_table,
+        các dòng [số trang, offset đầu, offset cuối] của các trang có text được thêm dần vào đó
+        (bảng lưu trong page_offsets.json, xem kb_manifest.page_for_offset).
+        """
+        ext = source.split('.')[-1].lower()
+        table = page_table if page_table is not None else []
+        page_starts: List[int] = []
+        buffer = ""   # Phần text đã đọc nhưng chưa chia chunk
+        base = 0      # Offset của buffer[0] trong text đã ghép
+        offset = 0    # Độ dài text đã ghép tới hiện tại
+        state = None  # Ngữ cảnh chương/mục cho phần còn lại của buffer
+        count = 0
+
+        def page_at(position: int) -> int:
+            return table[max(bisect.bisect_right(page_starts, position) - 1, 0)][0]
+
+        def documents(chunks) -> Iterator[LangchainDocument]:
+            nonlocal count
+            for chunk, start, end, structure in chunks:
+                start, end = start + base, end + base
+                metadata = {
+                    "source": source,
+                    "chunk_index": count,
+                    "document_type": ext,
+                    "start_offset": start,
+                    "end_offset": end,
+                    **structure
+                }
+                if ext == "pdf":
+                    metadata["page_number"] = page_at(start)
+                    last_page = page_at(max(end - 1, start))
+                    if last_page != metadata["page_number"]:
+                        metadata["page_end"] = last_page
+                count += 1
+                yield LangchainDocument(page_content=chunk, metadata=metadata)
+
+        for number, page in enumerate(pages, start=1):
+            if not page.strip():
+                continue
+            if offset:
+                buffer += "\n"
+                offset += 1
+            table.append([number, offset, offset + len(page)])
+            page_starts.append(offset)
+            buffer += page
+            offset += len(page)
+            if len(buffer) >= self.stream_window:
+                # Điều quá dài (gấp 4 lần cửa sổ) thì buộc phải cắt để bộ nhớ vẫn bị chặn
+                chunks, cut, state = self._split_stream(buffer, state, final=len(buffer) >= 4 * self.stream_window)
+                yield from documents(chunks)
+                buffer = buffer[cut:]
+                base += cut
+
+        if not offset:
+            print(f"⚠️ No text extracted from {source}, skipping.")
+            return
+        if buffer.strip():
+            chunks, _, _ = self._split_stream(buffer, state, final=True)
+            yield from documents(chunks)
+        print(f"📄 Processed {source} → {count} chunks")
+
+    def _split_stream(self, text: str, state, final: bool) -> Tuple[list, int, object]:
+        """(chunks dạng (nội dung, offset đầu, offset cuối, metadata cấu trúc), vị trí cắt, ngữ cảnh tiếp theo)."""
+        if self.chunker == "legal":
+            chunks, cut, state = self.legal_chunker.split_stream(text, state, final)
+            return [(chunk.text, chunk.start, chunk.end, chunk.metadata) for chunk in chunks], cut, state
+
+        chunks = [
+            (piece.page_content, piece.metadata["start_index"], piece.metadata["start_index"] + len(piece.page_content), {})
+            for piece in self.text_splitter.create_documents([text])
+        ]
+        if final:
+            return chunks, len(text), state
+        if len(chunks) < 2:
+            return [], 0, state
+        # Mảnh cuối có thể còn tiếp ở trang sau: giữ lại để chia cùng phần đọc thêm
+        return chunks[:-1], chunks[-1][1], state
+
+    def iter_documents(self, data_folder: str) -> Iterator[LangchainDocument]:
+        """Như process_documents nhưng trả lười từng chunk, file lớn được đọc theo trang."""
+        for source, _, _, pages, error in self.extract_many(kb_manifest.list_data_files(data_folder).items()):
+            if error is not None:
+                print(f"❌ Error processing {source}: {error}")
+                continue
+            try:
+                yield from self.iter_chunks(pages, source)
             except Exception as e:
-                print(f"❌ Error processing {filename}: {e}")
+                # File đọc lười có thể lỗi giữa chừng
+                print(f"❌ Error processing {source}: {e}")
+
+    def process_documents(self, data_folder: str) -> List[LangchainDocument]:
+        """Trích xuất + chia chunk mọi file được hỗ trợ trong data_folder (kể cả thư mục con).
+
+        source của chunk là đường dẫn tương đối so với data_folder, ví dụ "bo-tai-chinh/2023/abc.pdf".
+        """
+        documents = list(self.iter_documents(data_folder))
         
         print(f"✅ Done! Total documents: {len(documents)} chunks across all files.")
+        if self.extraction_cache is not None:
+            stats = self.extraction_cache.stats()
+            print(f"🗃️ Extraction cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions")
         return documents
 
 if __name__ == "__main__":
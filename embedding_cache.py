@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hóa Unicode (NFC) và khoảng trắng để cùng một chunk luôn cho cùng một hash."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """Kho embedding trên đĩa cho một model: vectors.f32 (các hàng float32 nối tiếp) + keys.txt.
+
+    Đọc qua np.memmap nên không phải nạp toàn bộ vector vào RAM. Chỉ nên có một
+    process ghi vào cùng một thư mục tại một thời điểm.
+    """
+
+    def __init__(self, model_name: str, cache_dir: Optional[str] = None):
+        cache_dir = cache_dir or os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.path = os.path.join(cache_dir, safe_name)
+        os.makedirs(self.path, exist_ok=True)
+        self.model_name = model_name
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._keys_path = os.path.join(self.path, "keys.txt")
+        self._meta_path = os.path.join(self.path, "meta.json")
+        self._lock = threading.Lock()
+        self._rows: dict = {}
+        self._mmap = None
+        self.dim: Optional[int] = None
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r", encoding="utf-8") as file:
+                self.dim = json.load(file)["dim"]
+        if self.dim is None or not os.path.exists(self._keys_path):
+            return
+        with open(self._keys_path, "r", encoding="utf-8") as file:
+            content = file.read()
+        keys = content.split("\n")
+        # Dòng cuối không có "\n" là key ghi dở (hoặc chuỗi rỗng sau "\n" cuối cùng)
+        keys.pop()
+        # Nếu lần ghi trước bị ngắt giữa chừng, chỉ tin các hàng có đủ cả key lẫn vector, rồi cắt
+        # hai file về đúng số hàng đó: hàng thứ i của vectors.f32 luôn ứng với dòng thứ i của keys.txt
+        stored_rows = os.path.getsize(self._vectors_path) // self._row_bytes() if os.path.exists(self._vectors_path) else 0
+        keys = keys[:stored_rows]
+        self._truncate_vectors(len(keys))
+        if content != "".join(f"{key}\n" for key in keys):
+            with open(self._keys_path, "w", encoding="utf-8") as file:
+                file.write("".join(f"{key}\n" for key in keys))
+        for row, key in enumerate(keys):
+            self._rows[key] = row
+
+    def _row_bytes(self) -> int:
+        return self.dim * np.dtype(np.float32).itemsize
+
+    def _truncate_vectors(self, rows: int):
+        """Bỏ các hàng vector thừa (không có key) ở cuối vectors.f32, kể cả hàng ghi dở."""
+        size = rows * self._row_bytes()
+        if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) > size:
+            with open(self._vectors_path, "r+b") as file:
+                file.truncate(size)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _vectors(self) -> Optional[np.ndarray]:
+        rows = len(self._rows)
+        if rows == 0:
+            return None
+        if self._mmap is None or self._mmap.shape[0] < rows:
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._mmap
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        with self._lock:
+            vectors = self._vectors()
+            return [
+                vectors[self._rows[key]].tolist() if vectors is not None and key in self._rows else None
+                for key in keys
+            ]
+
+    def add_many(self, keys: List[str], vectors: List[List[float]]):
+        with self._lock:
+            new = [(key, vector) for key, vector in zip(keys, vectors) if key not in self._rows]
+            if not new:
+                return
+            matrix = np.asarray([vector for _, vector in new], dtype=np.float32)
+            if self.dim is None:
+                self.dim = int(matrix.shape[1])
+                with open(self._meta_path, "w", encoding="utf-8") as file:
+                    json.dump({"model": self.model_name, "dim": self.dim}, file)
+            # Ghi vector trước, key sau: key chỉ xuất hiện khi vector đã nằm trên đĩa. Lần ghi trước
+            # trong process này có thể đã lỗi giữa hai bước, nên cắt hàng thừa để hàng mới bắt đầu
+            # đúng tại len(self._rows)
+            self._truncate_vectors(len(self._rows))
+            with open(self._vectors_path, "ab") as file:
+                file.write(matrix.tobytes())
+            with open(self._keys_path, "a", encoding="utf-8") as file:
+                file.write("".join(f"{key}\n" for key, _ in new))
+            start = len(self._rows)
+            for offset, (key, _) in enumerate(new):
+                self._rows[key] = start + offset
+
+
+class CachedEmbeddings(Embeddings):
+    """Bọc một Embeddings bất kỳ, dùng lại vector của chunk đã từng embed với cùng model."""
+
+    def __init__(self, underlying: Embeddings, model_name: str, store: Optional[EmbeddingStore] = None):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.store = store if store is not None else EmbeddingStore(model_name)
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_hash(text) for text in texts]
+        vectors = self.store.get_many(keys)
+
+        # Chỉ embed các text chưa có trong cache (gộp trùng trong cùng batch)
+        missing: dict = {}
+        for idx, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[idx], texts[idx])
+        if missing:
+            computed = self.underlying.embed_documents(list(missing.values()))
+            self.store.add_many(list(missing.keys()), computed)
+            by_key = dict(zip(missing.keys(), computed))
+            vectors = [vector if vector is not None else list(by_key[key]) for key, vector in zip(keys, vectors)]
+
+        with self._stats_lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stored_vectors": len(self.store),
+        }
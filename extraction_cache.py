@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+from typing import List, Optional
+
+# Tăng số này khi thay đổi logic trích xuất để vô hiệu hóa cache cũ
+EXTRACTOR_VERSION = 3
+
+
+class ExtractionCache:
+    """Cache text đã trích xuất trên đĩa, key = hash nội dung file + cấu hình OCR."""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_mb: Optional[float] = None):
+        self.cache_dir = cache_dir or os.getenv("EXTRACTION_CACHE_DIR", ".cache/extraction")
+        if max_mb is None:
+            max_mb = float(os.getenv("EXTRACTION_CACHE_MAX_MB", "1024"))
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def file_hash(file_path: str) -> str:
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    @staticmethod
+    def settings() -> dict:
+        return {
+            "version": EXTRACTOR_VERSION,
+            "ocr_dpi": os.getenv("PDF_OCR_DPI", "300"),
+            "ocr_lang": os.getenv("PDF_OCR_LANG", "vie+eng"),
+            "ocr_config": os.getenv("PDF_OCR_CONFIG", ""),
+            "ocr_rasterizer": os.getenv("PDF_OCR_RASTERIZER", "fitz").lower(),
+            "ocr_adaptive": os.getenv("PDF_OCR_ADAPTIVE", "1"),
+            "ocr_fast_dpi": os.getenv("PDF_OCR_FAST_DPI", "200"),
+            "ocr_min_conf": os.getenv("PDF_OCR_MIN_CONF", "70"),
+            "ocr_min_word_rate": os.getenv("PDF_OCR_MIN_WORD_RATE", "0.7"),
+            "ocr_blank_ink": os.getenv("PDF_OCR_BLANK_INK", "0.0003"),
+            "min_text_chars": os.getenv("PDF_MIN_TEXT_CHARS", "20"),
+            "garbled_ratio": os.getenv("PDF_GARBLED_RATIO", "0.05"),
+        }
+
+    def make_key(self, content_hash: str, ext: str) -> str:
+        payload = json.dumps({"hash": content_hash, "ext": ext, **self.settings()}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Optional[List[str]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                pages = json.load(file)["pages"]
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        # Cập nhật mtime để eviction theo LRU
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return pages
+
+    def put(self, key: str, pages: List[str], source: str = ""):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"source": source, "pages": pages}, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        # Xóa file ít dùng nhất cho tới khi dưới giới hạn
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,56 @@
+import os
+import re
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeLegalLLM(BaseChatModel):
+    """Chat model giả, chạy offline và cho kết quả xác định (LLM_PROVIDER=fake).
+
+    Trả lời bằng câu đầu tiên của phần "Văn bản pháp luật tham khảo" trong prompt và stream
+    từng từ, có thể giả lập độ trễ để đo time-to-first-token, benchmark, load test...
+    """
+
+    token_latency_ms: float = 0.0
+    first_token_latency_ms: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-legal"
+
+    @staticmethod
+    def _answer_for(messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        context = prompt.split("Văn bản pháp luật tham khảo:", 1)[-1].split("Câu hỏi:", 1)[0].strip()
+        if not context:
+            return "Tôi không tìm thấy thông tin này trong các văn bản pháp luật hiện có."
+        first_sentence = re.split(r"(?<=[.;:])\s", context, maxsplit=1)[0]
+        return f"Theo văn bản tham khảo: {first_sentence[:300]}"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        answer = self._answer_for(messages)
+        time.sleep((self.first_token_latency_ms + self.token_latency_ms * len(answer.split())) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency_ms / 1000)
+        for i, word in enumerate(self._answer_for(messages).split(" ")):
+            time.sleep(self.token_latency_ms / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def fake_llm_from_env() -> FakeLegalLLM:
+    return FakeLegalLLM(
+        token_latency_ms=float(os.getenv("FAKE_LLM_TOKEN_MS", "0")),
+        first_token_latency_ms=float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", "0")),
+    )
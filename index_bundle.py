@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Bundle index: bundle.json mô tả một vectorstore dựng sẵn để node phục vụ load ở chế độ chỉ đọc.
+
+bundle.json ghi model embedding (provider, model id, số chiều), cấu hình chia chunk và index FAISS,
+tóm tắt corpus (từ manifest.json) và sha256 của từng file trong vectorstore. build/sync ghi lại
+bundle sau mỗi lần lưu; load_knowledge_base đối chiếu bundle với cấu hình hiện tại và từ chối
+load nếu sai model/số chiều hoặc file bị thay đổi.
+
+Ví dụ:
+    python index_bundle.py                  # kiểm tra bundle của vectorstore/legal_faiss
+    python index_bundle.py --write          # tạo bundle cho vectorstore dựng trước khi có bundle.json
+"""
+
+import os
+import json
+import hashlib
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import chunk_store
+import kb_manifest
+import vector_index
+from lexical_index import LEXICAL_INDEX_FILE
+from legal_chunker import HIERARCHY_FILE
+
+BUNDLE_FILE = "bundle.json"
+BUNDLE_FORMAT = 1
+# Các file thuộc vectorstore (file nào không có thì bỏ qua, ví dụ index.pkl sau khi đã chuyển đổi);
+# file của chunk store đổi tên theo thế hệ nên được thêm vào theo từng thư mục (xem artifact_files)
+ARTIFACT_FILES = (
+    "index.faiss",
+    chunk_store.CURRENT_FILE,
+    chunk_store.LEGACY_FILE,
+    vector_index.INDEX_PARAMS_FILE,
+    LEXICAL_INDEX_FILE,
+    HIERARCHY_FILE,
+    kb_manifest.MANIFEST_FILE,
+    kb_manifest.PAGE_OFFSETS_FILE,
+)
+
+
+class BundleMismatchError(ValueError):
+    """Vectorstore không khớp với bundle.json hoặc với cấu hình embedding hiện tại."""
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_files(folder: str) -> tuple:
+    return ARTIFACT_FILES + tuple(chunk_store.chunk_files(folder).values())
+
+
+def artifact_checksums(folder: str, previous: Optional[dict] = None,
+                       rewritten: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+    """sha256 + size của các file hiện có. Nếu biết bundle trước (previous) và các file vừa được ghi lại
+    (rewritten), file khác được dùng lại checksum cũ thay vì đọc lại toàn bộ (sync không đổi index.faiss)."""
+    reusable = {} if previous is None or rewritten is None else previous["files"]
+    rewritten = set(rewritten or ())
+    checksums = {}
+    for name in artifact_files(folder):
+        path = os.path.join(folder, name)
+        if not os.path.exists(path):
+            continue
+        size = os.path.getsize(path)
+        if name not in rewritten and name in reusable and reusable[name]["size"] == size:
+            checksums[name] = reusable[name]
+        else:
+            checksums[name] = {"sha256": file_sha256(path), "size": size}
+    return checksums
+
+
+def corpus_summary(manifest: Optional[dict]) -> dict:
+    files = (manifest or {}).get("files", {})
+    return {
+        "files": len(files),
+        "chunks": sum(len(entry.get("chunk_ids", [])) for entry in files.values()),
+        "sources": {source: entry.get("hash") for source, entry in sorted(files.items())},
+    }
+
+
+def write_bundle(folder: str, embedding: dict, dimension: int, vectors: int, splitter: dict,
+                 index_params: Optional[dict], previous: Optional[dict] = None,
+                 rewritten: Optional[Iterable[str]] = None) -> dict:
+    """Ghi bundle.json cho các file hiện có trong folder; gọi sau khi mọi file của vectorstore đã được lưu.
+
+    previous/rewritten: xem artifact_checksums (chỉ hash lại các file vừa ghi)."""
+    checksums = artifact_checksums(folder, previous, rewritten)
+    # Id của bundle chỉ phụ thuộc nội dung: cùng file → cùng id trên mọi node
+    bundle_id = hashlib.sha256(
+        json.dumps({name: item["sha256"] for name, item in checksums.items()}, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:16]
+    bundle = {
+        "format": BUNDLE_FORMAT,
+        "bundle_id": bundle_id,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "embedding": {**embedding, "dimension": dimension},
+        "vectors": vectors,
+        "splitter": splitter,
+        "index": index_params,
+        "corpus": corpus_summary(kb_manifest.load_manifest(folder)),
+        "files": checksums,
+    }
+    path = os.path.join(folder, BUNDLE_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(bundle, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return bundle
+
+
+def load_bundle(folder: str) -> Optional[dict]:
+    """Đọc bundle.json; None nếu vectorstore chưa có bundle. File hỏng hoặc khác định dạng thì báo lỗi."""
+    path = os.path.join(folder, BUNDLE_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            bundle = json.load(file)
+    except ValueError as e:
+        raise BundleMismatchError(f"{BUNDLE_FILE} is corrupted: {e}")
+    if bundle.get("format") != BUNDLE_FORMAT:
+        raise BundleMismatchError(f"Unsupported {BUNDLE_FILE} format {bundle.get('format')} (expected {BUNDLE_FORMAT}).")
+    return bundle
+
+
+def check_embedding(bundle: dict, provider: str, model: str):
+    expected = bundle["embedding"]
+    if (expected.get("provider"), expected.get("model")) != (provider, model):
+        raise BundleMismatchError(
+            f"Index was built with {expected.get('provider')}:{expected.get('model')} "
+            f"but the configured embedding model is {provider}:{model}."
+        )
+
+
+def check_files(folder: str, bundle: dict) -> List[str]:
+    """So sha256 của từng file với bundle; trả về danh sách lỗi (rỗng nếu khớp)."""
+    problems = []
+    for name, expected in bundle["files"].items():
+        path = os.path.join(folder, name)
+        if not os.path.exists(path):
+            problems.append(f"{name}: missing")
+        elif os.path.getsize(path) != expected["size"]:
+            problems.append(f"{name}: size {os.path.getsize(path)} != {expected['size']}")
+        elif file_sha256(path) != expected["sha256"]:
+            problems.append(f"{name}: checksum mismatch")
+    # File thuộc vectorstore xuất hiện sau khi bundle được tạo (ví dụ index.pkl được chép đè vào)
+    for name in artifact_files(folder):
+        if name not in bundle["files"] and os.path.exists(os.path.join(folder, name)):
+            problems.append(f"{name}: not part of bundle")
+    return problems
+
+
+def verify_bundle(folder: str, bundle: dict, provider: str, model: str, checksums: bool = True):
+    """Kiểm tra trước khi load: model embedding và (tùy chọn) checksum các file. Sai thì raise BundleMismatchError."""
+    check_embedding(bundle, provider, model)
+    if checksums:
+        problems = check_files(folder, bundle)
+        if problems:
+            raise BundleMismatchError(f"Vectorstore does not match {BUNDLE_FILE}: " + "; ".join(problems))
+
+
+def check_dimension(bundle: dict, dimension: int, vectors: int):
+    """Kiểm tra sau khi đọc index.faiss: số chiều và số vector phải đúng như bundle."""
+    expected = bundle["embedding"]["dimension"]
+    if dimension != expected:
+        raise BundleMismatchError(f"index.faiss has dimension {dimension} but {BUNDLE_FILE} says {expected}.")
+    if vectors != bundle["vectors"]:
+        raise BundleMismatchError(f"index.faiss has {vectors} vectors but {BUNDLE_FILE} says {bundle['vectors']}.")
+
+
+def describe(bundle: dict) -> str:
+    embedding = bundle["embedding"]
+    return (f"bundle {bundle['bundle_id']} ({embedding['provider']}:{embedding['model']}, {embedding['dimension']} chiều, "
+            f"{bundle['vectors']} vector, {bundle['corpus']['files']} file, tạo lúc {bundle['created_at']})")
+
+
+def main():
+    import faiss
+    from dotenv import load_dotenv
+    from legal_chunker import splitter_settings
+
+    parser = argparse.ArgumentParser(description="Kiểm tra hoặc tạo bundle.json cho vectorstore dựng sẵn")
+    parser.add_argument("--path", default="vectorstore/legal_faiss")
+    parser.add_argument("--write", action="store_true",
+                        help="Ghi bundle.json cho vectorstore hiện có theo cấu hình embedding trong env")
+    args = parser.parse_args()
+    load_dotenv()
+
+    if args.write:
+        from legal_rag import embedding_config
+
+        index = faiss.read_index(os.path.join(args.path, "index.faiss"))
+        # Chỉ đọc cấu hình provider/model trong env, không tạo client embedding
+        bundle = write_bundle(args.path, embedding_config(), index.d, index.ntotal, splitter_settings(),
+                              vector_index.load_params(args.path))
+        print(f"✅ Đã ghi {BUNDLE_FILE}: {describe(bundle)}")
+        return
+
+    bundle = load_bundle(args.path)
+    if bundle is None:
+        raise SystemExit(f"❌ {args.path} chưa có {BUNDLE_FILE}. Chạy 'python index_bundle.py --write' hoặc rebuild_kb.py.")
+    print(f"📦 {describe(bundle)}")
+    problems = check_files(args.path, bundle)
+    index = faiss.read_index(os.path.join(args.path, "index.faiss"))
+    try:
+        check_dimension(bundle, index.d, index.ntotal)
+    except BundleMismatchError as e:
+        problems.append(str(e))
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        raise SystemExit(1)
+    print(f"✅ {len(bundle['files'])} file khớp checksum")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import os
+import queue
+import pickle
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+import kb_manifest
+import vector_index
+
+_DONE = object()
+
+
+@dataclass
+class EmbeddedBatch:
+    texts: List[str]
+    metadatas: List[dict]
+    ids: List[str]
+    vectors: List[List[float]]
+
+
+class StreamingIndexBuilder:
+    """Pipeline trích xuất → chia chunk → embed theo batch, nối với nhau bằng queue có giới hạn.
+
+    Trích xuất và chia chunk chạy trên thread riêng, embed chạy song song trên thread pool,
+    nên các stage chồng lên nhau. Queue đầy sẽ chặn stage phía trước (backpressure), vì vậy
+    bộ nhớ chỉ giữ vài file và vài batch cùng lúc thay vì toàn bộ corpus.
+    """
+
+    def __init__(self, embeddings, processor, batch_size: Optional[int] = None,
+                 queue_size: Optional[int] = None, embed_workers: Optional[int] = None,
+                 index_settings: Optional[dict] = None):
+        self.embeddings = embeddings
+        self.processor = processor
+        self.batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+        self.queue_size = queue_size or int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+        self.embed_workers = embed_workers or int(os.getenv("EMBEDDING_WORKERS", "2"))
+        # Loại index FAISS dùng khi tạo store mới (flat/ivf_flat/ivf_pq/hnsw)
+        self.index_settings = index_settings or vector_index.index_settings()
+        # Manifest entry và bảng offset theo trang (PDF) của các file đã chia chunk (dùng cho kb_manifest)
+        self.file_entries: dict = {}
+        self.page_offsets: dict = {}
+        self.total_chunks = 0
+
+    def add_to_store(self, store: Optional[FAISS], files: Iterable[Tuple[str, str]]) -> Optional[FAISS]:
+        """Embed các file (source, path) và nối vector vào store ngay khi từng batch xong.
+
+        Nếu store là None, index mới được tạo theo self.index_settings. Index IVF cần train trên
+        mẫu của toàn corpus (không chỉ các file đầu), nên xem _create_trained_store.
+        """
+        batches = self.iter_batches(files)
+        if store is None and vector_index.training_size(self.index_settings):
+            return self._create_trained_store(batches)
+        for batch in batches:
+            if store is None:
+                store = self._create_store(batch.vectors)
+            self.append_batch(store, batch)
+        return store
+
+    def _create_store(self, training_vectors) -> FAISS:
+        sample = np.asarray(training_vectors, dtype=np.float32)
+        index = vector_index.create_index(self.index_settings, sample.shape[1], sample)
+        return FAISS(self.embeddings, index, InMemoryDocstore(), {})
+
+    def _create_trained_store(self, batches: Iterator[EmbeddedBatch]) -> Optional[FAISS]:
+        """Tạo index IVF: lấy mẫu reservoir trên mọi vector rồi mới train và nối vector vào index.
+
+        Trong lúc embed, các batch được ghi tạm ra đĩa thay vì giữ trong RAM, nên bộ nhớ chỉ tốn
+        cho mẫu train (FAISS_TRAIN_SIZE vector); đổi lại phải ghi/đọc lại corpus đã embed một lần
+        và store chỉ có vector sau khi embed xong toàn bộ.
+        """
+        sampler = vector_index.ReservoirSample(vector_index.training_size(self.index_settings))
+        with tempfile.TemporaryFile(prefix="ingest-batches-") as spill:
+            count = 0
+            for batch in batches:
+                sampler.add(batch.vectors)
+                pickle.dump(batch, spill, protocol=pickle.HIGHEST_PROTOCOL)
+                count += 1
+            if not count:
+                return None
+            print(f"🎯 Train index {self.index_settings['type']} trên {len(sampler.sample())}/{sampler.seen} vector lấy mẫu đều từ toàn corpus")
+            store = self._create_store(sampler.sample())
+            spill.seek(0)
+            for _ in range(count):
+                self.append_batch(store, pickle.load(spill))
+        return store
+
+    def append_batch(self, store: FAISS, batch: EmbeddedBatch):
+        store.add_embeddings(list(zip(batch.texts, batch.vectors)), metadatas=batch.metadatas, ids=batch.ids)
+        self.total_chunks += len(batch.ids)
+
+    def iter_batches(self, files: Iterable[Tuple[str, str]]) -> Iterator[EmbeddedBatch]:
+        extracted_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        batch_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        errors: List[BaseException] = []
+        stop = threading.Event()
+
+        def put(q: queue.Queue, item) -> bool:
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(q: queue.Queue):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def extract_stage():
+            extracted = self.processor.extract_many(files)
+            try:
+                for source, file_path, content_hash, pages, error in extracted:
+                    if error is not None:
+                        print(f"❌ Error processing {source}: {error}")
+                        continue
+                    if not put(extracted_q, (source, file_path, content_hash, pages)):
+                        return
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                extracted.close()
+                put(extracted_q, _DONE)
+
+        def chunk_stage():
+            pending_docs: list = []
+            pending_ids: List[str] = []
+            try:
+                while True:
+                    item = get(extracted_q)
+                    if item is _DONE:
+                        break
+                    source, file_path, content_hash, pages = item
+                    # pages có thể là iterator lười (file lớn): chunk được đưa đi embed ngay khi đủ batch
+                    table: List[List[int]] = []
+                    ids: List[str] = []
+                    for document in self.processor.iter_chunks(pages, source, page_table=table):
+                        ids.append(kb_manifest.chunk_id(content_hash, source, document.metadata["chunk_index"]))
+                        pending_docs.append(document)
+                        pending_ids.append(ids[-1])
+                        if len(pending_docs) >= self.batch_size:
+                            if not put(batch_q, (pending_docs, pending_ids)):
+                                return
+                            pending_docs, pending_ids = [], []
+                    if not ids:
+                        continue
+                    self.file_entries[source] = kb_manifest.file_entry(file_path, content_hash, ids)
+                    if source.lower().endswith(".pdf"):
+                        self.page_offsets[source] = table
+                if pending_docs:
+                    put(batch_q, (pending_docs, pending_ids))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                put(batch_q, _DONE)
+
+        threads = [
+            threading.Thread(target=extract_stage, name="ingest-extract", daemon=True),
+            threading.Thread(target=chunk_stage, name="ingest-chunk", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Số batch embed đồng thời tối đa; khi đầy thì chờ batch cũ nhất xong rồi mới lấy batch mới
+        max_in_flight = self.embed_workers * 2
+        in_flight: deque = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=self.embed_workers, thread_name_prefix="ingest-embed") as pool:
+                while True:
+                    item = get(batch_q)
+                    if item is _DONE:
+                        break
+                    documents, ids = item
+                    texts = [doc.page_content for doc in documents]
+                    future = pool.submit(self.embeddings.embed_documents, texts)
+                    in_flight.append((texts, [doc.metadata for doc in documents], ids, future))
+                    if len(in_flight) >= max_in_flight:
+                        yield self._collect(in_flight.popleft())
+                # Trả batch theo đúng thứ tự gửi để thứ tự vector trong index ổn định
+                while in_flight:
+                    yield self._collect(in_flight.popleft())
+            if errors:
+                raise errors[0]
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    @staticmethod
+    def _collect(entry) -> EmbeddedBatch:
+        texts, metadatas, ids, future = entry
+        return EmbeddedBatch(texts=texts, metadatas=metadatas, ids=ids, vectors=future.result())
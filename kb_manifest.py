@@ -0,0 +1,90 @@
+import os
+import json
+import bisect
+from typing import Dict, List, Optional
+
+MANIFEST_FILE = "manifest.json"
+PAGE_OFFSETS_FILE = "page_offsets.json"
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt')
+
+
+def manifest_path(vectorstore_path: str) -> str:
+    return os.path.join(vectorstore_path, MANIFEST_FILE)
+
+
+def load_manifest(vectorstore_path: str) -> Optional[dict]:
+    """Đọc manifest các file đã index. Trả về None nếu chưa có hoặc file hỏng."""
+    try:
+        with open(manifest_path(vectorstore_path), "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or "files" not in manifest:
+        return None
+    return manifest
+
+
+def save_manifest(vectorstore_path: str, manifest: dict):
+    os.makedirs(vectorstore_path, exist_ok=True)
+    path = manifest_path(vectorstore_path)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_page_offsets(vectorstore_path: str) -> Dict[str, List[List[int]]]:
+    """Bảng offset theo trang của từng file: {tên file: [[số trang, offset đầu, offset cuối], ...]}."""
+    try:
+        with open(os.path.join(vectorstore_path, PAGE_OFFSETS_FILE), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_page_offsets(vectorstore_path: str, page_offsets: Dict[str, List[List[int]]]):
+    os.makedirs(vectorstore_path, exist_ok=True)
+    path = os.path.join(vectorstore_path, PAGE_OFFSETS_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(page_offsets, file, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def page_for_offset(page_table: List[List[int]], offset: int) -> Optional[int]:
+    """Số trang chứa ký tự tại offset (offset trong text đã ghép của file, như start_offset của chunk)."""
+    if not page_table:
+        return None
+    i = bisect.bisect_right([start for _, start, _ in page_table], offset) - 1
+    return page_table[max(i, 0)][0]
+
+
+def chunk_id(content_hash: str, source: str, chunk_index: int) -> str:
+    """Id ổn định của chunk: cùng nội dung + cùng tên file → cùng id qua các lần build."""
+    return f"{content_hash[:16]}:{source}:{chunk_index}"
+
+
+def file_entry(file_path: str, content_hash: str, chunk_ids: List[str]) -> dict:
+    stat = os.stat(file_path)
+    return {
+        "hash": content_hash,
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "chunk_ids": chunk_ids,
+    }
+
+
+def list_data_files(data_folder: str) -> dict:
+    """Map source → đường dẫn cho các file được hỗ trợ trong thư mục data, kể cả thư mục con.
+
+    source là đường dẫn tương đối dạng "bo-tai-chinh/2023/abc.pdf" (luôn dùng "/"), file ở thư mục
+    gốc giữ nguyên tên nên id chunk của knowledge base cũ không đổi.
+    """
+    files = {}
+    for root, dirs, filenames in os.walk(data_folder):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        for filename in filenames:
+            if filename.endswith(SUPPORTED_EXTENSIONS):
+                file_path = os.path.join(root, filename)
+                files[os.path.relpath(file_path, data_folder).replace(os.sep, "/")] = file_path
+    return dict(sorted(files.items()))
@@ -0,0 +1,464 @@
+import os
+import re
+import json
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+
+HIERARCHY_FILE = "hierarchy.json"
+# Splitter theo độ dài cho văn bản không có cấu trúc điều (và cho CHUNKER=recursive)
+FALLBACK_CHUNK_SIZE = 1000
+FALLBACK_CHUNK_OVERLAP = 200
+
+# Tiêu đề chỉ được nhận khi đứng đầu dòng; "theo quy định tại Điều 64 của Luật này" không phải tiêu đề
+_CHUONG_RE = re.compile(r"^(?:Chương|CHƯƠNG)\s+([IVXLCDM]+|\d+)\b\s*[.:]?\s*(.*)$")
+_MUC_RE = re.compile(r"^(?:Mục|MỤC)\s+(\d+)\b\s*[.:]?\s*(.*)$")
+_DIEU_RE = re.compile(r"^(?:Điều|ĐIỀU)\s+(\d+)([a-zđ]?)\s*(?:[.:]\s*(.*))?$")
+_KHOAN_RE = re.compile(r"^(\d+)\.\s+\S")
+_DIEM_RE = re.compile(r"^([a-zđ])\)\s")
+# Dòng mở đầu một văn bản đi kèm (quy định/quy chế ban hành kèm theo, phụ lục): sau dòng này số điều
+# được đánh lại từ đầu. Tiêu đề phải viết hoa toàn bộ, hoặc là dòng "(Ban hành) kèm theo..." trong ngoặc
+# hay "Phụ lục II" đứng riêng, để câu bị ngắt dòng không bị nhận nhầm
+_PART_TITLE_RE = re.compile(r"^(?:QUY ĐỊNH|QUY CHẾ|ĐIỀU LỆ|PHỤ LỤC)\b")
+_PART_LINE_RE = re.compile(r"^\((?:ban hành )?kèm theo\b|^phụ lục(?:\s+(?:số\s+)?[ivxlcdm\d]+[a-z]?)?\s*$", re.IGNORECASE)
+
+
+@dataclass
+class LegalChunk:
+    text: str
+    # Vị trí [start, end) của phần nội dung trong text gốc (không tính tiêu đề điều được lặp lại)
+    start: int
+    end: int
+    metadata: dict = field(default_factory=dict)
+
+
+@dataclass
+class _Unit:
+    """Một khoản (hoặc điểm) trong điều: nhãn + vị trí trong text gốc."""
+    label: str
+    start: int
+    end: int
+    children: List["_Unit"] = field(default_factory=list)
+    # Vị trí dòng "1. ..." của khoản; khác start khi khoản đầu được gộp với tiêu đề điều
+    lead_start: Optional[int] = None
+
+
+@dataclass
+class _Article:
+    dieu: str
+    title: str
+    start: int
+    end: int
+    heading: str
+    heading_end: int
+    chuong: Optional[str] = None
+    chuong_title: Optional[str] = None
+    muc: Optional[str] = None
+    clauses: List[_Unit] = field(default_factory=list)
+    # Thứ tự của văn bản chứa điều: 0 là văn bản chính, 1, 2... là các văn bản/phụ lục đi kèm
+    van_ban: int = 0
+
+
+@dataclass
+class ParseState:
+    """Ngữ cảnh để parse tiếp một đoạn văn bản bắt đầu ngay tại một điều (khi chia chunk dạng stream)."""
+    chuong: Optional[str] = None
+    chuong_title: Optional[str] = None
+    muc: Optional[str] = None
+    last_dieu: int = 0
+    van_ban: int = 0
+    # Đã gặp tiêu đề văn bản đi kèm (hoặc Chương I sau chương khác) nhưng chưa gặp điều nào sau đó
+    part_break: bool = False
+
+
+def _is_part_break(line: str, chapter_match, chuong: Optional[str]) -> bool:
+    """Dòng bắt đầu một văn bản đi kèm: tiêu đề QUY ĐỊNH/PHỤ LỤC... hoặc "Chương I" sau một chương khác."""
+    if chapter_match is not None:
+        return chapter_match.group(1) in ("I", "1") and chuong not in (None, "I", "1")
+    return bool(_PART_TITLE_RE.match(line)) and line == line.upper() or bool(_PART_LINE_RE.match(line))
+
+
+def _lines(text: str) -> List[Tuple[int, int, str]]:
+    """(start, end, dòng đã strip + NFC) cho từng dòng; so khớp trên bản NFC nhưng giữ offset của text gốc."""
+    lines = []
+    start = 0
+    for line in text.split("\n"):
+        lines.append((start, start + len(line), unicodedata.normalize("NFC", line.strip())))
+        start += len(line) + 1
+    return lines
+
+
+def parse_structure(text: str, state: Optional[ParseState] = None) -> Tuple[List[_Article], int]:
+    """Tách văn bản thành các điều (kèm chương/mục/khoản/điểm).
+
+    Trả về (danh sách điều, vị trí bắt đầu tiêu đề đầu tiên); phần trước đó là lời văn đầu
+    (quốc hiệu, căn cứ ban hành...). Số điều phải tăng dần và số khoản phải liên tiếp,
+    để dòng bị ngắt giữa câu không bị nhận nhầm là tiêu đề. Số điều chỉ được đánh lại sau
+    tiêu đề của văn bản đi kèm (QUY ĐỊNH, PHỤ LỤC, "Ban hành kèm theo...", Chương I mới); các
+    điều sau đó có van_ban tăng thêm 1. state là ngữ cảnh chương/mục/số điều của phần văn bản
+    đứng trước text.
+    """
+    articles, first_heading, _ = _parse(text, state)
+    return articles, first_heading
+
+
+def _parse(text: str, state: Optional[ParseState] = None) -> Tuple[List[_Article], int, ParseState]:
+    """Như parse_structure, kèm ngữ cảnh ở cuối text để parse tiếp phần văn bản sau đó."""
+    state = state or ParseState()
+    articles: List[_Article] = []
+    first_heading = len(text)
+    chuong, chuong_title, muc = state.chuong, state.chuong_title, state.muc
+    pending_title = False
+    last_dieu, van_ban, part_break = state.last_dieu, state.van_ban, state.part_break
+    current: Optional[_Article] = None
+
+    def close(position: int):
+        nonlocal current
+        if current is None:
+            return
+        current.end = position
+        if current.clauses:
+            current.clauses[-1].end = position
+        for clause in current.clauses:
+            if clause.children:
+                clause.children[-1].end = clause.end
+        articles.append(current)
+        current = None
+
+    for start, end, line in _lines(text):
+        if not line:
+            continue
+        if pending_title:
+            # Tên chương nằm ở dòng ngay sau "Chương I"
+            chuong_title = line
+            pending_title = False
+            continue
+
+        match = _CHUONG_RE.match(line)
+        if _is_part_break(line, match, chuong):
+            part_break = True
+            if match is None:
+                # Văn bản đi kèm có chương/mục riêng (hoặc không có)
+                chuong, chuong_title, muc = None, None, None
+        if match:
+            close(start)
+            first_heading = min(first_heading, start)
+            chuong, chuong_title, muc = match.group(1), match.group(2) or None, None
+            pending_title = not chuong_title
+            continue
+
+        match = _MUC_RE.match(line)
+        if match:
+            close(start)
+            first_heading = min(first_heading, start)
+            muc = match.group(1)
+            continue
+
+        match = _DIEU_RE.match(line)
+        if match and (int(match.group(1)) > last_dieu or part_break):
+            close(start)
+            first_heading = min(first_heading, start)
+            if int(match.group(1)) <= last_dieu:
+                van_ban += 1
+            last_dieu, part_break = int(match.group(1)), False
+            current = _Article(dieu=match.group(1) + match.group(2), title=(match.group(3) or "").strip(),
+                               start=start, end=len(text), heading=line, heading_end=end,
+                               chuong=chuong, chuong_title=chuong_title, muc=muc, van_ban=van_ban)
+            continue
+
+        if current is None:
+            continue
+        match = _KHOAN_RE.match(line)
+        if match and int(match.group(1)) == len(current.clauses) + 1:
+            if current.clauses:
+                current.clauses[-1].end = start
+            current.clauses.append(_Unit(match.group(1), start, 0))
+            continue
+        match = _DIEM_RE.match(line)
+        if match and current.clauses:
+            points = current.clauses[-1].children
+            if points:
+                points[-1].end = start
+            points.append(_Unit(match.group(1), start, 0))
+
+    close(len(text))
+    return articles, first_heading, ParseState(chuong, chuong_title, muc, last_dieu, van_ban, part_break)
+
+
+def splitter_settings() -> dict:
+    """Cấu hình chia chunk hiện tại (theo env); được ghi vào bundle để biết index được chia thế nào."""
+    return {
+        "chunker": os.getenv("CHUNKER", "legal").lower(),
+        "legal_chunk_size": int(os.getenv("LEGAL_CHUNK_SIZE", "1200")),
+        "chunk_size": FALLBACK_CHUNK_SIZE,
+        "chunk_overlap": FALLBACK_CHUNK_OVERLAP,
+    }
+
+
+class LegalStructureChunker:
+    """Chia văn bản pháp luật theo cấu trúc Chương / Mục / Điều / Khoản / Điểm, không overlap.
+
+    Các điều ngắn liên tiếp trong cùng chương/mục được gộp thành một chunk; điều dài được chia theo
+    nhóm khoản liên tiếp (khoản quá dài thì theo nhóm điểm) và mỗi phần được lặp lại dòng tiêu đề
+    điều ở đầu. Văn bản không nhận ra cấu trúc điều được chia bằng splitter thông thường.
+    """
+
+    def __init__(self, chunk_size: Optional[int] = None):
+        self.chunk_size = chunk_size or int(os.getenv("LEGAL_CHUNK_SIZE", "1200"))
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        # Phần không có cấu trúc điều (lời văn đầu, văn bản thường) chia như trước đây
+        self.fallback_splitter = RecursiveCharacterTextSplitter(chunk_size=FALLBACK_CHUNK_SIZE, chunk_overlap=FALLBACK_CHUNK_OVERLAP,
+                                                                add_start_index=True)
+
+    def split(self, text: str, state: Optional[ParseState] = None) -> List[LegalChunk]:
+        articles, first_heading = parse_structure(text, state)
+        if not articles:
+            return self._split_plain(text, 0, len(text), self.fallback_splitter)
+
+        chunks = self._split_plain(text, 0, first_heading, self.fallback_splitter)
+        run: List[_Article] = []
+        run_size = 0
+        for article in articles:
+            size = len(text[article.start:article.end].strip())
+            if size > self.chunk_size:
+                chunks.extend(self._merge_articles(text, run))
+                run, run_size = [], 0
+                chunks.extend(self._split_article(text, article))
+                continue
+            if run and ((run[-1].van_ban, run[-1].chuong, run[-1].muc) != (article.van_ban, article.chuong, article.muc)
+                        or run_size + size > self.chunk_size):
+                chunks.extend(self._merge_articles(text, run))
+                run, run_size = [], 0
+            run.append(article)
+            run_size += size
+        chunks.extend(self._merge_articles(text, run))
+        return chunks
+
+    def split_stream(self, text: str, state: Optional[ParseState] = None,
+                     final: bool = False) -> Tuple[List[LegalChunk], int, ParseState]:
+        """Chia phần đầu của một đoạn văn bản còn đang được đọc tiếp.
+
+        Trả về (chunks của text[:cut], cut, ngữ cảnh để parse tiếp text[cut:]). Đoạn được cắt ở đầu
+        điều cuối cùng vì điều đó có thể còn tiếp ở trang sau; không có điều nào thì giữ lại mảnh cuối
+        của splitter thường. final=True chia hết text. cut = 0 nghĩa là cần đọc thêm mới cắt được.
+        """
+        state = state or ParseState()
+        if final:
+            # Ngữ cảnh ở cuối text cho phần đọc sau (khi bị buộc cắt vì điều quá dài)
+            return self.split(text, state), len(text), _parse(text, state)[2]
+        articles, _ = parse_structure(text, state)
+        if articles:
+            last = articles[-1]
+            if last.start == 0:
+                return [], 0, state
+            previous = articles[-2] if len(articles) > 1 else None
+            # Điều cuối được parse lại từ đầu phần sau: nếu nó mở đầu văn bản đi kèm thì bắt đầu đếm lại
+            if previous is not None:
+                last_dieu = int(re.match(r"\d+", previous.dieu).group()) if previous.van_ban == last.van_ban else 0
+            else:
+                last_dieu = state.last_dieu if state.van_ban == last.van_ban else 0
+            next_state = ParseState(last.chuong, last.chuong_title, last.muc, last_dieu, last.van_ban)
+            return self.split(text[:last.start], state), last.start, next_state
+        chunks = self._split_plain(text, 0, len(text), self.fallback_splitter)
+        if len(chunks) < 2:
+            return [], 0, state
+        # Tiêu đề chương/văn bản đi kèm trong phần đã chia xong vẫn phải được nhớ cho điều tiếp theo
+        return chunks[:-1], chunks[-1].start, _parse(text[:chunks[-1].start], state)[2]
+
+    @staticmethod
+    def _article_metadata(article: _Article) -> dict:
+        metadata = {"dieu": article.dieu, "dieu_title": article.title}
+        if article.chuong:
+            metadata["chuong"] = article.chuong
+            if article.chuong_title:
+                metadata["chuong_title"] = article.chuong_title
+        if article.muc:
+            metadata["muc"] = article.muc
+        if article.van_ban:
+            metadata["van_ban"] = article.van_ban
+        return metadata
+
+    def _merge_articles(self, text: str, run: List[_Article]) -> List[LegalChunk]:
+        """Một chunk cho các điều ngắn liên tiếp (dieu = "5-7", dieu_list liệt kê từng điều)."""
+        if not run:
+            return []
+        metadata = self._article_metadata(run[0])
+        if len(run) > 1:
+            metadata["dieu"] = f"{run[0].dieu}-{run[-1].dieu}"
+            metadata["dieu_list"] = [article.dieu for article in run]
+            metadata["dieu_title"] = "; ".join(article.title for article in run if article.title)
+        start, end = run[0].start, run[-1].end
+        return [LegalChunk(text[start:end].strip(), start, end, metadata)]
+
+    def _split_plain(self, text: str, start: int, end: int, splitter=None, prefix: str = "",
+                     metadata: Optional[dict] = None) -> List[LegalChunk]:
+        if splitter is None:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+            # Dùng khi một điều/khoản/điểm vẫn dài hơn chunk_size; chừa chỗ cho tiêu đề lặp lại
+            splitter = RecursiveCharacterTextSplitter(chunk_size=max(self.chunk_size - len(prefix), 200),
+                                                      chunk_overlap=0, add_start_index=True)
+        metadata = dict(metadata or {})
+        if prefix:
+            metadata["prefix_chars"] = len(prefix)
+        chunks = []
+        for piece in splitter.create_documents([text[start:end]]):
+            if not piece.page_content.strip():
+                continue
+            piece_start = start + piece.metadata.get("start_index", 0)
+            chunks.append(LegalChunk(prefix + piece.page_content, piece_start,
+                                     piece_start + len(piece.page_content), dict(metadata)))
+        return chunks
+
+    def _split_article(self, text: str, article: _Article) -> List[LegalChunk]:
+        metadata = self._article_metadata(article)
+        prefix = article.heading + "\n"
+        if not article.clauses:
+            return self._split_plain(text, article.heading_end, article.end, prefix=prefix, metadata=metadata)
+
+        # Tiêu đề + câu dẫn của điều luôn đi cùng khoản 1
+        first = article.clauses[0]
+        units = [_Unit(first.label, article.start, first.end, first.children, lead_start=first.start)] + article.clauses[1:]
+        chunks = []
+        for group in self._group(units, self.chunk_size - len(prefix)):
+            chunk_metadata = {**metadata, **self._labels("khoan", group)}
+            if len(group) == 1 and group[0].end - group[0].start > self.chunk_size - len(prefix):
+                chunks.extend(self._split_clause(text, group[0], prefix, chunk_metadata))
+            elif group[0].start == article.start:
+                chunks.append(LegalChunk(text[group[0].start:group[-1].end].strip(), group[0].start,
+                                         group[-1].end, chunk_metadata))
+            else:
+                chunks.append(self._prefixed(text, group, prefix, chunk_metadata))
+        return chunks
+
+    def _split_clause(self, text: str, clause: _Unit, prefix: str, metadata: dict) -> List[LegalChunk]:
+        if not clause.children:
+            return self._split_plain(text, clause.start, clause.end, prefix=prefix, metadata=metadata)
+        # Câu dẫn của khoản (trước điểm a) đi cùng điểm a; các nhóm sau lặp lại dòng đầu của khoản
+        lead_start = clause.lead_start if clause.lead_start is not None else clause.start
+        lead = text[lead_start:clause.end].strip().split("\n", 1)[0]
+        first = clause.children[0]
+        units = [_Unit(first.label, clause.start, first.end)] + clause.children[1:]
+        chunks = []
+        for group in self._group(units, self.chunk_size - len(prefix) - len(lead) - 1):
+            chunk_metadata = {**metadata, **self._labels("diem", group)}
+            if group[0].start == clause.start:
+                group_prefix = "" if clause.lead_start is not None else prefix
+            else:
+                group_prefix = f"{prefix}{lead}\n"
+            if len(group) == 1 and group[0].end - group[0].start > self.chunk_size - len(group_prefix):
+                chunks.extend(self._split_plain(text, group[0].start, group[0].end, prefix=group_prefix,
+                                                metadata=chunk_metadata))
+            else:
+                chunks.append(self._prefixed(text, group, group_prefix, chunk_metadata))
+        return chunks
+
+    @staticmethod
+    def _prefixed(text: str, group: List[_Unit], prefix: str, metadata: dict) -> LegalChunk:
+        content = text[group[0].start:group[-1].end].strip()
+        return LegalChunk(prefix + content, group[0].start, group[-1].end, {**metadata, "prefix_chars": len(prefix)})
+
+    @staticmethod
+    def _labels(key: str, group: List[_Unit]) -> dict:
+        labels = [unit.label for unit in group if unit.label]
+        if not labels:
+            return {}
+        return {key: labels[0] if len(labels) == 1 else f"{labels[0]}-{labels[-1]}"}
+
+    @staticmethod
+    def _group(units: List[_Unit], budget: int) -> List[List[_Unit]]:
+        """Gom các khoản/điểm liên tiếp thành nhóm không vượt quá budget ký tự.
+
+        Nhóm quá ngắn (dưới 1/4 budget) được gộp vào nhóm liền kề nhỏ hơn nếu tổng không vượt
+        quá 125% budget, tránh các chunk vụn chỉ có một khoản ngắn.
+        """
+        groups: List[List[_Unit]] = []
+        sizes: List[int] = []
+        for unit in units:
+            length = unit.end - unit.start
+            if groups and sizes[-1] + length <= budget:
+                groups[-1].append(unit)
+                sizes[-1] += length
+            else:
+                groups.append([unit])
+                sizes.append(length)
+
+        i = 0
+        while i < len(groups):
+            neighbours = [j for j in (i - 1, i + 1)
+                          if 0 <= j < len(groups) and sizes[i] + sizes[j] <= budget * 1.25]
+            if sizes[i] < budget // 4 and neighbours:
+                j = min(neighbours, key=lambda n: sizes[n])
+                low, high = min(i, j), max(i, j)
+                groups[low].extend(groups.pop(high))
+                sizes[low] += sizes.pop(high)
+                i = low
+                continue
+            i += 1
+        return groups
+
+
+class HierarchyIndex:
+    """Index phụ văn bản → chương → điều → chunk, dựng lại từ metadata trong docstore của FAISS.
+
+    Dùng để mở rộng một chunk (một vài khoản) thành cả điều chứa nó mà không cần tìm kiếm lại.
+    Điều/chương của văn bản đi kèm (van_ban > 0) có khóa "van_ban:số" để không trùng với văn bản chính.
+    """
+
+    def __init__(self):
+        self.documents: Dict[str, dict] = {}
+
+    @staticmethod
+    def key(label: str, van_ban: int = 0) -> str:
+        return f"{van_ban}:{label}" if van_ban else label
+
+    @classmethod
+    def from_store(cls, vector_store) -> "HierarchyIndex":
+        index = cls()
+        for doc_id in vector_store.index_to_docstore_id.values():
+            metadata = vector_store.docstore.search(doc_id).metadata
+            if metadata.get("dieu") is None:
+                continue
+            document = index.documents.setdefault(metadata["source"], {"chapters": {}, "articles": {}})
+            van_ban = metadata.get("van_ban", 0)
+            # Chunk gộp nhiều điều ngắn được ghi vào từng điều
+            for dieu in metadata.get("dieu_list") or [metadata["dieu"]]:
+                dieu = cls.key(dieu, van_ban)
+                article = document["articles"].setdefault(dieu, {
+                    "title": metadata.get("dieu_title", "") if "dieu_list" not in metadata else "",
+                    "chuong": metadata.get("chuong"),
+                    "muc": metadata.get("muc"),
+                    "chunks": [],
+                })
+                article["chunks"].append([metadata["chunk_index"], doc_id, metadata.get("khoan")])
+                chuong = metadata.get("chuong")
+                if chuong is not None:
+                    chapter = document["chapters"].setdefault(cls.key(chuong, van_ban), {"title": metadata.get("chuong_title"), "articles": []})
+                    if dieu not in chapter["articles"]:
+                        chapter["articles"].append(dieu)
+        for document in index.documents.values():
+            for article in document["articles"].values():
+                article["chunks"].sort(key=lambda chunk: chunk[0])
+        return index
+
+    def article(self, source: str, dieu: str, van_ban: int = 0) -> Optional[dict]:
+        return self.documents.get(source, {}).get("articles", {}).get(self.key(dieu, van_ban))
+
+    def article_chunk_ids(self, source: str, dieu: str, van_ban: int = 0) -> List[str]:
+        article = self.article(source, dieu, van_ban)
+        return [doc_id for _, doc_id, _ in article["chunks"]] if article else []
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"documents": self.documents}, file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "HierarchyIndex":
+        index = cls()
+        with open(path, "r", encoding="utf-8") as file:
+            index.documents = json.load(file)["documents"]
+        return index
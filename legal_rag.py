@@ -1,61 +1,113 @@
 import os
-from typing import List
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, AsyncIterator, Iterator, List, Optional, Tuple
+import numpy as np
 from dotenv import load_dotenv
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain_community.vectorstores import FAISS
-try:
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-except ImportError:
-    from langchain.embeddings.huggingface import HuggingFaceEmbeddings  # type: ignore[import]
-from langchain_community.chat_models import ChatOllama
+from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
-from document_processor import LegalDocumentProcessor
+from extraction_cache import ExtractionCache
+from embedding_cache import CachedEmbeddings
+from query_cache import QueryEmbeddingCache, SemanticAnswerCache
+from lexical_index import BM25Index, LEXICAL_INDEX_FILE, reciprocal_rank_fusion
+from legal_chunker import HierarchyIndex, HIERARCHY_FILE, splitter_settings
+from rw_lock import ReadWriteLock
+from reranker import reranker_from_env
+import context_builder
+import kb_manifest
+import vector_index
+import chunk_store
+import index_bundle
 import traceback
 
+# Provider LLM/embedding, FAISS của LangChain và cả pipeline trích xuất (document_processor,
+# ingest_pipeline) chỉ được import khi thật sự dùng: process chỉ phục vụ truy vấn từ index dựng sẵn
+# không phải trả thời gian import PyMuPDF/Tesseract hay SDK của provider không dùng tới
+if TYPE_CHECKING:
+    from document_processor import LegalDocumentProcessor
+
 # Load environment variables
 load_dotenv()
 
+VECTORSTORE_PATH = "vectorstore/legal_faiss"
+
+
+def embedding_config() -> dict:
+    """Provider + model embedding theo env (Google chỉ được dùng khi có GOOGLE_API_KEY)."""
+    provider = os.getenv("EMBEDDING_PROVIDER", "huggingface").lower()
+    if provider == "google" and os.getenv("GOOGLE_API_KEY"):
+        return {"provider": "google", "model": os.getenv("GOOGLE_EMBEDDING_MODEL", "models/embedding-001")}
+    return {"provider": "huggingface", "model": os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")}
+
+
+@dataclass
+class PreparedQuery:
+    """Câu hỏi đã embed và tìm kiếm xong, chỉ còn chờ gọi LLM (cached khác None nếu trúng cache câu trả lời)."""
+    question: str
+    embedding: List[float]
+    cached: Optional[dict] = None
+    documents: list = field(default_factory=list)
+    context_docs: Optional[list] = None # Các khối đã gộp đưa vào prompt, điền ở lần gọi LLM
+
+
 class LegalRAGSystem:
-    def __init__(self):
+    def __init__(self, vectorstore_path: Optional[str] = None):
         self.google_api_key = os.getenv("GOOGLE_API_KEY")
+        # Thư mục index của instance này (mặc định VECTORSTORE_PATH); build/sync/load chỉ đọc ghi ở đây
+        self.vectorstore_path = vectorstore_path or VECTORSTORE_PATH
 
-        embedding_provider = os.getenv("EMBEDDING_PROVIDER", "huggingface").lower()
-        if embedding_provider == "google" and self.google_api_key:
-            embedding_model = os.getenv("GOOGLE_EMBEDDING_MODEL", "models/embedding-001")
-            print(f"🔄 Using Google embeddings model: {embedding_model}")
-            self.embeddings = GoogleGenerativeAIEmbeddings(
-                model=embedding_model,
-                google_api_key=self.google_api_key
-            )
-        else:
-            embedding_model = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
-            print(f"🔄 Using HuggingFace embeddings model: {embedding_model}")
-            self.embeddings = HuggingFaceEmbeddings(model_name=embedding_model)
+        # Chỉ đọc cấu hình ở đây; client embedding/LLM được tạo ở lần dùng đầu tiên (xem embeddings, llm)
+        embedding = embedding_config()
+        self.embedding_provider = embedding["provider"]
+        self.embedding_model = embedding["model"]
 
-        llm_provider = os.getenv("LLM_PROVIDER", "google").lower()
-        temperature = float(os.getenv("LLM_TEMPERATURE", "0.1"))
-
-        if llm_provider == "google":
-            if not self.google_api_key:
-                raise ValueError("GOOGLE_API_KEY is required when LLM_PROVIDER=google.")
-            chat_model = os.getenv("GOOGLE_CHAT_MODEL", "gemini-1.5-flash-8b")
-            print(f"🔄 Using Google chat model: {chat_model}")
-            self.llm = ChatGoogleGenerativeAI(
-                model=chat_model,
-                temperature=temperature,
-                google_api_key=self.google_api_key
-            )
-        elif llm_provider == "ollama":
-            chat_model = os.getenv("OLLAMA_MODEL", "llama3.1")
-            print(f"🔄 Using Ollama chat model: {chat_model}")
-            self.llm = ChatOllama(
-                model=chat_model,
-                temperature=temperature
-            )
-        else:
-            raise ValueError("Unsupported LLM_PROVIDER. Use 'google' or 'ollama'.")
+        self.llm_provider = os.getenv("LLM_PROVIDER", "google").lower()
+        if self.llm_provider == "google" and not self.google_api_key:
+            raise ValueError("GOOGLE_API_KEY is required when LLM_PROVIDER=google.")
+        if self.llm_provider not in ("google", "ollama", "fake"):
+            raise ValueError("Unsupported LLM_PROVIDER. Use 'google', 'ollama' or 'fake'.")
+        self._embeddings = None
+        self._llm = None
+        self._client_lock = threading.Lock()
 
         self.vector_store = None
+        # bundle.json của vectorstore đang phục vụ (None nếu vectorstore cũ chưa có bundle)
+        self.bundle = None
+        # Node phục vụ chỉ load bundle dựng sẵn: INDEX_BUNDLE_REQUIRED=1 từ chối vectorstore không có
+        # bundle.json, INDEX_BUNDLE_VERIFY=0 bỏ qua bước so checksum khi load (nhanh hơn với index lớn)
+        self.bundle_required = os.getenv("INDEX_BUNDLE_REQUIRED", "0") == "1"
+        self.bundle_verify = os.getenv("INDEX_BUNDLE_VERIFY", "1") == "1"
+
+        # Cache 2 tầng cho truy vấn: embedding câu hỏi (LRU) và câu trả lời theo ngữ nghĩa; cache câu trả lời
+        # tắt mặc định (ANSWER_CACHE=1 để bật) vì câu hỏi gần nghĩa vẫn có thể cần câu trả lời khác
+        self.query_embedding_cache = QueryEmbeddingCache()
+        self.answer_cache = SemanticAnswerCache() if os.getenv("ANSWER_CACHE", "0") == "1" else None
+
+        # Tìm kiếm lai: BM25 (khớp chính xác "Điều 35", "22/2023/QH15"...) song song với FAISS, gộp bằng RRF
+        self.hybrid_search = os.getenv("HYBRID_SEARCH", "1") == "1"
+        self.lexical_index = None
+        self._retrieval_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="retrieval")
+
+        # Rerank bằng cross-encoder (RERANKER=1): lấy RERANK_CANDIDATES ứng viên rồi giữ lại k chunk tốt nhất
+        self.reranker = reranker_from_env()
+        # Số chunk đưa vào prompt khi trả lời; rerank làm top đầu chính xác hơn nên có thể giảm để prompt ngắn lại
+        self.answer_k = int(os.getenv("ANSWER_TOP_K", "5"))
+        # Ngân sách token cho văn bản tham khảo trong prompt (theo LLM_PROVIDER, CONTEXT_TOKEN_BUDGET để đặt tay)
+        self.context_token_budget = context_builder.token_budget(self.llm_provider)
+        self.context_chars_per_token = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3"))
+
+        # Index phụ điều → chunk: mở rộng chunk tìm được thành cả điều luật chứa nó (EXPAND_TO_ARTICLE=1)
+        self.hierarchy_index = None
+        # Bảng trang → offset của từng PDF (page_offsets.json), để nguồn trích dẫn mở đúng trang
+        self.page_offsets: dict = {}
+        self.expand_to_article = os.getenv("EXPAND_TO_ARTICLE", "0") == "1"
+
+        # Một instance được dùng chung cho mọi session: truy vấn giữ read lock, còn build/sync/load
+        # chuẩn bị index mới bên ngoài rồi mới lấy write lock để thay thế nguyên khối
+        self._lock = ReadWriteLock()
+        self._build_lock = threading.RLock()
 
         # Prompt template
         self.legal_prompt = PromptTemplate(
@@ -78,103 +130,720 @@ Trả lời:""",
             input_variables=["context", "question"]
         )
 
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._client_lock:
+                if self._embeddings is None:
+                    self._embeddings = self._create_embeddings()
+        return self._embeddings
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._client_lock:
+                if self._llm is None:
+                    self._llm = self._create_llm()
+        return self._llm
+
+    def _create_embeddings(self):
+        if self.embedding_provider == "google":
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+            print(f"🔄 Using Google embeddings model: {self.embedding_model}")
+            embeddings = GoogleGenerativeAIEmbeddings(
+                model=self.embedding_model,
+                google_api_key=self.google_api_key
+            )
+        else:
+            try:
+                from langchain_community.embeddings import HuggingFaceEmbeddings
+            except ImportError:
+                from langchain.embeddings.huggingface import HuggingFaceEmbeddings  # type: ignore[import]
+
+            print(f"🔄 Using HuggingFace embeddings model: {self.embedding_model}")
+            embeddings = HuggingFaceEmbeddings(model_name=self.embedding_model)
+
+        # Cache embedding theo (model, hash chunk) trên đĩa, dùng chung cho build và sync
+        if os.getenv("EMBEDDING_CACHE", "1") == "1":
+            embeddings = CachedEmbeddings(embeddings, self.embedding_model)
+        return embeddings
+
+    def _create_llm(self):
+        temperature = float(os.getenv("LLM_TEMPERATURE", "0.1"))
+        if self.llm_provider == "google":
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            chat_model = os.getenv("GOOGLE_CHAT_MODEL", "gemini-1.5-flash-8b")
+            print(f"🔄 Using Google chat model: {chat_model}")
+            return ChatGoogleGenerativeAI(
+                model=chat_model,
+                temperature=temperature,
+                google_api_key=self.google_api_key
+            )
+        if self.llm_provider == "ollama":
+            from langchain_community.chat_models import ChatOllama
+
+            chat_model = os.getenv("OLLAMA_MODEL", "llama3.1")
+            print(f"🔄 Using Ollama chat model: {chat_model}")
+            return ChatOllama(
+                model=chat_model,
+                temperature=temperature
+            )
+        from fake_llm import fake_llm_from_env
+
+        print("🔄 Using fake offline chat model (testing/benchmark only)")
+        return fake_llm_from_env()
+
+    def warm_up(self):
+        """Tạo trước client embedding và LLM (ví dụ trước khi server nhận request đầu tiên).
+
+        Nếu knowledge base đã load, embed một câu hỏi mẫu và tìm kiếm thử: kiểm tra model embedding
+        trả về đúng số chiều của index và nạp sẵn model + index trước request đầu tiên.
+        """
+        embeddings, llm = self.embeddings, self.llm
+        if self.reranker is not None:
+            self.reranker.warm_up()
+        if self.vector_store is not None:
+            vector = embeddings.embed_query("Điều 1. Phạm vi điều chỉnh")
+            if len(vector) != self.vector_store.index.d:
+                raise index_bundle.BundleMismatchError(
+                    f"Embedding model {self.embedding_model} returns {len(vector)} dimensions "
+                    f"but the index has {self.vector_store.index.d}."
+                )
+            with self._lock.read_locked():
+                self.vector_store.index.search(np.asarray([vector], dtype=np.float32), 1)
+        return embeddings, llm
+
     def build_knowledge_base(self, data_folder: str = "data"):
+        with self._build_lock:
+            self._build_knowledge_base(data_folder)
+
+    def _build_knowledge_base(self, data_folder: str):
         print("🔄 Đang xử lý tài liệu pháp luật...")
         if not os.path.exists(data_folder):
             raise ValueError(f"Thư mục {data_folder} không tồn tại!")
-        files = os.listdir(data_folder)
+        files = kb_manifest.list_data_files(data_folder)
         if not files:
             raise ValueError(f"Không có file nào trong thư mục {data_folder}!")
-        print(f"📁 Tìm thấy {len(files)} file trong thư mục data: {files}")
+        print(f"📁 Tìm thấy {len(files)} file trong thư mục data: {list(files)}")
+
+        from ingest_pipeline import StreamingIndexBuilder
 
         try:
-            processor = LegalDocumentProcessor()
-            documents = processor.process_documents(data_folder)
-            if not documents:
+            # Trích xuất, chia chunk và embed theo batch chồng lên nhau; id chunk + manifest
+            # được ghi lại để cập nhật tăng dần sau này
+            builder = StreamingIndexBuilder(self.embeddings, self._new_processor())
+            print(f"🔄 Đang tạo vector database (index: {builder.index_settings['type']})...")
+            vector_store = builder.add_to_store(None, files.items())
+            if vector_store is None:
                 raise ValueError("Không thể xử lý tài liệu nào!")
-            print(f"📚 Đã xử lý {len(documents)} chunks từ tài liệu pháp luật")
+            print(f"📚 Đã xử lý {builder.total_chunks} chunks từ tài liệu pháp luật")
 
-            # Tạo vector store
-            print("🔄 Đang tạo vector database...")
-            self.vector_store = FAISS.from_documents(documents, self.embeddings)
-            os.makedirs("vectorstore", exist_ok=True)
+            lexical_index = BM25Index()
+            lexical_index.sync_with_store(vector_store)
             print("💾 Đang lưu vector database...")
-            self.vector_store.save_local("vectorstore/legal_faiss")
+            chunk_store.save_store(vector_store, self.vectorstore_path)
+            vector_index.save_params(self.vectorstore_path, builder.index_settings)
+            lexical_index.save(os.path.join(self.vectorstore_path, LEXICAL_INDEX_FILE))
+            hierarchy_index = HierarchyIndex.from_store(vector_store)
+            hierarchy_index.save(os.path.join(self.vectorstore_path, HIERARCHY_FILE))
+            kb_manifest.save_manifest(self.vectorstore_path, {"files": builder.file_entries})
+            kb_manifest.save_page_offsets(self.vectorstore_path, builder.page_offsets)
+            self._write_bundle(vector_store)
+            self._swap_knowledge_base(vector_store, lexical_index, hierarchy_index, builder.page_offsets)
+            self._report_embedding_cache()
             print("✅ Knowledge base đã được xây dựng thành công!")
         except Exception as e:
             print(f"❌ Lỗi khi xây dựng knowledge base: {e}")
             traceback.print_exc()
             raise e
 
+    def sync_knowledge_base(self, data_folder: str = "data") -> dict:
+        """Cập nhật tăng dần: chỉ embed file mới/thay đổi và xóa vector của file đã bị xóa."""
+        with self._build_lock:
+            return self._sync_knowledge_base(data_folder)
+
+    def _sync_knowledge_base(self, data_folder: str) -> dict:
+        if not os.path.exists(data_folder):
+            raise ValueError(f"Thư mục {data_folder} không tồn tại!")
+
+        manifest = kb_manifest.load_manifest(self.vectorstore_path)
+        if manifest is None or (self.vector_store is None and not self.load_knowledge_base()):
+            print("ℹ️ Chưa có manifest hoặc vectorstore, xây dựng lại toàn bộ knowledge base...")
+            self.build_knowledge_base(data_folder)
+            files = kb_manifest.load_manifest(self.vectorstore_path)["files"]
+            return {"mode": "full", "added": sorted(files), "updated": [], "removed": [], "unchanged": []}
+
+        indexed = manifest["files"]
+        current = kb_manifest.list_data_files(data_folder)
+        new_entries = {}
+        added, updated, unchanged = [], [], []
+        for filename, file_path in current.items():
+            entry = indexed.get(filename)
+            stat = os.stat(file_path)
+            # Đường tắt: mtime + size không đổi thì không cần hash lại
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                new_entries[filename] = entry
+                unchanged.append(filename)
+                continue
+            content_hash = ExtractionCache.file_hash(file_path)
+            if entry and entry["hash"] == content_hash:
+                new_entries[filename] = kb_manifest.file_entry(file_path, content_hash, entry["chunk_ids"])
+                unchanged.append(filename)
+                continue
+            (updated if entry else added).append((filename, file_path, content_hash))
+        removed = [filename for filename in indexed if filename not in current]
+
+        # Xóa vector cũ của file đã bị xóa hoặc bị thay đổi
+        existing_ids = set(self.vector_store.index_to_docstore_id.values())
+        stale_ids = [
+            doc_id
+            for filename in removed + [name for name, _, _ in updated]
+            for doc_id in indexed[filename]["chunk_ids"]
+            if doc_id in existing_ids
+        ]
+        if stale_ids and not vector_index.supports_removal(self.vector_store.index):
+            print("ℹ️ Index hiện tại (HNSW) không hỗ trợ xóa vector, xây dựng lại toàn bộ knowledge base...")
+            self.build_knowledge_base(data_folder)
+            return {"mode": "full", "added": [name for name, _, _ in added], "updated": [name for name, _, _ in updated],
+                    "removed": removed, "unchanged": unchanged}
+
+        # Trích xuất + embed file mới hoặc đã thay đổi khi chưa giữ lock, truy vấn vẫn chạy bình thường
+        batches = []
+        builder = None
+        if added or updated:
+            from ingest_pipeline import StreamingIndexBuilder
+
+            builder = StreamingIndexBuilder(self.embeddings, self._new_processor())
+            batches = list(builder.iter_batches([(name, path) for name, path, _ in added + updated]))
+            new_entries.update(builder.file_entries)
+            self._report_embedding_cache()
+
+        rewritten = []
+        if stale_ids or batches:
+            # Chỉ giữ write lock trong lúc xóa/nối vector (nhanh)
+            with self._lock.write_locked():
+                if stale_ids:
+                    print(f"🗑️ Xóa {len(stale_ids)} vector cũ...")
+                    self.vector_store.delete(stale_ids)
+                for batch in batches:
+                    builder.append_batch(self.vector_store, batch)
+                if self.lexical_index is None:
+                    self.lexical_index = BM25Index()
+                self.lexical_index.sync_with_store(self.vector_store)
+                self.hierarchy_index = HierarchyIndex.from_store(self.vector_store)
+                self.invalidate_caches()
+            print("💾 Đang lưu vector database...")
+            chunk_store.save_store(self.vector_store, self.vectorstore_path)
+            self.lexical_index.save(os.path.join(self.vectorstore_path, LEXICAL_INDEX_FILE))
+            self.hierarchy_index.save(os.path.join(self.vectorstore_path, HIERARCHY_FILE))
+            rewritten += ["index.faiss", chunk_store.CURRENT_FILE, LEXICAL_INDEX_FILE, HIERARCHY_FILE,
+                          *chunk_store.chunk_files(self.vectorstore_path).values()]
+        if new_entries != indexed:
+            kb_manifest.save_manifest(self.vectorstore_path, {"files": new_entries})
+            rewritten.append(kb_manifest.MANIFEST_FILE)
+        if removed or updated or added:
+            page_offsets = kb_manifest.load_page_offsets(self.vectorstore_path)
+            for filename in removed + [name for name, _, _ in updated]:
+                page_offsets.pop(filename, None)
+            if builder is not None:
+                page_offsets.update(builder.page_offsets)
+            kb_manifest.save_page_offsets(self.vectorstore_path, page_offsets)
+            self.page_offsets = page_offsets
+            rewritten.append(kb_manifest.PAGE_OFFSETS_FILE)
+        # Không có file nào được ghi lại thì bundle vẫn đúng: không đọc lại index để hash
+        if rewritten or self.bundle is None:
+            self._write_bundle(self.vector_store, rewritten)
+
+        summary = {
+            "mode": "incremental",
+            "added": [name for name, _, _ in added],
+            "updated": [name for name, _, _ in updated],
+            "removed": removed,
+            "unchanged": unchanged,
+        }
+        print(
+            f"✅ Đồng bộ xong: {len(summary['added'])} mới, {len(summary['updated'])} thay đổi, "
+            f"{len(removed)} đã xóa, {len(unchanged)} không đổi"
+        )
+        return summary
+
+    def _load_lexical_index(self, vectorstore_path: str, vector_store) -> Optional[BM25Index]:
+        path = os.path.join(vectorstore_path, LEXICAL_INDEX_FILE)
+        try:
+            if os.path.exists(path):
+                return BM25Index.load(path)
+        except Exception as e:
+            print(f"⚠️ Không thể load BM25 index: {e}")
+        if not self.hybrid_search:
+            return None
+        # Knowledge base cũ chưa có BM25: dựng trong RAM từ docstore
+        lexical_index = BM25Index()
+        lexical_index.sync_with_store(vector_store)
+        return lexical_index
+
+    @staticmethod
+    def _load_hierarchy_index(vectorstore_path: str, vector_store) -> HierarchyIndex:
+        path = os.path.join(vectorstore_path, HIERARCHY_FILE)
+        try:
+            if os.path.exists(path):
+                return HierarchyIndex.load(path)
+        except Exception as e:
+            print(f"⚠️ Không thể load hierarchy index: {e}")
+        return HierarchyIndex.from_store(vector_store)
+
+    def _swap_knowledge_base(self, vector_store, lexical_index: Optional[BM25Index],
+                             hierarchy_index: Optional[HierarchyIndex] = None, page_offsets: Optional[dict] = None):
+        """Thay index đang phục vụ bằng index mới một cách nguyên tử."""
+        with self._lock.write_locked():
+            self.vector_store = vector_store
+            self.lexical_index = lexical_index
+            self.hierarchy_index = hierarchy_index
+            self.page_offsets = page_offsets or {}
+            self.invalidate_caches()
+
+    def _write_bundle(self, vector_store, rewritten: Optional[List[str]] = None):
+        """Ghi bundle.json sau khi mọi file của vectorstore đã được lưu (cuối build/sync).
+
+        Sync truyền các file vừa ghi lại (rewritten): chỉ các file đó được hash lại, file khác dùng
+        checksum trong bundle hiện tại."""
+        self.bundle = index_bundle.write_bundle(
+            self.vectorstore_path,
+            {"provider": self.embedding_provider, "model": self.embedding_model},
+            vector_store.index.d,
+            vector_store.index.ntotal,
+            splitter_settings(),
+            vector_index.load_params(self.vectorstore_path),
+            previous=self.bundle if rewritten is not None else None,
+            rewritten=rewritten,
+        )
+        print(f"📦 Đã ghi {index_bundle.BUNDLE_FILE}: {index_bundle.describe(self.bundle)}")
+
+    def _report_embedding_cache(self):
+        if isinstance(self.embeddings, CachedEmbeddings):
+            stats = self.embeddings.stats()
+            print(
+                f"🗃️ Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%}), {stats['stored_vectors']} vectors stored"
+            )
+
+    def _new_processor(self) -> "LegalDocumentProcessor":
+        from document_processor import LegalDocumentProcessor
+
+        extraction_cache = ExtractionCache() if os.getenv("EXTRACTION_CACHE", "1") == "1" else None
+        return LegalDocumentProcessor(extraction_cache=extraction_cache)
+
     def load_knowledge_base(self):
-        vectorstore_path = "vectorstore/legal_faiss"
+        vectorstore_path = self.vectorstore_path
         if not os.path.exists(vectorstore_path):
             print("❌ Không tìm thấy vectorstore. Cần xây dựng knowledge base.")
             return False
         try:
-            required_files = ["index.faiss", "index.pkl"]
-            for file in required_files:
-                if not os.path.exists(os.path.join(vectorstore_path, file)):
-                    print(f"❌ Thiếu file: {file}")
+            if not os.path.exists(os.path.join(vectorstore_path, "index.faiss")):
+                print("❌ Thiếu file: index.faiss")
+                return False
+            # Đối chiếu bundle trước khi load: sai model embedding hoặc file bị thay đổi thì dừng ngay
+            bundle = index_bundle.load_bundle(vectorstore_path)
+            if bundle is None:
+                if self.bundle_required:
+                    print(f"❌ Thiếu {index_bundle.BUNDLE_FILE} (INDEX_BUNDLE_REQUIRED=1). Chạy 'python index_bundle.py --write' hoặc rebuild_kb.py.")
                     return False
+                print(f"⚠️ Vectorstore chưa có {index_bundle.BUNDLE_FILE}, không kiểm tra được model embedding. Chạy 'python index_bundle.py --write'.")
+            else:
+                index_bundle.verify_bundle(vectorstore_path, bundle, self.embedding_provider, self.embedding_model,
+                                           checksums=self.bundle_verify)
+                if bundle["splitter"] != splitter_settings():
+                    print("ℹ️ Cấu hình chia chunk hiện tại khác với lúc build; sync sẽ chia file mới khác với phần còn lại của index.")
             print("🔄 Đang load vectorstore...")
-            self.vector_store = FAISS.load_local(
-                vectorstore_path,
-                self.embeddings,
-                allow_dangerous_deserialization=True
-            )
+            if chunk_store.has_chunk_store(vectorstore_path):
+                # Chunk store được mmap, chunk chỉ được đọc khi nằm trong kết quả tìm kiếm
+                vector_store = chunk_store.load_store(vectorstore_path, self.embeddings)
+            elif os.path.exists(os.path.join(vectorstore_path, chunk_store.LEGACY_FILE)):
+                from langchain_community.vectorstores import FAISS
+
+                print("⚠️ Đang dùng index.pkl (định dạng cũ). Chạy 'python convert_docstore.py' để chuyển sang chunk store.")
+                vector_store = FAISS.load_local(
+                    vectorstore_path,
+                    self.embeddings,
+                    allow_dangerous_deserialization=True
+                )
+            else:
+                print(f"❌ Thiếu chunk store ({chunk_store.IDS_FILE}...) hoặc {chunk_store.LEGACY_FILE}")
+                return False
+            if bundle is not None:
+                index_bundle.check_dimension(bundle, vector_store.index.d, vector_store.index.ntotal)
+            index_params = vector_index.load_params(vectorstore_path)
+            if index_params:
+                vector_index.apply_search_params(vector_store.index, index_params)
+            self._swap_knowledge_base(vector_store, self._load_lexical_index(vectorstore_path, vector_store),
+                                      self._load_hierarchy_index(vectorstore_path, vector_store),
+                                      kb_manifest.load_page_offsets(vectorstore_path))
+            self.bundle = bundle
+            if bundle is not None:
+                print(f"📦 {index_bundle.describe(bundle)}")
             print("✅ Đã load knowledge base thành công!")
             return True
+        except index_bundle.BundleMismatchError as e:
+            print(f"❌ Vectorstore không khớp bundle: {e}")
+            return False
         except Exception as e:
             print(f"❌ Không thể load knowledge base: {e}")
             traceback.print_exc()
             return False
 
+    def invalidate_caches(self):
+        """Xóa cache câu trả lời; gọi mỗi khi knowledge base được build/sync/load lại."""
+        if self.answer_cache is not None:
+            self.answer_cache.clear()
+
+    def _embed_question(self, question: str) -> List[float]:
+        return self._embed_questions([question])[0]
+
+    def _embed_questions(self, questions: List[str]) -> List[List[float]]:
+        """Embed nhiều câu hỏi; câu chưa có trong LRU cache được embed chung một lần gọi model."""
+        vectors = [self.query_embedding_cache.get(question) for question in questions]
+        missing = list(dict.fromkeys(q for q, vector in zip(questions, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, self._embed_query_batch(missing)))
+            for question, vector in computed.items():
+                self.query_embedding_cache.put(question, vector)
+            vectors = [computed[q] if vector is None else vector for q, vector in zip(questions, vectors)]
+        return vectors
+
+    def _embed_query_batch(self, texts: List[str]) -> List[List[float]]:
+        base = getattr(self.embeddings, "underlying", self.embeddings)
+        # Class của provider đã được import khi tạo client (xem _create_embeddings), import lại chỉ là tra sys.modules
+        if self.embedding_provider == "google":
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+            if isinstance(base, GoogleGenerativeAIEmbeddings):
+                # embed_documents của Google dùng task "retrieval_document"; câu hỏi cần task "retrieval_query"
+                task_type = base.task_type or "retrieval_query"
+                return [vector for i in range(0, len(texts), 100) for vector in base._embed(texts[i:i + 100], task_type=task_type)]
+        else:
+            try:
+                from langchain_community.embeddings import HuggingFaceEmbeddings
+            except ImportError:
+                from langchain.embeddings.huggingface import HuggingFaceEmbeddings  # type: ignore[import]
+
+            if isinstance(base, HuggingFaceEmbeddings):
+                # embed_query của HuggingFace chính là embed_documents([text])[0], nên encode cả batch một lần
+                return base.embed_documents(texts)
+        return [base.embed_query(text) for text in texts]
+
+    def _search(self, question: str, k: int, embedding: Optional[List[float]] = None):
+        embeddings = [embedding] if embedding is not None else None
+        return self._search_batch([question], k, embeddings)[0]
+
+    def _search_batch(self, questions: List[str], k: int, embeddings: Optional[List[List[float]]] = None):
+        """Tìm kiếm cho nhiều câu hỏi: một lần index.search với ma trận truy vấn, BM25 chạy song song."""
+        if not questions:
+            return []
+        if embeddings is None:
+            embeddings = self._embed_questions(questions)
+        fetch = max(k, self.reranker.candidates) if self.reranker is not None else k
+        with self._lock.read_locked():
+            results = self._search_batch_locked(questions, k, embeddings, fetch)
+            if self.reranker is not None:
+                results = self.reranker.rerank_batch(questions, results, k)
+            if self.expand_to_article and self.hierarchy_index is not None:
+                results = [self._expand_articles(docs) for docs in results]
+            return results
+
+    def _search_batch_locked(self, questions: List[str], k: int, embeddings: List[List[float]],
+                             fetch: Optional[int] = None):
+        """Top-k cho mỗi câu hỏi; fetch > k lấy thêm ứng viên (cho reranker) mà k kết quả đầu không đổi."""
+        fetch = max(fetch or k, k)
+        hybrid = self.hybrid_search and self.lexical_index is not None
+        if not hybrid:
+            ranked_ids = self._vector_search_ids(embeddings, fetch)
+        else:
+            candidates = max(k, int(os.getenv("HYBRID_CANDIDATES", "20")))
+            lexical_futures = [self._retrieval_pool.submit(self.lexical_index.search, q, candidates) for q in questions]
+            vector_ids = self._vector_search_ids(embeddings, max(candidates, fetch))
+            rrf_k = int(os.getenv("RRF_K", "60"))
+            ranked_ids = []
+            for ids, future in zip(vector_ids, lexical_futures):
+                # Độ sâu gộp RRF giữ như khi không rerank; ứng viên thêm là các vector hit tiếp theo
+                fused = reciprocal_rank_fusion([ids[:candidates], [doc_id for doc_id, _ in future.result()]], k=rrf_k)
+                seen = set(fused)
+                ranked_ids.append((fused + [doc_id for doc_id in ids[candidates:] if doc_id not in seen])[:fetch])
+        return [[self.vector_store.docstore.search(doc_id) for doc_id in ids] for ids in ranked_ids]
+
+    def _expand_articles(self, docs) -> list:
+        """Thay chunk chỉ chứa một phần điều luật bằng toàn bộ điều đó (ghép các chunk theo thứ tự), bỏ trùng."""
+        expanded, seen = [], set()
+        for doc in docs:
+            source, dieu, van_ban = doc.metadata.get("source"), doc.metadata.get("dieu"), doc.metadata.get("van_ban", 0)
+            chunk_ids = self.hierarchy_index.article_chunk_ids(source, dieu, van_ban) if dieu else []
+            key = (source, van_ban, dieu) if len(chunk_ids) > 1 else id(doc)
+            if key in seen:
+                continue
+            seen.add(key)
+            if len(chunk_ids) <= 1:
+                expanded.append(doc)
+                continue
+            parts = [self.vector_store.docstore.search(doc_id) for doc_id in chunk_ids]
+            # Bỏ dòng tiêu đề điều được lặp lại ở đầu các chunk sau
+            text = "\n".join(part.page_content[part.metadata.get("prefix_chars", 0):].strip() for part in parts)
+            metadata = {key: value for key, value in doc.metadata.items() if key not in ("khoan", "diem", "prefix_chars")}
+            # Offset/trang của cả điều chứ không chỉ của chunk tìm được (context_builder dựa vào đây để gộp)
+            if all(isinstance(part.metadata.get("start_offset"), int) for part in parts):
+                metadata["start_offset"] = parts[0].metadata["start_offset"]
+                metadata["end_offset"] = parts[-1].metadata["end_offset"]
+            if isinstance(parts[0].metadata.get("page_number"), int):
+                metadata["page_number"] = parts[0].metadata["page_number"]
+                last_page = parts[-1].metadata.get("page_end", parts[-1].metadata.get("page_number"))
+                if isinstance(last_page, int) and last_page != metadata["page_number"]:
+                    metadata["page_end"] = last_page
+                else:
+                    metadata.pop("page_end", None)
+            expanded.append(Document(page_content=text, metadata=metadata))
+        return expanded
+
+    def _vector_search_ids(self, embeddings: List[List[float]], k: int) -> List[List[str]]:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.vector_store._normalize_L2:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        _, indices = self.vector_store.index.search(vectors, k)
+        return [[self.vector_store.index_to_docstore_id[i] for i in row if i != -1] for row in indices]
+
+    NOT_READY_ANSWER = "Hệ thống chưa được khởi tạo. Vui lòng xây dựng knowledge base trước."
+    NOT_FOUND_ANSWER = "Tôi không tìm thấy thông tin này trong các văn bản pháp luật hiện có."
+
+    def prepare_queries(self, questions: List[str], k: Optional[int] = None, use_answer_cache: bool = True) -> List[PreparedQuery]:
+        """Embed + tra cache câu trả lời + tìm kiếm cho cả batch câu hỏi (chưa gọi LLM).
+
+        Toàn bộ câu hỏi được embed trong một lần gọi và tìm trong FAISS bằng một lần search;
+        câu nào trúng cache câu trả lời thì không cần tìm kiếm.
+        """
+        k = k or self.answer_k
+        embeddings = self._embed_questions(questions)
+        prepared = [PreparedQuery(question, embedding) for question, embedding in zip(questions, embeddings)]
+        if use_answer_cache and self.answer_cache is not None:
+            for item in prepared:
+                cached = self.answer_cache.lookup(item.embedding, item.question)
+                if cached is not None:
+                    item.cached = dict(cached)
+        pending = [item for item in prepared if item.cached is None]
+        results = self._search_batch([item.question for item in pending], k, [item.embedding for item in pending])
+        for item, documents in zip(pending, results):
+            item.documents = documents
+        return prepared
+
+    def _retrieve_for_answer(self, question: str):
+        """Embed + tra cache câu trả lời + tìm kiếm. Trả về (embedding, kết quả cache hoặc None, docs)."""
+        item = self.prepare_queries([question])[0]
+        return item.embedding, item.cached, item.documents
+
+    def _pack_context(self, retrieved_docs) -> list:
+        """Gộp chunk chồng lấn/liền kề theo vị trí trong file và cắt theo ngân sách token (xem context_builder)."""
+        return context_builder.pack_documents(retrieved_docs, self.context_token_budget, self.context_chars_per_token)
+
+    def _prepared_context(self, prepared: PreparedQuery) -> list:
+        """_pack_context cho câu hỏi đã prepare, chỉ gộp một lần và giữ lại trên prepared."""
+        if prepared.context_docs is None:
+            prepared.context_docs = self._pack_context(prepared.documents)
+        return prepared.context_docs
+
+    def _build_prompt(self, question: str, context_docs) -> str:
+        """Prompt cho các khối do _pack_context trả về."""
+        context_text = "\n\n".join(doc.page_content for doc in context_docs)
+        return self.legal_prompt.format(context=context_text, question=question)
+
+    def source_pages(self, metadata: dict) -> Tuple[Optional[int], Optional[int]]:
+        """Trang đầu và trang cuối của một chunk (hoặc đoạn đã gộp/điều đã mở rộng) trong PDF gốc.
+
+        Tra bảng page_offsets.json theo start_offset/end_offset nên đúng cả với đoạn ghép từ nhiều
+        chunk; không có bảng (file không phải PDF, vectorstore cũ) thì dùng page_number/page_end.
+        """
+        table = self.page_offsets.get(metadata.get("source"))
+        start, end = metadata.get("start_offset"), metadata.get("end_offset")
+        if table and isinstance(start, int) and isinstance(end, int):
+            return (kb_manifest.page_for_offset(table, start),
+                    kb_manifest.page_for_offset(table, max(end - 1, start)))
+        first = metadata.get("page_number")
+        return first, metadata.get("page_end", first)
+
+    def _source_page_fields(self, metadata: dict) -> dict:
+        first, last = self.source_pages(metadata)
+        fields = {"page": first if first is not None else "N/A"}
+        if last is not None and last != first:
+            fields["page_end"] = last
+        return fields
+
+    def _format_sources(self, retrieved_docs) -> List[dict]:
+        sources = []
+        for i, doc in enumerate(retrieved_docs):
+            sources.append({
+                "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
+                "source": doc.metadata.get("source", "Unknown"),
+                "chunk_id": doc.metadata.get("chunk_index", i),
+                **self._source_page_fields(doc.metadata),
+            })
+        return sources
+
+    def _finish_answer(self, answer_text, question: str, question_embedding, sources: List[dict]) -> dict:
+        if not answer_text or answer_text.strip() == "":
+            answer_text = self.NOT_FOUND_ANSWER
+        result = {"answer": answer_text, "sources": sources}
+        if self.answer_cache is not None:
+            self.answer_cache.store(question_embedding, question, result)
+        return result
+
+    @staticmethod
+    def _response_text(response) -> str:
+        if hasattr(response, "content"):
+            return response.content
+        return str(response)
+
+    def generate(self, prepared: PreparedQuery) -> dict:
+        """Gọi LLM cho một câu hỏi đã được prepare_queries chuẩn bị."""
+        if prepared.cached is not None:
+            return prepared.cached
+        if not prepared.documents:
+            return {"answer": self.NOT_FOUND_ANSWER, "sources": []}
+        context_docs = self._prepared_context(prepared)
+        response = self.llm.invoke(self._build_prompt(prepared.question, context_docs))
+        return self._finish_answer(self._response_text(response), prepared.question, prepared.embedding, self._format_sources(context_docs))
+
+    async def agenerate(self, prepared: PreparedQuery) -> dict:
+        """Bản async của generate, dùng llm.ainvoke."""
+        if prepared.cached is not None:
+            return prepared.cached
+        if not prepared.documents:
+            return {"answer": self.NOT_FOUND_ANSWER, "sources": []}
+        context_docs = self._prepared_context(prepared)
+        response = await self.llm.ainvoke(self._build_prompt(prepared.question, context_docs))
+        return self._finish_answer(self._response_text(response), prepared.question, prepared.embedding, self._format_sources(context_docs))
+
     def query(self, question: str) -> dict:
         if not self.vector_store:
-            return {"answer": "Hệ thống chưa được khởi tạo. Vui lòng xây dựng knowledge base trước.", "sources": []}
+            return {"answer": self.NOT_READY_ANSWER, "sources": []}
         try:
-            retrieved_docs = self.vector_store.similarity_search(question, k=5)
-            if not retrieved_docs:
-                return {
-                    "answer": "Tôi không tìm thấy thông tin này trong các văn bản pháp luật hiện có.",
-                    "sources": []
-                }
-
-            context_text = "\n\n".join(doc.page_content for doc in retrieved_docs)
-            prompt = self.legal_prompt.format(context=context_text, question=question)
-            response = self.llm.invoke(prompt)
-
-            if hasattr(response, "content"):
-                answer_text = response.content
-            else:
-                answer_text = str(response)
+            return self.generate(self.prepare_queries([question])[0])
+        except Exception as e:
+            print(f"❌ Lỗi khi xử lý câu hỏi: {e}")
+            traceback.print_exc()
+            return {"answer": f"Có lỗi xảy ra khi xử lý câu hỏi: {e}", "sources": []}
+
+    async def aquery(self, question: str) -> dict:
+        """Bản async của query: embed/tìm kiếm chạy trên thread, gọi LLM bằng ainvoke."""
+        if not self.vector_store:
+            return {"answer": self.NOT_READY_ANSWER, "sources": []}
+        try:
+            prepared = await asyncio.to_thread(self.prepare_queries, [question])
+            return await self.agenerate(prepared[0])
+        except Exception as e:
+            print(f"❌ Lỗi khi xử lý câu hỏi: {e}")
+            traceback.print_exc()
+            return {"answer": f"Có lỗi xảy ra khi xử lý câu hỏi: {e}", "sources": []}
+
+    def query_batch(self, questions: List[str], concurrency: Optional[int] = None, k: Optional[int] = None,
+                    use_answer_cache: bool = False, show_progress: bool = False) -> List[dict]:
+        """Trả lời nhiều câu hỏi trong một lượt (đánh giá, xử lý hàng loạt).
+
+        Mọi câu hỏi được embed trong một lần gọi và tìm trong FAISS bằng một lần search; LLM được
+        gọi song song, tối đa `concurrency` (QUERY_BATCH_CONCURRENCY) câu cùng lúc. Mỗi kết quả có
+        dạng như query() kèm "question" và "contexts" (các khối văn bản đã đưa vào prompt, sau khi gộp).
+        Mặc định bỏ qua cache câu trả lời để câu nào cũng có contexts.
+        """
+        if not self.vector_store:
+            return [{"question": q, "answer": self.NOT_READY_ANSWER, "sources": [], "contexts": []} for q in questions]
+        concurrency = concurrency or int(os.getenv("QUERY_BATCH_CONCURRENCY", "4"))
+        prepared = self.prepare_queries(list(questions), k=k, use_answer_cache=use_answer_cache)
 
-            if not answer_text or answer_text.strip() == "":
-                answer_text = "Tôi không tìm thấy thông tin này trong các văn bản pháp luật hiện có."
+        def answer(item: PreparedQuery) -> dict:
+            try:
+                result = self.generate(item)
+            except Exception as e:
+                print(f"❌ Lỗi khi xử lý câu hỏi: {e}")
+                result = {"answer": f"Có lỗi xảy ra khi xử lý câu hỏi: {e}", "sources": self._format_sources(item.documents)}
+            # Đúng các khối generate đã đưa vào prompt, không gộp lại lần nữa
+            return {"question": item.question, **result,
+                    "contexts": [doc.page_content for doc in item.context_docs or []]}
 
-            sources = []
-            for i, doc in enumerate(retrieved_docs):
-                sources.append({
-                    "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                    "source": doc.metadata.get("source", "Unknown"),
-                    "chunk_id": doc.metadata.get("chunk_index", i),
-                    "page": doc.metadata.get("page_number", "N/A")
-                })
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="query-batch") as pool:
+            results = pool.map(answer, prepared)
+            if show_progress:
+                from tqdm.auto import tqdm
+                results = tqdm(results, total=len(prepared))
+            return list(results)
 
-            return {"answer": answer_text, "sources": sources}
+    def stream_query(self, question: str) -> Iterator[dict]:
+        """Stream kết quả theo sự kiện: {"type": "sources"} trước, rồi từng {"type": "token"},
+        cuối cùng {"type": "done"} kèm câu trả lời đầy đủ (cùng dạng với query)."""
+        if not self.vector_store:
+            yield from self._answer_events({"answer": self.NOT_READY_ANSWER, "sources": []})
+            return
+        try:
+            question_embedding, cached, retrieved_docs = self._retrieve_for_answer(question)
+            if cached is not None or not retrieved_docs:
+                yield from self._answer_events(cached or {"answer": self.NOT_FOUND_ANSWER, "sources": []})
+                return
+
+            context_docs = self._pack_context(retrieved_docs)
+            sources = self._format_sources(context_docs)
+            yield {"type": "sources", "sources": sources}
+            prompt = self._build_prompt(question, context_docs)
+            parts = []
+            for chunk in self.llm.stream(prompt):
+                text = self._response_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield {"type": "token", "content": text}
+            yield {"type": "done", **self._finish_answer("".join(parts), question, question_embedding, sources)}
         except Exception as e:
             print(f"❌ Lỗi khi xử lý câu hỏi: {e}")
             traceback.print_exc()
-            return {"answer": f"Có lỗi xảy ra khi xử lý câu hỏi: {e}", "sources": []}
+            yield {"type": "error", "content": f"Có lỗi xảy ra khi xử lý câu hỏi: {e}"}
+
+    async def astream_query(self, question: str) -> AsyncIterator[dict]:
+        """Bản async của stream_query, dùng llm.astream."""
+        if not self.vector_store:
+            for event in self._answer_events({"answer": self.NOT_READY_ANSWER, "sources": []}):
+                yield event
+            return
+        try:
+            question_embedding, cached, retrieved_docs = await asyncio.to_thread(self._retrieve_for_answer, question)
+            if cached is not None or not retrieved_docs:
+                for event in self._answer_events(cached or {"answer": self.NOT_FOUND_ANSWER, "sources": []}):
+                    yield event
+                return
+
+            context_docs = self._pack_context(retrieved_docs)
+            sources = self._format_sources(context_docs)
+            yield {"type": "sources", "sources": sources}
+            prompt = self._build_prompt(question, context_docs)
+            parts = []
+            async for chunk in self.llm.astream(prompt):
+                text = self._response_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield {"type": "token", "content": text}
+            yield {"type": "done", **self._finish_answer("".join(parts), question, question_embedding, sources)}
+        except Exception as e:
+            print(f"❌ Lỗi khi xử lý câu hỏi: {e}")
+            traceback.print_exc()
+            yield {"type": "error", "content": f"Có lỗi xảy ra khi xử lý câu hỏi: {e}"}
+
+    @staticmethod
+    def _answer_events(result: dict) -> Iterator[dict]:
+        """Sự kiện stream cho câu trả lời đã có sẵn (cache, chưa sẵn sàng, không tìm thấy)."""
+        yield {"type": "sources", "sources": result["sources"]}
+        yield {"type": "token", "content": result["answer"]}
+        yield {"type": "done", **result}
 
     def debug_chain_inputs(self, question: str, k: int = 5) -> dict:
         if not self.vector_store:
             raise RuntimeError("Knowledge base chưa sẵn sàng. Vui lòng xây dựng hoặc load trước.")
+        return self.debug_inputs_from(question, self._search(question, k=k))
 
-        retrieved_docs = self.vector_store.similarity_search(question, k=k)
-        context_text = "\n\n".join(doc.page_content for doc in retrieved_docs)
-        prompt = self.legal_prompt.format(context=context_text, question=question)
+    def debug_inputs_from(self, question: str, retrieved_docs) -> dict:
+        """Thông tin debug (docs + prompt) cho các docs đã tìm được, dùng chung với API server."""
+        context_docs = self._pack_context(retrieved_docs)
+        prompt = self._build_prompt(question, context_docs)
 
         debug_docs = []
         for i, doc in enumerate(retrieved_docs):
@@ -188,6 +857,7 @@ Trả lời:""",
         return {
             "question": question,
             "retrieved_documents": debug_docs,
+            "context_blocks": len(context_docs),
             "prompt": prompt
         }
 
@@ -195,20 +865,22 @@ Trả lời:""",
         if not self.vector_store:
             return []
         try:
-            docs = self.vector_store.similarity_search(query, k=k)
-            return [
-                {
-                    "content": doc.page_content,
-                    "source": doc.metadata.get("source", "Unknown"),
-                    "similarity_score": "High",
-                    "page": doc.metadata.get("page_number", "N/A")
-                }
-                for doc in docs
-            ]
+            return self.related_articles_from(self._search(query, k=k))
         except Exception as e:
             print(f"Lỗi khi tìm điều luật liên quan: {e}")
             return []
 
+    def related_articles_from(self, docs) -> List[dict]:
+        return [
+            {
+                "content": doc.page_content,
+                "source": doc.metadata.get("source", "Unknown"),
+                "similarity_score": "High",
+                **self._source_page_fields(doc.metadata),
+            }
+            for doc in docs
+        ]
+
 
 if __name__ == "__main__":
     rag = LegalRAGSystem()
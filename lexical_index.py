@@ -0,0 +1,214 @@
+import os
+import re
+import gzip
+import json
+import math
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+LEXICAL_INDEX_FILE = "bm25.json.gz"
+
+# Giữ nguyên số hiệu văn bản như "22/2023/QH15" hay "46/2010/NĐ-CP" thành một token
+_TOKEN_RE = re.compile(r"\w+(?:[/.\-]\w+)*")
+
+
+class VietnameseTokenizer:
+    """Tách từ theo âm tiết, giữ dấu tiếng Việt (chỉ chuẩn hóa NFC + chữ thường).
+
+    ngram > 1 sinh thêm các cụm âm tiết liền nhau ("điều_35", "khoản_3") để khớp chính xác cụm từ.
+    """
+
+    def __init__(self, ngram: Optional[int] = None):
+        self.ngram = ngram if ngram is not None else int(os.getenv("LEXICAL_NGRAMS", "2"))
+
+    def __call__(self, text: str) -> List[str]:
+        syllables = _TOKEN_RE.findall(unicodedata.normalize("NFC", text).lower())
+        tokens = list(syllables)
+        for n in range(2, self.ngram + 1):
+            tokens.extend("_".join(syllables[i:i + n]) for i in range(len(syllables) - n + 1))
+        return tokens
+
+
+class BM25Index:
+    """Inverted index BM25 trong process, key theo docstore id của FAISS.
+
+    Posting list nằm trong mảng numpy dạng CSR: term → đoạn [start, end) trong _slots/_tfs, nên search
+    cộng điểm của cả posting list bằng một phép toán vector. add/remove chỉ ghi vào phần chờ; mảng được
+    dựng lại một lần trước lần search/save tiếp theo (build/sync thêm cả loạt chunk rồi mới tìm).
+    """
+
+    def __init__(self, tokenizer: Optional[VietnameseTokenizer] = None, k1: float = 1.5, b: float = 0.75):
+        self.tokenizer = tokenizer or VietnameseTokenizer()
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[Optional[str]] = []
+        self.doc_lengths: List[int] = []
+        self._slot_by_id: Dict[str, int] = {}
+        self._total_length = 0
+        # (term → dòng, offsets, slots, tfs, norms) đã dựng; thay nguyên khối để search đang chạy không thấy mảng dở dang
+        self._arrays = ({}, np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32),
+                        np.empty(0, dtype=np.float64))
+        # Posting của các chunk mới thêm, chưa được gộp vào mảng
+        self._pending_terms: List[str] = []
+        self._pending_slots: List[int] = []
+        self._pending_tfs: List[int] = []
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slot_by_id)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._slot_by_id
+
+    def ids(self) -> List[str]:
+        return list(self._slot_by_id)
+
+    def add(self, doc_id: str, text: str):
+        if doc_id in self._slot_by_id:
+            self.remove([doc_id])
+        tokens = self.tokenizer(text)
+        slot = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(len(tokens))
+        self._slot_by_id[doc_id] = slot
+        self._total_length += len(tokens)
+        for term, tf in Counter(tokens).items():
+            self._pending_terms.append(term)
+            self._pending_slots.append(slot)
+            self._pending_tfs.append(tf)
+        self._dirty = True
+
+    def remove(self, doc_ids: Iterable[str]):
+        # Slot bị xóa được lọc khỏi posting ở lần dựng mảng tiếp theo
+        for doc_id in doc_ids:
+            slot = self._slot_by_id.pop(doc_id, None)
+            if slot is None:
+                continue
+            self.doc_ids[slot] = None
+            self._total_length -= self.doc_lengths[slot]
+            self.doc_lengths[slot] = 0
+            self._dirty = True
+
+    def _compiled(self) -> tuple:
+        """Gộp phần chờ vào mảng posting (bỏ slot đã xóa, term không còn posting) và tính lại chuẩn hóa độ dài."""
+        with self._lock:
+            if not self._dirty:
+                return self._arrays
+            terms, offsets, slots, tfs, _ = self._arrays
+            rows_by_term = dict(terms)
+            for term in self._pending_terms:
+                rows_by_term.setdefault(term, len(rows_by_term))
+            rows = np.concatenate([
+                np.repeat(np.arange(len(terms), dtype=np.int64), np.diff(offsets)),
+                np.fromiter((rows_by_term[term] for term in self._pending_terms), dtype=np.int64,
+                            count=len(self._pending_terms)),
+            ])
+            slots = np.concatenate([slots, np.asarray(self._pending_slots, dtype=np.int32)])
+            tfs = np.concatenate([tfs, np.asarray(self._pending_tfs, dtype=np.int32)])
+            alive = np.fromiter((doc_id is not None for doc_id in self.doc_ids), dtype=bool, count=len(self.doc_ids))
+            keep = alive[slots]
+            rows, slots, tfs = rows[keep], slots[keep], tfs[keep]
+
+            counts = np.bincount(rows, minlength=len(rows_by_term))
+            live_rows = np.flatnonzero(counts)
+            new_row = np.full(len(rows_by_term), -1, dtype=np.int64)
+            new_row[live_rows] = np.arange(len(live_rows))
+            order = np.lexsort((slots, new_row[rows]))
+            names = list(rows_by_term)
+            terms = {names[row]: i for i, row in enumerate(live_rows)}
+            offsets = np.concatenate([[0], np.cumsum(counts[live_rows])]).astype(np.int64)
+
+            # k1 * (1 - b + b * |d| / avgdl) cho từng slot
+            avg_length = self._total_length / max(len(self._slot_by_id), 1) or 1.0
+            norms = self.k1 * (1 - self.b + self.b * np.asarray(self.doc_lengths, dtype=np.float64) / avg_length)
+
+            self._arrays = (terms, offsets, slots[order], tfs[order], norms)
+            self._pending_terms, self._pending_slots, self._pending_tfs = [], [], []
+            self._dirty = False
+            return self._arrays
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        total_docs = len(self._slot_by_id)
+        if not total_docs:
+            return []
+        terms, offsets, slots, tfs, norms = self._compiled()
+        scores = np.zeros(len(norms), dtype=np.float64)
+        for term in set(self.tokenizer(query)):
+            row = terms.get(term)
+            if row is None:
+                continue
+            start, end = offsets[row], offsets[row + 1]
+            idf = math.log(1 + (total_docs - (end - start) + 0.5) / (end - start + 0.5))
+            posting, tf = slots[start:end], tfs[start:end]
+            # Slot trong một posting list là duy nhất nên cộng bằng fancy indexing được
+            scores[posting] += idf * (self.k1 + 1) * tf / (tf + norms[posting])
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        best = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.doc_ids[slot], float(scores[slot])) for slot in best]
+
+    def save(self, path: str):
+        terms, offsets, slots, tfs, _ = self._compiled()
+        # Nén lại các slot đã xóa trước khi ghi
+        live = sorted(self._slot_by_id.values())
+        remap = np.full(len(self.doc_ids), -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+        slots = remap[slots].tolist()
+        tfs = tfs.tolist()
+        payload = {
+            "ngram": self.tokenizer.ngram,
+            "k1": self.k1,
+            "b": self.b,
+            "doc_ids": [self.doc_ids[slot] for slot in live],
+            "doc_lengths": [self.doc_lengths[slot] for slot in live],
+            "postings": {
+                term: [[slot, tf] for slot, tf in zip(slots[offsets[row]:offsets[row + 1]],
+                                                      tfs[offsets[row]:offsets[row + 1]])]
+                for term, row in terms.items()
+            },
+        }
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+            json.dump(payload, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            payload = json.load(file)
+        index = cls(VietnameseTokenizer(payload["ngram"]), payload["k1"], payload["b"])
+        index.doc_ids = payload["doc_ids"]
+        index.doc_lengths = payload["doc_lengths"]
+        index._slot_by_id = {doc_id: slot for slot, doc_id in enumerate(index.doc_ids)}
+        index._total_length = sum(index.doc_lengths)
+        postings = payload["postings"]
+        for term, posting in postings.items():
+            index._pending_terms.extend([term] * len(posting))
+        pairs = np.asarray([pair for posting in postings.values() for pair in posting], dtype=np.int64).reshape(-1, 2)
+        index._pending_slots, index._pending_tfs = pairs[:, 0], pairs[:, 1]
+        index._dirty = True
+        index._compiled()
+        return index
+
+    def sync_with_store(self, vector_store):
+        """Đồng bộ với docstore của FAISS: bỏ id đã bị xóa, thêm chunk mới."""
+        store_ids = set(vector_store.index_to_docstore_id.values())
+        self.remove([doc_id for doc_id in self.ids() if doc_id not in store_ids])
+        for doc_id in vector_store.index_to_docstore_id.values():
+            if doc_id not in self._slot_by_id:
+                self.add(doc_id, vector_store.docstore.search(doc_id).page_content)
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """Gộp nhiều danh sách id đã xếp hạng: score(d) = Σ 1 / (k + rank)."""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
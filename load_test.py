@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Load test cho api_server.py: bắn nhiều request đồng thời và đo throughput + độ trễ.
+
+Mặc định tự khởi động server với LLM giả (LLM_PROVIDER=fake) nên đo được phần embed, tìm kiếm
+và micro-batching mà không tốn quota LLM. Dùng --url để chạy vào một server đang chạy sẵn.
+
+Ví dụ:
+    python load_test.py --requests 500 --concurrency 32 --output load_report.json
+    python load_test.py --max-batch 1            # tắt micro-batching để so sánh
+    python load_test.py --url http://127.0.0.1:8000 --endpoint related
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+import numpy as np
+
+
+def load_questions(csv_path: str) -> list:
+    with open(csv_path, "r", encoding="utf-8") as file:
+        return [row["question"] for row in csv.DictReader(file)]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args) -> tuple:
+    port = free_port()
+    env = {
+        **os.environ,
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_TOKEN_MS": str(args.token_ms),
+        "FAKE_LLM_FIRST_TOKEN_MS": str(args.first_token_ms),
+        "API_BATCH_WINDOW_MS": str(args.batch_window_ms),
+        "API_MAX_BATCH": str(args.max_batch),
+        # Tắt cache câu trả lời để mọi request đều đi qua embed + tìm kiếm + LLM
+        "ANSWER_CACHE": "0",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_server:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, process, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit("❌ Server dừng khi khởi động (knowledge base đã được build chưa?)")
+        try:
+            response = await client.get(f"{url}/health")
+            if response.status_code == 200 and response.json()["ready"]:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise SystemExit(f"❌ Server không sẵn sàng sau {timeout:.0f}s")
+
+
+async def run_load(args, url: str, process) -> dict:
+    questions = load_questions(args.questions)
+    path = f"/{args.endpoint}"
+    field = "query" if args.endpoint == "related" else "question"
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        await wait_ready(client, url, process, args.startup_timeout)
+        counter = iter(range(args.requests))
+
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(f"{url}{path}", json={field: questions[i % len(questions)]})
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors += not ok
+
+        print(f"🚀 {args.requests} request {path}, concurrency {args.concurrency}...")
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        server_stats = (await client.get(f"{url}/stats")).json()
+
+    return {
+        "endpoint": path,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": args.requests / elapsed,
+        "latency_ms_mean": float(np.mean(latencies)),
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "latency_ms_p99": float(np.percentile(latencies, 99)),
+        "server": server_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test cho Legal RAG HTTP API")
+    parser.add_argument("--url", default=None, help="Server đang chạy; bỏ trống để tự khởi động server với LLM giả")
+    parser.add_argument("--endpoint", choices=["query", "related", "debug"], default="query")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--questions", default="ViBidLQA/test.csv")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--batch-window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Độ trễ mỗi token của LLM giả")
+    parser.add_argument("--first-token-ms", type=float, default=0.0, help="Time-to-first-token của LLM giả")
+    parser.add_argument("--output", default=None, help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args)
+    try:
+        report = asyncio.run(run_load(args, url.rstrip("/"), process))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    batching = report["server"]["batching"]
+    print(f"✅ {report['throughput_rps']:.1f} req/s, {report['errors']} lỗi")
+    print(f"⏱️ p50 {report['latency_ms_p50']:.1f} ms, p95 {report['latency_ms_p95']:.1f} ms, "
+          f"p99 {report['latency_ms_p99']:.1f} ms")
+    print(f"📦 {batching['batches']} batch, trung bình {batching['avg_batch_size']:.1f} câu/batch")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        print(f"💾 Đã ghi báo cáo: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
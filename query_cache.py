@@ -0,0 +1,139 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+
+# Tham chiếu pháp lý trong câu hỏi: "Điều 35", "khoản 2", "điểm a", "Chương II", số hiệu văn bản
+# ("22/2023/QH15", "63/2014/NĐ-CP") và mọi con số khác. Hai câu hỏi chỉ khác nhau ở các token này có
+# embedding gần như trùng nhau nhưng hỏi về hai quy định khác nhau.
+_REFERENCE_PATTERN = re.compile(
+    r"\b(điều|khoản|điểm|chương|mục|phụ\s+lục)\s+([0-9]+[a-zđ]?|[ivxlc]+|[a-zđ])(?!\w)"
+    r"|\d+(?:[/.,\-]\d+)*(?:/[0-9a-zđ]+(?:-[0-9a-zđ]+)*)*",
+    re.IGNORECASE,
+)
+
+
+def legal_references(question: str) -> tuple:
+    """Các tham chiếu pháp lý (đã chuẩn hóa, sắp xếp) trong câu hỏi; dùng làm khóa bắt buộc của cache câu trả lời."""
+    references = []
+    for match in _REFERENCE_PATTERN.finditer(normalize_text(question).lower()):
+        if match.group(1):
+            references.append(f"{' '.join(match.group(1).split())} {match.group(2)}")
+        else:
+            references.append(match.group(0))
+    return tuple(sorted(references))
+
+
+class QueryEmbeddingCache:
+    """LRU cache chính xác: câu hỏi (đã chuẩn hóa) → embedding."""
+
+    def __init__(self, capacity: Optional[int] = None):
+        self.capacity = capacity or int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question: str) -> Optional[List[float]]:
+        key = normalize_text(question)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, question: str, vector: List[float]):
+        key = normalize_text(question)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries)}
+
+
+class SemanticAnswerCache:
+    """Cache câu trả lời theo ngữ nghĩa: câu hỏi mới có cosine ≥ threshold với câu đã hỏi thì dùng lại kết quả.
+
+    Ngoài cosine, hai câu hỏi phải có đúng cùng các tham chiếu pháp lý (legal_references): "Điều 35"
+    và "Điều 36" không bao giờ dùng chung câu trả lời. Mỗi entry hết hạn sau ttl_seconds; vượt
+    capacity thì bỏ entry cũ nhất. Gọi clear() mỗi khi knowledge base thay đổi.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, ttl_seconds: Optional[float] = None,
+                 capacity: Optional[int] = None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+        self.capacity = capacity or int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+        # Mỗi entry: (thời điểm lưu, vector đã chuẩn hóa L2, tham chiếu pháp lý, kết quả)
+        self._entries: List[tuple] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def _prune(self, now: float):
+        fresh = [entry for entry in self._entries if now - entry[0] < self.ttl_seconds]
+        if len(fresh) != len(self._entries):
+            self._entries = fresh
+            self._matrix = None
+
+    def lookup(self, vector: List[float], question: str) -> Optional[dict]:
+        references = legal_references(question)
+        with self._lock:
+            self._prune(time.time())
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._matrix = np.stack([entry[1] for entry in self._entries])
+            scores = self._matrix @ self._unit(vector)
+            scores[[entry[2] != references for entry in self._entries]] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._entries[best][3]
+
+    def store(self, vector: List[float], question: str, result: dict):
+        references = legal_references(question)
+        with self._lock:
+            self._entries.append((time.time(), self._unit(vector), references, result))
+            if len(self._entries) > self.capacity:
+                self._entries = self._entries[-self.capacity:]
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._matrix = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries)}
@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
 """
 Script để rebuild knowledge base nhanh chóng
+
+Mặc định chỉ cập nhật tăng dần các file mới/thay đổi/đã xóa trong data/.
+Dùng --full để xóa vectorstore và xây dựng lại từ đầu.
 """
 
 import os
 import shutil
+import argparse
 from dotenv import load_dotenv
 from legal_rag import LegalRAGSystem
+import kb_manifest
 
-def rebuild_knowledge_base():
-    """Xây dựng lại knowledge base từ đầu"""
+def rebuild_knowledge_base(full: bool = False):
+    """Đồng bộ knowledge base với thư mục data (hoặc xây dựng lại từ đầu nếu full=True)"""
     print("🔄 Bắt đầu rebuild knowledge base...")
     
     # Load environment variables
@@ -25,7 +30,7 @@ def rebuild_knowledge_base():
         print("❌ Không tìm thấy thư mục data")
         return False
     
-    files = os.listdir("data")
+    files = kb_manifest.list_data_files("data")
     if not files:
         print("❌ Thư mục data trống")
         return False
@@ -36,7 +41,7 @@ def rebuild_knowledge_base():
     
     try:
         # Xóa vectorstore cũ
-        if os.path.exists("vectorstore"):
+        if full and os.path.exists("vectorstore"):
             shutil.rmtree("vectorstore")
             print("🗑️ Đã xóa vectorstore cũ")
         
@@ -45,8 +50,12 @@ def rebuild_knowledge_base():
         rag = LegalRAGSystem()
         
         # Xây dựng knowledge base
-        print("🔄 Xây dựng knowledge base...")
-        rag.build_knowledge_base()
+        if full:
+            print("🔄 Xây dựng knowledge base...")
+            rag.build_knowledge_base()
+        else:
+            print("🔄 Đồng bộ knowledge base (chỉ các file thay đổi)...")
+            rag.sync_knowledge_base()
         
         # Test hệ thống
         print("🔄 Test hệ thống...")
@@ -68,4 +77,7 @@ def rebuild_knowledge_base():
         return False
 
 if __name__ == "__main__":
-    rebuild_knowledge_base()
+    parser = argparse.ArgumentParser(description="Rebuild legal knowledge base")
+    parser.add_argument("--full", action="store_true", help="Xóa vectorstore và xây dựng lại toàn bộ")
+    args = parser.parse_args()
+    rebuild_knowledge_base(full=args.full)
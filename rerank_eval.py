@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Đo lợi ích và chi phí của bước rerank cross-encoder trên câu hỏi ViBidLQA.
+
+Mỗi câu hỏi được tìm kiếm hai lần trên knowledge base hiện tại: theo thứ tự của FAISS/BM25 và sau
+khi rerank RERANK_CANDIDATES ứng viên. Với mỗi k trong --k, script tính context_precision@k (công
+thức của ragas: trung bình precision@i tại các vị trí liên quan) và hit_rate@k, cùng độ trễ tìm
+kiếm p50/p95 của từng chế độ và độ trễ tăng thêm do rerank.
+
+Chunk được coi là liên quan nếu trùng đủ nhiều cụm 3 âm tiết với context gốc của câu hỏi
+(--overlap). --ragas tính thêm context_precision của ragas bằng Gemini như evaluate.ipynb
+(cần GOOGLE_API_KEY, chậm và tốn quota).
+
+Ví dụ:
+    RERANKER=0 python rerank_eval.py --limit 200 --k 3,5 --output rerank_eval.json
+    python rerank_eval.py --budget-ms 0 --candidates 20,50
+"""
+
+import csv
+import json
+import time
+import argparse
+import unicodedata
+
+import numpy as np
+from dotenv import load_dotenv
+
+from legal_rag import LegalRAGSystem
+from reranker import CrossEncoderReranker
+
+
+def load_dataset(csv_path: str, limit: int) -> list:
+    with open(csv_path, "r", encoding="utf-8-sig") as file:
+        rows = [row for row in csv.DictReader(file) if row.get("question") and row.get("context")]
+    return rows[:limit] if limit else rows
+
+
+def trigrams(text: str) -> set:
+    words = unicodedata.normalize("NFC", text).lower().split()
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def is_relevant(chunk: str, gold: set, threshold: float) -> bool:
+    # Chunk dài có thể chứa trọn context gốc, hoặc ngược lại: lấy tỉ lệ trùng theo bên ngắn hơn
+    grams = trigrams(chunk)
+    if not grams or not gold:
+        return False
+    return len(grams & gold) / min(len(grams), len(gold)) >= threshold
+
+
+def context_precision(relevant: list) -> float:
+    hits, total = 0, 0.0
+    for i, rel in enumerate(relevant, 1):
+        if rel:
+            hits += 1
+            total += hits / i
+    return total / hits if hits else 0.0
+
+
+def run_mode(rag: LegalRAGSystem, rows: list, k: int, threshold: float) -> tuple:
+    """Tìm kiếm từng câu một (giống lúc phục vụ); trả về (docs của từng câu, độ trễ ms, cờ liên quan)."""
+    results, latencies, relevance = [], [], []
+    for row in rows:
+        start = time.perf_counter()
+        docs = rag.prepare_queries([row["question"]], k=k, use_answer_cache=False)[0].documents
+        latencies.append((time.perf_counter() - start) * 1000)
+        gold = trigrams(row["context"])
+        results.append(docs)
+        relevance.append([is_relevant(doc.page_content, gold, threshold) for doc in docs])
+    return results, latencies, relevance
+
+
+def summarize(name: str, latencies: list, relevance: list, ks: list, extra: dict) -> dict:
+    summary = {"mode": name, **extra,
+               "latency_ms_p50": float(np.percentile(latencies, 50)),
+               "latency_ms_p95": float(np.percentile(latencies, 95))}
+    for k in ks:
+        summary[f"context_precision@{k}"] = float(np.mean([context_precision(rel[:k]) for rel in relevance]))
+        summary[f"hit_rate@{k}"] = float(np.mean([any(rel[:k]) for rel in relevance]))
+    return summary
+
+
+def ragas_context_precision(rows: list, results: list) -> float:
+    import os
+    from datasets import Dataset
+    from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+    from ragas import evaluate
+    from ragas.embeddings import LangchainEmbeddingsWrapper
+    from ragas.llms import LangchainLLMWrapper
+    from ragas.metrics import context_precision as ragas_metric
+
+    dataset = Dataset.from_dict({
+        "question": [row["question"] for row in rows],
+        "answer": [row["answer"] for row in rows],
+        "contexts": [[doc.page_content for doc in docs] for docs in results],
+        "ground_truth": [row["answer"] for row in rows],
+    })
+    llm = ChatGoogleGenerativeAI(model=os.getenv("GOOGLE_CHAT_MODEL", "gemini-2.0-flash"), temperature=0.0,
+                                 google_api_key=os.environ["GOOGLE_API_KEY"])
+    embeddings = GoogleGenerativeAIEmbeddings(model=os.getenv("GOOGLE_EMBEDDING_MODEL", "models/embedding-001"),
+                                              google_api_key=os.environ["GOOGLE_API_KEY"])
+    score = evaluate(dataset, metrics=[ragas_metric], llm=LangchainLLMWrapper(llm),
+                     embeddings=LangchainEmbeddingsWrapper(embeddings))
+    return float(score["context_precision"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rerank latency vs context precision report")
+    parser.add_argument("--questions", default="ViBidLQA/test.csv")
+    parser.add_argument("--limit", type=int, default=200, help="Số câu hỏi dùng để đo (0 = tất cả)")
+    parser.add_argument("--k", default="3,5", help="Các giá trị k để tính context_precision@k")
+    parser.add_argument("--candidates", default="50", help="Các giá trị RERANK_CANDIDATES cần đo")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Ngân sách rerank (mặc định RERANK_BUDGET_MS, 0 = không giới hạn)")
+    parser.add_argument("--overlap", type=float, default=0.5, help="Tỉ lệ trùng cụm 3 âm tiết tối thiểu để coi là liên quan")
+    parser.add_argument("--ragas", action="store_true", help="Tính thêm context_precision của ragas bằng Gemini")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    load_dotenv()
+
+    rows = load_dataset(args.questions, args.limit)
+    ks = sorted(int(k) for k in args.k.split(","))
+    rag = LegalRAGSystem()
+    if not rag.load_knowledge_base():
+        raise SystemExit("❌ Knowledge base chưa sẵn sàng. Chạy 'python rebuild_kb.py' trước.")
+    # Embed trước mọi câu hỏi: độ trễ đo được chỉ gồm tìm kiếm (+ rerank)
+    rag._embed_questions([row["question"] for row in rows])
+    print(f"📊 {len(rows)} câu hỏi, k = {ks}")
+
+    rag.reranker = None
+    results, latencies, relevance = run_mode(rag, rows, ks[-1], args.overlap)
+    baseline = summarize("vector", latencies, relevance, ks, {})
+    if args.ragas:
+        baseline["ragas_context_precision"] = ragas_context_precision(rows, results)
+    modes = [baseline]
+    print(f"  vector: {json.dumps(baseline, ensure_ascii=False)}")
+
+    reranker = CrossEncoderReranker(budget_ms=args.budget_ms)
+    reranker.warm_up()
+    for candidates in (int(n) for n in args.candidates.split(",")):
+        reranker.candidates = candidates
+        reranker.calls = reranker.fallbacks = 0
+        rag.reranker = reranker
+        results, latencies, relevance = run_mode(rag, rows, ks[-1], args.overlap)
+        summary = summarize("rerank", latencies, relevance, ks, {
+            "candidates": candidates, "budget_ms": reranker.budget_ms, "quantized": reranker.quantize,
+            "fallback_rate": reranker.fallbacks / max(reranker.calls, 1),
+        })
+        summary["added_latency_ms_p50"] = summary["latency_ms_p50"] - baseline["latency_ms_p50"]
+        summary["added_latency_ms_p95"] = summary["latency_ms_p95"] - baseline["latency_ms_p95"]
+        for k in ks:
+            summary[f"context_precision_gain@{k}"] = summary[f"context_precision@{k}"] - baseline[f"context_precision@{k}"]
+        if args.ragas:
+            summary["ragas_context_precision"] = ragas_context_precision(rows, results)
+        modes.append(summary)
+        print(f"  rerank N={candidates}: {json.dumps(summary, ensure_ascii=False)}")
+
+    report = {"questions": len(rows), "k": ks, "overlap_threshold": args.overlap,
+              "reranker_model": reranker.model_name, "modes": modes}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        print(f"💾 Đã ghi báo cáo: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
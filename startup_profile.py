@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Đo cold start của một process chỉ phục vụ truy vấn: import legal_rag, khởi tạo LegalRAGSystem,
+load knowledge base dựng sẵn và truy vấn đầu tiên. Mỗi lần đo chạy trong một process mới.
+
+In kết quả JSON (median qua --runs lần) cùng danh sách module nặng đã bị import, để so sánh
+giữa các commit. --check trả mã lỗi nếu process truy vấn import pipeline trích xuất hoặc SDK
+của provider không dùng, import legal_rag chậm hơn --max-import-ms hoặc truy vấn đầu tiên bị lỗi.
+
+Ví dụ:
+    python startup_profile.py --runs 5 --output startup_profile.json
+    LLM_PROVIDER=fake python startup_profile.py --query --check --max-import-ms 1500
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Module chỉ cần khi trích xuất tài liệu
+EXTRACTION_MODULES = ["fitz", "pdfplumber", "PyPDF2", "docx", "pdf2image", "pytesseract",
+                      "document_processor", "ingest_pipeline"]
+# SDK của từng provider: (module, provider cần nó)
+PROVIDER_MODULES = {
+    "langchain_google_genai": "google",
+    "langchain_community.chat_models.ollama": "ollama",
+    "sentence_transformers": "huggingface",
+}
+
+_CHILD = r"""
+import sys, json, time
+timings = {}
+query_error = None
+start = time.perf_counter()
+import legal_rag
+timings["import_ms"] = (time.perf_counter() - start) * 1000
+modules_after_import = set(sys.modules)
+
+start = time.perf_counter()
+rag = legal_rag.LegalRAGSystem()
+timings["init_ms"] = (time.perf_counter() - start) * 1000
+
+if sys.argv[1] == "1":
+    start = time.perf_counter()
+    ready = rag.load_knowledge_base()
+    timings["load_ms"] = (time.perf_counter() - start) * 1000
+    if ready and sys.argv[2] == "1":
+        start = time.perf_counter()
+        rag.get_related_articles("Đối tượng áp dụng của luật đấu thầu", k=3)
+        timings["first_search_ms"] = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        answer = rag.query("Đối tượng áp dụng của luật đấu thầu là gì?")["answer"]
+        timings["first_query_ms"] = (time.perf_counter() - start) * 1000
+        if answer.startswith("Có lỗi xảy ra"):
+            query_error = answer
+
+print("@@" + json.dumps({"timings": timings, "modules_after_import": sorted(modules_after_import),
+                         "modules": sorted(sys.modules), "embedding_provider": rag.embedding_provider,
+                         "llm_provider": rag.llm_provider, "query_error": query_error,
+                         "reranker": rag.reranker is not None}))
+"""
+
+
+def run_child(load: bool, query: bool) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", _CHILD, "1" if load else "0", "1" if query else "0"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith("@@"):
+            return json.loads(line[2:])
+    raise SystemExit(f"❌ Process đo bị lỗi:\n{result.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian cold start của LegalRAGSystem")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--no-load", action="store_true", help="Chỉ đo import + khởi tạo, không load knowledge base")
+    parser.add_argument("--query", action="store_true", help="Đo thêm truy vấn đầu tiên (gọi LLM thật nếu không dùng LLM_PROVIDER=fake)")
+    parser.add_argument("--check", action="store_true", help="Trả mã lỗi nếu import thừa module hoặc vượt --max-import-ms")
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    runs = [run_child(not args.no_load, args.query) for _ in range(args.runs)]
+    last = runs[-1]
+    timings = {key: statistics.median(run["timings"][key] for run in runs) for key in last["timings"]}
+    used = {last["embedding_provider"], last["llm_provider"]}
+    if last["reranker"]:
+        # Cross-encoder của reranker cũng chạy bằng sentence_transformers
+        used.add("huggingface")
+    unexpected = [name for name in EXTRACTION_MODULES if name in last["modules"]]
+    unexpected += [name for name, provider in PROVIDER_MODULES.items() if name in last["modules"] and provider not in used]
+    report = {
+        "runs": args.runs,
+        "python": sys.version.split()[0],
+        "embedding_provider": last["embedding_provider"],
+        "llm_provider": last["llm_provider"],
+        "timings_ms": timings,
+        "modules_loaded": len(last["modules"]),
+        "modules_loaded_by_import": len(last["modules_after_import"]),
+        "unexpected_modules": unexpected,
+        "query_error": last["query_error"],
+    }
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        print(f"💾 Đã ghi báo cáo: {args.output}")
+
+    if args.check:
+        failed = False
+        if unexpected:
+            print(f"❌ Process truy vấn đã import: {', '.join(unexpected)}")
+            failed = True
+        if args.max_import_ms is not None and timings["import_ms"] > args.max_import_ms:
+            print(f"❌ import legal_rag mất {timings['import_ms']:.0f} ms > {args.max_import_ms:.0f} ms")
+            failed = True
+        if last["query_error"]:
+            print(f"❌ Truy vấn đầu tiên bị lỗi: {last['query_error']}")
+            failed = True
+        if failed:
+            sys.exit(1)
+        print("✅ Cold start đạt yêu cầu")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Sinh corpus văn bản pháp luật giả (tiếng Việt, có Chương / Điều / Khoản / Điểm) để benchmark.
+
+Cùng --seed luôn cho cùng nội dung, nên kết quả đo giữa các commit so sánh được với nhau.
+Mỗi văn bản được ghi dưới nhiều định dạng:
+    <out>/text/txt/law_000.txt       text thuần
+    <out>/text/docx/law_000.docx     Word
+    <out>/text/pdf/law_000.pdf       PDF có text layer
+    <out>/scanned/law_000.pdf        PDF chỉ có ảnh (trang được raster hóa), cần OCR
+
+Ví dụ:
+    python synthetic_corpus.py --out bench_data --docs 20 --articles 40
+"""
+
+import os
+import random
+import argparse
+from html import escape
+from typing import List
+
+import numpy as np
+
+_SUBJECTS = ["nhà thầu", "chủ đầu tư", "bên mời thầu", "tổ chuyên gia", "cơ quan quản lý nhà nước",
+             "người có thẩm quyền", "nhà đầu tư", "đơn vị sự nghiệp công lập", "doanh nghiệp nhà nước"]
+_VERBS = ["có trách nhiệm", "được quyền", "phải bảo đảm", "không được", "có nghĩa vụ", "được phép"]
+_OBJECTS = ["lập hồ sơ mời thầu", "đánh giá hồ sơ dự thầu", "công khai thông tin về lựa chọn nhà thầu",
+            "thẩm định kết quả lựa chọn nhà thầu", "ký kết hợp đồng", "bảo đảm dự thầu",
+            "lưu trữ hồ sơ trong quá trình lựa chọn nhà thầu", "giải quyết kiến nghị",
+            "báo cáo tình hình thực hiện hoạt động đấu thầu", "xử lý tình huống trong đấu thầu"]
+_CONDITIONS = ["theo quy định của pháp luật", "trong thời hạn 30 ngày kể từ ngày nhận được văn bản",
+               "trên Hệ thống mạng đấu thầu quốc gia", "trừ trường hợp quy định tại khoản 2 Điều này",
+               "bằng văn bản gửi cơ quan có thẩm quyền", "theo hướng dẫn của Bộ Kế hoạch và Đầu tư"]
+_TITLES = ["Phạm vi điều chỉnh", "Đối tượng áp dụng", "Giải thích từ ngữ", "Bảo đảm cạnh tranh",
+           "Hình thức lựa chọn nhà thầu", "Phương thức lựa chọn nhà thầu", "Kế hoạch lựa chọn nhà thầu",
+           "Hồ sơ mời thầu", "Đánh giá hồ sơ dự thầu", "Thương thảo hợp đồng", "Xử lý vi phạm",
+           "Trách nhiệm của chủ đầu tư", "Chi phí trong lựa chọn nhà thầu", "Điều khoản chuyển tiếp"]
+_DIEM = "abcdđeghik"
+
+
+def _sentence(rng: random.Random) -> str:
+    return (f"{rng.choice(_SUBJECTS).capitalize()} {rng.choice(_VERBS)} {rng.choice(_OBJECTS)} "
+            f"{rng.choice(_CONDITIONS)}.")
+
+
+def generate_law(rng: random.Random, number: int, articles: int) -> str:
+    """Một văn bản luật giả: tiêu đề, các chương, mỗi điều có khoản và đôi khi có điểm."""
+    lines = [f"LUẬT SỐ {number}/2024/QH15", f"QUY ĐỊNH VỀ HOẠT ĐỘNG ĐẤU THẦU SỐ {number}", ""]
+    chapter = 0
+    for dieu in range(1, articles + 1):
+        if dieu == 1 or rng.random() < 0.12:
+            chapter += 1
+            lines += [f"Chương {chapter}", rng.choice(_TITLES).upper(), ""]
+        lines.append(f"Điều {dieu}. {rng.choice(_TITLES)}")
+        for khoan in range(1, rng.randint(2, 5) + 1):
+            if rng.random() < 0.3:
+                lines.append(f"{khoan}. {rng.choice(_SUBJECTS).capitalize()} {rng.choice(_VERBS)} thực hiện các việc sau đây:")
+                for diem in _DIEM[:rng.randint(2, 4)]:
+                    lines.append(f"{diem}) {_sentence(rng)}")
+            else:
+                lines.append(f"{khoan}. " + " ".join(_sentence(rng) for _ in range(rng.randint(1, 3))))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def generate_questions(count: int, docs: int, articles: int, seed: int) -> List[str]:
+    """Câu hỏi giả nhắm vào corpus do generate_corpus(docs, articles) sinh ra: tên điều, số điều và
+    số luật nằm trong phạm vi của corpus. Cùng seed cho cùng danh sách câu hỏi."""
+    rng = np.random.default_rng(seed)
+    return [
+        f"{_TITLES[rng.integers(len(_TITLES))]} tại Điều {rng.integers(1, articles + 1)} Luật số "
+        f"{rng.integers(1, docs + 1)}/2024/QH15 quy định thế nào về {_OBJECTS[rng.integers(len(_OBJECTS))]}? (#{i})"
+        for i in range(count)
+    ]
+
+
+def _pages(text: str, chars_per_page: int) -> List[str]:
+    """Chia text thành các trang theo dòng, mỗi trang khoảng chars_per_page ký tự."""
+    pages, current, size = [], [], 0
+    for line in text.split("\n"):
+        if size + len(line) > chars_per_page and current:
+            pages.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        pages.append("\n".join(current))
+    return pages
+
+
+def write_txt(path: str, text: str):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(text)
+
+
+def write_docx(path: str, text: str):
+    from docx import Document
+
+    document = Document()
+    for line in text.split("\n"):
+        document.add_paragraph(line)
+    document.save(path)
+
+
+def write_text_pdf(path: str, text: str, chars_per_page: int = 1800):
+    import fitz
+
+    # insert_htmlbox dùng font dự phòng có đủ dấu tiếng Việt (font base14 như helv thì không)
+    doc = fitz.open()
+    for page_text in _pages(text, chars_per_page):
+        page = doc.new_page()
+        html = "".join(f"<p style='margin:0'>{escape(line) or '&nbsp;'}</p>" for line in page_text.split("\n"))
+        page.insert_htmlbox(page.rect + (50, 50, -50, -50), html, css="* {font-size: 10pt;}")
+    # Chỉ nhúng các glyph đã dùng, nếu không mỗi file mang theo cả font (vài MB)
+    doc.subset_fonts()
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+def write_scanned_pdf(path: str, text_pdf_path: str, dpi: int = 150):
+    """PDF chỉ có ảnh: raster hóa từng trang của PDF text rồi ghép lại (không còn text layer)."""
+    import fitz
+
+    source = fitz.open(text_pdf_path)
+    doc = fitz.open()
+    for page in source:
+        pixmap = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        doc.new_page(width=page.rect.width, height=page.rect.height).insert_image(page.rect, pixmap=pixmap)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    source.close()
+
+
+def generate_corpus(out: str, docs: int = 10, articles: int = 30, seed: int = 42,
+                    formats=("txt", "docx", "pdf", "scanned"), scanned_dpi: int = 150) -> dict:
+    """Ghi corpus ra out; trả về thống kê số file, ký tự và trang PDF theo định dạng."""
+    rng = random.Random(seed)
+    folders = {"txt": os.path.join(out, "text", "txt"), "docx": os.path.join(out, "text", "docx"),
+               "pdf": os.path.join(out, "text", "pdf"), "scanned": os.path.join(out, "scanned")}
+    for name in formats:
+        os.makedirs(folders[name], exist_ok=True)
+    if "scanned" in formats:
+        os.makedirs(folders["pdf"], exist_ok=True)
+
+    stats = {"docs": docs, "articles_per_doc": articles, "seed": seed, "chars": 0, "pdf_pages": 0, "files": {}}
+    for i in range(docs):
+        text = generate_law(rng, i + 1, articles)
+        name = f"law_{i:03d}"
+        stats["chars"] += len(text)
+        if "txt" in formats:
+            write_txt(os.path.join(folders["txt"], name + ".txt"), text)
+        if "docx" in formats:
+            write_docx(os.path.join(folders["docx"], name + ".docx"), text)
+        if "pdf" in formats or "scanned" in formats:
+            text_pdf = os.path.join(folders["pdf"], name + ".pdf")
+            write_text_pdf(text_pdf, text)
+            stats["pdf_pages"] += len(_pages(text, 1800))
+            if "scanned" in formats:
+                write_scanned_pdf(os.path.join(folders["scanned"], name + ".pdf"), text_pdf, scanned_dpi)
+    for name in formats:
+        stats["files"][name] = len(os.listdir(folders[name]))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sinh corpus văn bản pháp luật giả cho benchmark")
+    parser.add_argument("--out", default="bench_data")
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--articles", type=int, default=30, help="Số điều mỗi văn bản")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--formats", default="txt,docx,pdf,scanned")
+    parser.add_argument("--scanned-dpi", type=int, default=150)
+    args = parser.parse_args()
+    stats = generate_corpus(args.out, args.docs, args.articles, args.seed, tuple(args.formats.split(",")), args.scanned_dpi)
+    print(f"✅ Đã sinh {args.docs} văn bản ({stats['chars']} ký tự, {stats['pdf_pages']} trang PDF) vào {args.out}: {stats['files']}")
+
+
+if __name__ == "__main__":
+    main()
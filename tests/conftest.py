@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import random
+import hashlib
+import threading
+from typing import List, Optional
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+# Module của repo nằm phẳng ở thư mục gốc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_corpus import generate_law  # noqa: E402
+
+
+class FakeEmbeddings(Embeddings):
+    """Embedding xác định, chạy offline: mỗi âm tiết được băm (md5) vào một chiều, vector chuẩn hóa L2.
+
+    Ghi lại từng lần gọi embed_documents; delay giả lập model chậm, fail_on_call làm lần gọi thứ n lỗi.
+    """
+
+    def __init__(self, dim: int = 64, delay: float = 0.0, fail_on_call: Optional[int] = None):
+        self.dim = dim
+        self.delay = delay
+        self.fail_on_call = fail_on_call
+        self.calls: List[List[str]] = []
+        self._lock = threading.Lock()
+
+    def vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float64)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        if not norm:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.calls.append(list(texts))
+            call = len(self.calls)
+        if self.fail_on_call is not None and call == self.fail_on_call:
+            raise RuntimeError(f"embedding call {call} failed")
+        if self.delay:
+            time.sleep(self.delay)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vector(text)
+
+    @property
+    def embedded_texts(self) -> List[str]:
+        return [text for call in self.calls for text in call]
+
+
+def law_text(number: int, articles: int = 12, seed: int = 0) -> str:
+    """Văn bản luật giả có Chương/Điều/Khoản/Điểm (cùng bộ sinh với synthetic_corpus.py)."""
+    return generate_law(random.Random(seed * 1000 + number), number, articles)
+
+
+def write_law(folder, name: str, number: int, articles: int = 12, seed: int = 0) -> str:
+    path = os.path.join(str(folder), name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(law_text(number, articles, seed))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def offline_env(monkeypatch):
+    """Cấu hình xác định cho mọi test: LLM giả, không cache trên đĩa, không process pool."""
+    for name, value in {
+        "LLM_PROVIDER": "fake",
+        "EMBEDDING_PROVIDER": "huggingface",
+        "EMBEDDING_CACHE": "0",
+        "EXTRACTION_CACHE": "0",
+        "ANSWER_CACHE": "0",
+        "INGEST_FILE_WORKERS": "1",
+        "PDF_OCR_WORKERS": "1",
+        "RERANKER": "0",
+        "EXPAND_TO_ARTICLE": "0",
+        "FAISS_INDEX_TYPE": "flat",
+        "CHUNKER": "legal",
+    }.items():
+        monkeypatch.setenv(name, value)
+    for name in ("CONTEXT_TOKEN_BUDGET", "INDEX_BUNDLE_REQUIRED", "INDEX_BUNDLE_VERIFY", "FAKE_LLM_TOKEN_MS",
+                 "FAKE_LLM_FIRST_TOKEN_MS", "EMBEDDING_BATCH_SIZE", "LEGAL_CHUNK_SIZE"):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Thư mục làm việc tạm: data/ rỗng và VECTORSTORE_PATH trỏ vào tmp_path."""
+    import legal_rag
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(legal_rag, "VECTORSTORE_PATH", str(tmp_path / "vectorstore" / "legal_faiss"))
+    (tmp_path / "data").mkdir()
+    return tmp_path
+
+
+@pytest.fixture
+def fake_embeddings():
+    return FakeEmbeddings()
+
+
+@pytest.fixture
+def rag(workspace, fake_embeddings):
+    """LegalRAGSystem dùng FakeEmbeddings và FakeLegalLLM."""
+    from legal_rag import LegalRAGSystem
+
+    system = LegalRAGSystem()
+    system._embeddings = fake_embeddings
+    return system
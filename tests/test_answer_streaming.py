@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from fake_llm import FakeLegalLLM
+
+from conftest import write_law
+
+QUESTION = "Phạm vi điều chỉnh của Luật số 1 là gì?"
+
+
+class FailingLLM(FakeLegalLLM):
+    """Stream vài token rồi lỗi, như khi kết nối tới LLM bị ngắt giữa chừng."""
+
+    fail_after: int = 3
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for i, chunk in enumerate(super()._stream(messages, stop, run_manager, **kwargs)):
+            if i == self.fail_after:
+                raise ConnectionError("stream interrupted")
+            yield chunk
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise ConnectionError("stream interrupted")
+
+
+@pytest.fixture
+def ready(rag, workspace):
+    write_law(str(workspace / "data"), "luat_1.txt", 1)
+    write_law(str(workspace / "data"), "luat_2.txt", 2)
+    rag.build_knowledge_base(str(workspace / "data"))
+    return rag
+
+
+async def collect(events):
+    return [event async for event in events]
+
+
+def check_events(events, expected: dict):
+    assert [event["type"] for event in events][0] == "sources"
+    assert [event["type"] for event in events][-1] == "done"
+    tokens = [event["content"] for event in events if event["type"] == "token"]
+    assert len(tokens) > 3
+    done = events[-1]
+    assert "".join(tokens) == done["answer"]
+    assert events[0]["sources"] == done["sources"]
+    assert {"answer": done["answer"], "sources": done["sources"]} == expected
+
+
+def test_stream_query_tokens_add_up_to_query_answer(ready):
+    expected = ready.query(QUESTION)
+
+    assert expected["answer"].startswith("Theo văn bản tham khảo: ")
+    check_events(list(ready.stream_query(QUESTION)), expected)
+
+
+def test_astream_query_tokens_add_up_to_query_answer(ready):
+    expected = ready.query(QUESTION)
+
+    check_events(asyncio.run(collect(ready.astream_query(QUESTION))), expected)
+    assert asyncio.run(ready.aquery(QUESTION)) == expected
+
+
+def test_error_mid_stream_ends_with_error_event(ready):
+    ready._llm = FailingLLM()
+
+    events = list(ready.stream_query(QUESTION))
+
+    assert [event["type"] for event in events] == ["sources", "token", "token", "token", "error"]
+    assert "stream interrupted" in events[-1]["content"]
+
+
+def test_error_mid_astream_ends_with_error_event(ready):
+    ready._llm = FailingLLM(fail_after=2)
+
+    events = asyncio.run(collect(ready.astream_query(QUESTION)))
+
+    assert [event["type"] for event in events] == ["sources", "token", "token", "error"]
+    assert "stream interrupted" in events[-1]["content"]
+    result = asyncio.run(ready.aquery(QUESTION))
+    assert result["answer"].startswith("Có lỗi xảy ra") and "stream interrupted" in result["answer"]
+
+
+def test_failed_stream_is_not_cached(ready):
+    from query_cache import SemanticAnswerCache
+
+    ready.answer_cache = SemanticAnswerCache()
+    ready._llm = FailingLLM()
+    list(ready.stream_query(QUESTION))
+    ready._llm = FakeLegalLLM()
+
+    events = list(ready.stream_query(QUESTION))
+
+    # Lần trước lỗi nên không có gì trong cache: câu trả lời được sinh lại qua LLM, nhiều token
+    assert sum(event["type"] == "token" for event in events) > 1
+    assert events[-1]["type"] == "done"
+
+
+class RecordingLLM(FakeLegalLLM):
+    """Ghi lại phần văn bản tham khảo của mỗi prompt nhận được."""
+
+    contexts: list = []
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = "\n".join(str(message.content) for message in messages)
+        self.contexts.append(prompt.split("Văn bản pháp luật tham khảo:", 1)[-1].split("Câu hỏi:", 1)[0].strip())
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+
+def test_query_batch_contexts_are_what_the_llm_saw(ready, monkeypatch):
+    ready._llm = RecordingLLM()
+    packed = []
+    pack_context = ready._pack_context
+    monkeypatch.setattr(ready, "_pack_context", lambda docs: packed.append(docs) or pack_context(docs))
+    questions = [QUESTION, "Luật số 2 áp dụng cho đối tượng nào?"]
+
+    results = ready.query_batch(questions, concurrency=1)
+
+    assert len(packed) == len(questions)
+    assert ["\n\n".join(result["contexts"]) for result in results] == ready._llm.contexts
+    assert [result["answer"] for result in results] == [ready.query(question)["answer"] for question in questions]
@@ -0,0 +1,31 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import api_server
+
+from conftest import write_law
+
+
+@pytest.fixture
+def client(rag, workspace):
+    write_law(str(workspace / "data"), "luat_1.txt", 1)
+    rag.build_knowledge_base(str(workspace / "data"))
+    with TestClient(api_server.create_app(rag)) as test_client:
+        yield test_client
+
+
+def test_k_is_bounded_on_related_and_debug(client):
+    question = "Phạm vi điều chỉnh của Luật số 1 là gì?"
+
+    assert len(client.post("/related", json={"query": question, "k": 2}).json()) == 2
+    assert client.post("/debug", json={"question": question, "k": api_server.MAX_K}).status_code == 200
+    for path, field in (("/related", "query"), ("/debug", "question")):
+        for k in (0, -1, api_server.MAX_K + 1):
+            assert client.post(path, json={field: question, "k": k}).status_code == 422
+
+
+def test_question_length_is_bounded(client):
+    assert client.post("/query", json={"question": "Luật số 1 quy định gì?"}).status_code == 200
+    for question in ("", "x" * (api_server.MAX_QUESTION_CHARS + 1)):
+        assert client.post("/query", json={"question": question}).status_code == 422
+        assert client.post("/related", json={"query": question}).status_code == 422
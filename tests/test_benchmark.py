@@ -0,0 +1,24 @@
+import os
+
+import benchmark
+import legal_rag
+from synthetic_corpus import generate_corpus, generate_questions
+
+from conftest import FakeEmbeddings
+
+
+def test_bench_query_writes_only_under_workdir(tmp_path, monkeypatch):
+    corpus, workdir, cwd = tmp_path / "corpus", tmp_path / "work", tmp_path / "cwd"
+    workdir.mkdir()
+    cwd.mkdir()
+    generate_corpus(str(corpus), docs=2, articles=6, seed=1)
+    monkeypatch.chdir(cwd)
+    monkeypatch.setattr(legal_rag.LegalRAGSystem, "embeddings", property(lambda self: FakeEmbeddings()))
+    before = legal_rag.VECTORSTORE_PATH
+
+    result = benchmark.bench_query(str(corpus), str(workdir), generate_questions(3, 2, 6, seed=1))
+
+    assert result["vectors"] > 0 and result["questions"] == 3
+    assert os.listdir(cwd) == []
+    assert os.listdir(workdir) == ["vectorstore"]
+    assert legal_rag.VECTORSTORE_PATH == before
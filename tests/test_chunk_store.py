@@ -0,0 +1,160 @@
+import os
+
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+import chunk_store
+from chunk_store import MmapDocstore, convert_legacy, load_store, save_store
+
+from conftest import FakeEmbeddings
+
+DOCUMENTS = [
+    Document(page_content="Điều 1. Phạm vi điều chỉnh\nLuật này quy định về hoạt động đấu thầu.",
+             metadata={"source": "luat.txt", "dieu": "1", "chuong_title": "QUY ĐỊNH CHUNG"}),
+    Document(page_content="Điều 2. Đối tượng áp dụng\nCơ quan, tổ chức, cá nhân tham gia đấu thầu.",
+             metadata={"source": "luat.txt", "dieu": "2", "page_number": 1}),
+    Document(page_content="Điều 3. Giải thích từ ngữ\n1. Bên mời thầu là cơ quan, tổ chức…",
+             metadata={"source": "nghi-dinh/nd.txt", "dieu": "3", "dieu_list": ["3"]}),
+]
+IDS = ["id-1", "id-2", "id-3"]
+
+
+def build_store(embeddings) -> FAISS:
+    return FAISS.from_documents(DOCUMENTS, embeddings, ids=IDS)
+
+
+def contents(store: FAISS) -> list:
+    rows = []
+    for position in sorted(store.index_to_docstore_id):
+        document = store.docstore.search(store.index_to_docstore_id[position])
+        rows.append((store.index_to_docstore_id[position], document.page_content, document.metadata))
+    return rows
+
+
+def test_save_and_load_roundtrip_keeps_text_metadata_and_order(tmp_path):
+    embeddings = FakeEmbeddings()
+    store = build_store(embeddings)
+    expected = contents(store)
+    folder = str(tmp_path / "store")
+
+    save_store(store, folder)
+    loaded = load_store(folder, embeddings)
+
+    assert isinstance(store.docstore, MmapDocstore) and isinstance(loaded.docstore, MmapDocstore)
+    assert contents(store) == contents(loaded) == expected
+    # Tiếng Việt có dấu và ký tự nhiều byte trong UTF-8 không bị cắt lệch offset
+    assert loaded.docstore.search("id-3").page_content.endswith("cơ quan, tổ chức…")
+    assert loaded.docstore.search("id-1").metadata["chuong_title"] == "QUY ĐỊNH CHUNG"
+    np.testing.assert_array_equal(loaded.index.reconstruct_n(0, 3), store.index.reconstruct_n(0, 3))
+    assert not os.path.exists(os.path.join(folder, chunk_store.LEGACY_FILE))
+
+
+def test_loaded_store_answers_similarity_search(tmp_path):
+    embeddings = FakeEmbeddings()
+    folder = str(tmp_path / "store")
+    save_store(build_store(embeddings), folder)
+    loaded = load_store(folder, embeddings)
+
+    top = loaded.similarity_search(DOCUMENTS[1].page_content, k=1)[0]
+
+    assert (top.page_content, top.metadata) == (DOCUMENTS[1].page_content, DOCUMENTS[1].metadata)
+    assert loaded.docstore.search("khong-co") == "ID khong-co not found."
+
+
+def test_delete_and_add_after_load_are_written_on_next_save(tmp_path):
+    embeddings = FakeEmbeddings()
+    folder = str(tmp_path / "store")
+    save_store(build_store(embeddings), folder)
+    loaded = load_store(folder, embeddings)
+    extra = Document(page_content="Điều 4. Hành vi bị cấm", metadata={"source": "luat.txt", "dieu": "4"})
+
+    loaded.delete(["id-2"])
+    loaded.add_documents([extra], ids=["id-4"])
+
+    assert "id-2" not in loaded.docstore and "id-4" in loaded.docstore
+    assert len(loaded.docstore) == 3
+    with pytest.raises(ValueError):
+        loaded.docstore.add({"id-1": extra})
+    save_store(loaded, folder)
+    reloaded = load_store(folder, embeddings)
+    assert [row[0] for row in contents(reloaded)] == ["id-1", "id-3", "id-4"]
+    assert reloaded.docstore.search("id-4").page_content == extra.page_content
+    assert reloaded.docstore.search("id-2") == "ID id-2 not found."
+
+
+def test_convert_legacy_reads_langchain_pickle(tmp_path):
+    embeddings = FakeEmbeddings()
+    store = build_store(embeddings)
+    folder = str(tmp_path / "legacy")
+    store.save_local(folder)
+
+    assert convert_legacy(folder, remove_pickle=True) == 3
+
+    assert not os.path.exists(os.path.join(folder, chunk_store.LEGACY_FILE))
+    assert chunk_store.has_chunk_store(folder)
+    assert contents(load_store(folder, embeddings)) == contents(store)
+
+
+def test_load_rejects_chunk_count_that_differs_from_index(tmp_path):
+    embeddings = FakeEmbeddings()
+    folder = str(tmp_path / "store")
+    save_store(build_store(embeddings), folder)
+    chunk_store.write_chunks(folder, iter([("id-1", "Điều 1.", {"source": "luat.txt"})]))
+
+    with pytest.raises(ValueError, match="1 chunks but index.faiss has 3 vectors"):
+        load_store(folder, embeddings)
+
+
+def test_empty_store_can_be_saved_and_loaded(tmp_path):
+    embeddings = FakeEmbeddings()
+    store = build_store(embeddings)
+    store.delete(IDS)
+    folder = str(tmp_path / "store")
+
+    save_store(store, folder)
+    loaded = load_store(folder, embeddings)
+
+    assert loaded.index.ntotal == 0 and len(loaded.docstore) == 0
+
+
+def test_save_never_replaces_files_a_loaded_docstore_has_mapped(tmp_path, monkeypatch):
+    embeddings = FakeEmbeddings()
+    folder = str(tmp_path / "store")
+    save_store(build_store(embeddings), folder)
+    serving = load_store(folder, embeddings)
+    mapped = {os.path.join(folder, name) for name in chunk_store.chunk_files(folder).values()}
+    replaced = []
+    replace = os.replace
+    monkeypatch.setattr(chunk_store.os, "replace", lambda src, dst: replaced.append(dst) or replace(src, dst))
+
+    updated = load_store(folder, embeddings)
+    updated.delete(["id-1"])
+    save_store(updated, folder)
+
+    # Windows không cho os.replace đè lên file đang được mmap: thế hệ mới phải có tên khác
+    assert replaced and not mapped & set(replaced)
+    assert serving.docstore.search("id-1").page_content == DOCUMENTS[0].page_content
+    assert [row[0] for row in contents(load_store(folder, embeddings))] == ["id-2", "id-3"]
+    # Trên POSIX file của thế hệ cũ được xóa ngay (docstore cũ vẫn đọc được qua mmap)
+    chunk_files = [name for name in os.listdir(folder) if name.startswith("chunks_") and name != chunk_store.CURRENT_FILE]
+    assert sorted(chunk_files) == sorted(chunk_store.chunk_files(folder).values())
+
+
+def test_store_without_generation_pointer_still_loads(tmp_path):
+    embeddings = FakeEmbeddings()
+    folder = str(tmp_path / "store")
+    save_store(build_store(embeddings), folder)
+    # Chunk store do phiên bản trước ghi: tên file không đánh số, chưa có CURRENT_FILE
+    for role, name in chunk_store.chunk_files(folder).items():
+        os.replace(os.path.join(folder, name), os.path.join(folder, chunk_store._CHUNK_FILES[role]))
+    os.remove(os.path.join(folder, chunk_store.CURRENT_FILE))
+
+    loaded = load_store(folder, embeddings)
+    assert contents(loaded) == contents(build_store(embeddings))
+    save_store(loaded, folder)
+
+    assert chunk_store.current_generation(folder) == 1
+    assert not os.path.exists(os.path.join(folder, chunk_store.TEXT_FILE))
+    assert contents(load_store(folder, embeddings)) == contents(build_store(embeddings))
@@ -0,0 +1,70 @@
+from langchain_core.documents import Document
+
+from context_builder import estimate_tokens, pack_documents
+
+from conftest import law_text
+
+TEXT = law_text(1, articles=8)
+
+
+def chunk(start: int, end: int, index: int, source: str = "luat.txt", prefix: str = "", **metadata) -> Document:
+    metadata = {"source": source, "chunk_index": index, "start_offset": start, "end_offset": end, **metadata}
+    if prefix:
+        metadata["prefix_chars"] = len(prefix)
+    return Document(page_content=prefix + TEXT[start:end], metadata=metadata)
+
+
+def newline_after(position: int) -> int:
+    return TEXT.index("\n", position)
+
+
+def test_overlapping_chunks_merge_without_duplicated_text():
+    cut = newline_after(900)
+    first = chunk(0, 500, 0, page_number=1)
+    second = chunk(350, cut, 1, page_number=1, page_end=2)
+    # Chunk sau bắt đầu ở dòng mới và có tiêu đề điều lặp lại ở đầu (prefix_chars)
+    third = chunk(cut + 1, cut + 400, 2, prefix="Điều 3. Giải thích từ ngữ\n", page_number=2)
+
+    packed = pack_documents([second, third, first])
+
+    assert len(packed) == 1
+    merged = packed[0]
+    assert merged.page_content == TEXT[:cut + 400]
+    assert merged.metadata["merged_chunks"] == [0, 1, 2]
+    assert (merged.metadata["start_offset"], merged.metadata["end_offset"]) == (0, cut + 400)
+    assert (merged.metadata["page_number"], merged.metadata["page_end"]) == (1, 2)
+    # Document của docstore không bị sửa
+    assert "merged_chunks" not in first.metadata and first.metadata["end_offset"] == 500
+
+
+def test_distant_chunks_and_other_sources_stay_separate_in_rank_order():
+    near, far = chunk(0, 300, 0), chunk(2000, 2300, 5)
+    other = chunk(0, 300, 0, source="nghi_dinh.txt")
+
+    packed = pack_documents([other, far, near])
+
+    # File có chunk xếp hạng cao nhất đứng trước, trong cùng file theo vị trí
+    assert [(doc.metadata["source"], doc.metadata["start_offset"]) for doc in packed] == [
+        ("nghi_dinh.txt", 0), ("luat.txt", 0), ("luat.txt", 2000)]
+    assert all("merged_chunks" not in doc.metadata for doc in packed)
+
+
+def test_budget_drops_lowest_ranked_blocks_and_cuts_at_a_line():
+    docs = [chunk(0, 600, 0, source="a.txt"), chunk(0, 600, 0, source="b.txt"), chunk(0, 600, 0, source="c.txt")]
+
+    assert len(pack_documents(docs, budget_tokens=0)) == 3
+    # 200 token mỗi khối: phần còn lại 50 token nhỏ hơn mức tối thiểu nên khối cuối bị bỏ hẳn
+    assert [doc.metadata["source"] for doc in pack_documents(docs, budget_tokens=450)] == ["a.txt", "b.txt"]
+
+    packed = pack_documents(docs, budget_tokens=550)
+    assert [doc.metadata["source"] for doc in packed] == ["a.txt", "b.txt", "c.txt"]
+    cut = packed[-1].page_content
+    assert len(cut) <= 150 * 3 and TEXT[:600].startswith(cut) and TEXT[len(cut)] in "\n "
+    assert sum(estimate_tokens(doc.page_content, 3.0) for doc in packed) <= 550
+
+
+def test_single_block_over_budget_is_cut_rather_than_dropped():
+    packed = pack_documents([chunk(0, 3000, 0)], budget_tokens=50)
+
+    assert len(packed) == 1 and 0 < len(packed[0].page_content) <= 150
+    assert TEXT.startswith(packed[0].page_content)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from embedding_cache import CachedEmbeddings, EmbeddingStore
+
+from conftest import FakeEmbeddings
+
+
+def test_torn_append_is_dropped_on_reload(tmp_path):
+    store = EmbeddingStore("model", cache_dir=str(tmp_path))
+    store.add_many(["a", "b"], [[1, 1], [2, 2]])
+    # Process bị ngắt sau khi ghi vector, trước khi ghi key: một hàng đủ và nửa hàng không có key
+    with open(store._vectors_path, "ab") as file:
+        file.write(np.asarray([[9, 9], [9, 9]], dtype=np.float32).tobytes()[:12])
+    with open(store._keys_path, "a", encoding="utf-8") as file:
+        file.write("x")
+
+    reloaded = EmbeddingStore("model", cache_dir=str(tmp_path))
+    reloaded.add_many(["c"], [[3, 3]])
+
+    assert len(reloaded) == 3
+    again = EmbeddingStore("model", cache_dir=str(tmp_path))
+    assert again.get_many(["a", "b", "c", "x"]) == [[1, 1], [2, 2], [3, 3], None]
+
+
+def test_vectors_without_keys_are_not_assigned_to_new_keys(tmp_path):
+    store = EmbeddingStore("model", cache_dir=str(tmp_path))
+    store.add_many(["a"], [[1, 1]])
+    with open(store._vectors_path, "ab") as file:
+        file.write(np.asarray([[9, 9]], dtype=np.float32).tobytes())
+
+    store.add_many(["b"], [[2, 2]])
+
+    assert store.get_many(["a", "b"]) == [[1, 1], [2, 2]]
+    assert EmbeddingStore("model", cache_dir=str(tmp_path)).get_many(["b"]) == [[2, 2]]
+
+
+def test_cached_embeddings_reuse_stored_vectors(tmp_path):
+    underlying = FakeEmbeddings()
+    cached = CachedEmbeddings(underlying, "model", EmbeddingStore("model", cache_dir=str(tmp_path)))
+    texts = ["Điều 1. Phạm vi điều chỉnh", "Điều 2.  Đối tượng áp dụng", "Điều 1. Phạm vi điều chỉnh"]
+
+    first = cached.embed_documents(texts)
+    again = CachedEmbeddings(FakeEmbeddings(fail_on_call=1), "model",
+                             EmbeddingStore("model", cache_dir=str(tmp_path))).embed_documents(texts)
+
+    np.testing.assert_allclose(again, first, rtol=1e-6)
+    assert underlying.embedded_texts == texts[:2]
+    assert cached.stats()["hits"] == 1 and cached.stats()["misses"] == 2
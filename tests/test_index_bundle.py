@@ -0,0 +1,174 @@
+import os
+import json
+
+import pytest
+
+import chunk_store
+import index_bundle
+import legal_rag
+from index_bundle import BundleMismatchError
+from legal_rag import LegalRAGSystem
+
+from conftest import FakeEmbeddings, write_law
+
+EMBEDDING = {"provider": "huggingface", "model": "sentence-transformers/all-MiniLM-L6-v2"}
+
+
+@pytest.fixture
+def built(rag, workspace):
+    """Vectorstore nhỏ đã build (kèm bundle.json) trong thư mục tạm."""
+    data = str(workspace / "data")
+    write_law(data, "a.txt", 1)
+    write_law(data, "b.txt", 2)
+    rag.build_knowledge_base(data)
+    return legal_rag.VECTORSTORE_PATH
+
+
+def fresh_system() -> LegalRAGSystem:
+    system = LegalRAGSystem()
+    system._embeddings = FakeEmbeddings()
+    return system
+
+
+def test_build_writes_bundle_that_verifies(rag, built):
+    bundle = index_bundle.load_bundle(built)
+
+    assert bundle == rag.bundle
+    assert bundle["embedding"] == {**EMBEDDING, "dimension": 64}
+    assert bundle["vectors"] == rag.vector_store.index.ntotal
+    assert bundle["corpus"]["files"] == 2 and sorted(bundle["corpus"]["sources"]) == ["a.txt", "b.txt"]
+    assert {"index.faiss", "chunks_current.json", "manifest.json"} <= set(bundle["files"])
+    assert set(chunk_store.chunk_files(built).values()) <= set(bundle["files"])
+    index_bundle.verify_bundle(built, bundle, EMBEDDING["provider"], EMBEDDING["model"])
+    assert index_bundle.check_files(built, bundle) == []
+    # Id chỉ phụ thuộc nội dung file
+    assert index_bundle.write_bundle(built, EMBEDDING, 64, bundle["vectors"], bundle["splitter"],
+                                     bundle["index"])["bundle_id"] == bundle["bundle_id"]
+
+
+def test_other_embedding_model_is_rejected(built):
+    bundle = index_bundle.load_bundle(built)
+
+    with pytest.raises(BundleMismatchError, match="configured embedding model is huggingface:other-model"):
+        index_bundle.verify_bundle(built, bundle, "huggingface", "other-model")
+
+
+def test_tampered_or_extra_files_are_reported(built):
+    bundle = index_bundle.load_bundle(built)
+    text_file = chunk_store.chunk_files(built)["text"]
+    with open(os.path.join(built, text_file), "r+b") as file:
+        first = file.read(1)
+        file.seek(0)
+        file.write(bytes([first[0] ^ 1]))
+    with open(os.path.join(built, "index.pkl"), "wb") as file:
+        file.write(b"x")
+
+    with pytest.raises(BundleMismatchError) as error:
+        index_bundle.verify_bundle(built, bundle, EMBEDDING["provider"], EMBEDDING["model"])
+    assert f"{text_file}: checksum mismatch" in str(error.value)
+    assert "index.pkl: not part of bundle" in str(error.value)
+    # INDEX_BUNDLE_VERIFY=0: chỉ kiểm tra model, không so checksum
+    index_bundle.verify_bundle(built, bundle, EMBEDDING["provider"], EMBEDDING["model"], checksums=False)
+
+
+def test_dimension_and_vector_count_are_checked(built):
+    bundle = index_bundle.load_bundle(built)
+
+    index_bundle.check_dimension(bundle, 64, bundle["vectors"])
+    with pytest.raises(BundleMismatchError, match="dimension 384"):
+        index_bundle.check_dimension(bundle, 384, bundle["vectors"])
+    with pytest.raises(BundleMismatchError, match="vectors"):
+        index_bundle.check_dimension(bundle, 64, bundle["vectors"] + 1)
+
+
+def test_corrupted_or_unknown_format_bundle_is_rejected(tmp_path):
+    path = tmp_path / index_bundle.BUNDLE_FILE
+    assert index_bundle.load_bundle(str(tmp_path)) is None
+
+    path.write_text("{", encoding="utf-8")
+    with pytest.raises(BundleMismatchError, match="corrupted"):
+        index_bundle.load_bundle(str(tmp_path))
+    path.write_text(json.dumps({"format": index_bundle.BUNDLE_FORMAT + 1}), encoding="utf-8")
+    with pytest.raises(BundleMismatchError, match="Unsupported"):
+        index_bundle.load_bundle(str(tmp_path))
+
+
+def test_load_refuses_mismatched_bundle(built, monkeypatch):
+    assert fresh_system().load_knowledge_base()
+
+    monkeypatch.setenv("EMBEDDING_MODEL", "other-model")
+    system = fresh_system()
+    assert not system.load_knowledge_base()
+    assert system.vector_store is None
+
+
+def test_load_refuses_tampered_store_unless_verification_is_off(built, monkeypatch):
+    with open(os.path.join(built, chunk_store.chunk_files(built)["ids"]), "a", encoding="utf-8") as file:
+        file.write(" ")
+
+    assert not fresh_system().load_knowledge_base()
+    monkeypatch.setenv("INDEX_BUNDLE_VERIFY", "0")
+    assert fresh_system().load_knowledge_base()
+
+
+def test_bundle_required_refuses_store_without_bundle(built, monkeypatch):
+    os.remove(os.path.join(built, index_bundle.BUNDLE_FILE))
+
+    assert fresh_system().load_knowledge_base()
+    monkeypatch.setenv("INDEX_BUNDLE_REQUIRED", "1")
+    assert not fresh_system().load_knowledge_base()
+
+
+def test_sync_rewrites_bundle(rag, built, workspace):
+    before = index_bundle.load_bundle(built)
+    write_law(str(workspace / "data"), "c.txt", 3)
+
+    rag.sync_knowledge_base(str(workspace / "data"))
+
+    after = index_bundle.load_bundle(built)
+    assert after["bundle_id"] != before["bundle_id"]
+    assert after["vectors"] == rag.vector_store.index.ntotal > before["vectors"]
+    assert sorted(after["corpus"]["sources"]) == ["a.txt", "b.txt", "c.txt"]
+    assert index_bundle.check_files(built, after) == []
+
+
+def hashed_files(monkeypatch) -> list:
+    names = []
+    file_sha256 = index_bundle.file_sha256
+    monkeypatch.setattr(index_bundle, "file_sha256", lambda path: names.append(os.path.basename(path)) or file_sha256(path))
+    return names
+
+
+def test_sync_without_changes_does_not_rehash(rag, built, workspace, monkeypatch):
+    before = index_bundle.load_bundle(built)
+    hashed = hashed_files(monkeypatch)
+
+    rag.sync_knowledge_base(str(workspace / "data"))
+
+    assert hashed == []
+    assert index_bundle.load_bundle(built) == before == rag.bundle
+
+    # Chỉ đổi mtime: manifest được ghi lại nên chỉ manifest được hash lại
+    path = workspace / "data" / "a.txt"
+    os.utime(path, (1_000_000_000, 1_000_000_000))
+    rag.sync_knowledge_base(str(workspace / "data"))
+
+    assert hashed == ["manifest.json"]
+    after = index_bundle.load_bundle(built)
+    assert after["files"] == index_bundle.artifact_checksums(built)
+    assert after["files"]["index.faiss"] == before["files"]["index.faiss"]
+
+
+def test_sync_rehashes_only_rewritten_files(rag, built, workspace, monkeypatch):
+    hashed = hashed_files(monkeypatch)
+    write_law(str(workspace / "data"), "c.txt", 3)
+
+    rag.sync_knowledge_base(str(workspace / "data"))
+    during_sync = list(hashed)
+
+    # Mỗi file vừa ghi được hash đúng một lần
+    assert "index.faiss" in during_sync and chunk_store.chunk_files(built)["text"] in during_sync
+    assert sorted(during_sync) == sorted(set(during_sync))
+    bundle = index_bundle.load_bundle(built)
+    assert bundle["files"] == index_bundle.artifact_checksums(built)
+    assert index_bundle.check_files(built, bundle) == []
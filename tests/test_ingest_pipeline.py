@@ -0,0 +1,262 @@
+import sys
+import types
+import hashlib
+import threading
+import time
+
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+import kb_manifest
+import vector_index
+from document_processor import LegalDocumentProcessor
+from ingest_pipeline import StreamingIndexBuilder
+
+from conftest import FakeEmbeddings, write_law
+
+
+class FakeProcessor:
+    """Processor giả: mỗi file cho chunks_per_file chunk, đếm số chunk đã sinh ra."""
+
+    def __init__(self, chunks_per_file: int, fail_at=None):
+        self.chunks_per_file = chunks_per_file
+        self.fail_at = fail_at
+        self.produced = 0
+
+    def extract_many(self, files):
+        for source, path in files:
+            yield source, path, hashlib.sha256(source.encode("utf-8")).hexdigest(), [source], None
+
+    def iter_chunks(self, pages, source, page_table=None):
+        for i in range(self.chunks_per_file):
+            if self.fail_at == (source, i):
+                raise ValueError(f"cannot chunk {source} at {i}")
+            self.produced += 1
+            yield Document(page_content=f"{source} đoạn {i} quy định", metadata={"source": source, "chunk_index": i})
+
+
+def fake_files(tmp_path, count: int):
+    files = []
+    for i in range(count):
+        path = tmp_path / f"file_{i}.txt"
+        path.write_text("x", encoding="utf-8")
+        files.append((path.name, str(path)))
+    return files
+
+
+def expected_ids(files, chunks_per_file: int):
+    return [
+        kb_manifest.chunk_id(hashlib.sha256(source.encode("utf-8")).hexdigest(), source, i)
+        for source, _ in files
+        for i in range(chunks_per_file)
+    ]
+
+
+def ingest_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("ingest-")]
+
+
+class SlowFirstBatches(FakeEmbeddings):
+    """Các batch đầu chậm hơn batch sau, để embed song song xong không theo thứ tự gửi."""
+
+    def embed_documents(self, texts):
+        call = len(self.calls)
+        time.sleep(max(0.0, 0.04 - 0.01 * call))
+        return super().embed_documents(texts)
+
+
+def test_batches_keep_chunk_order_when_embeddings_finish_out_of_order(tmp_path):
+    files = fake_files(tmp_path, 3)
+    embeddings = SlowFirstBatches()
+    builder = StreamingIndexBuilder(embeddings, FakeProcessor(17), batch_size=5, queue_size=2, embed_workers=4)
+
+    batches = list(builder.iter_batches(files))
+
+    assert [doc_id for batch in batches for doc_id in batch.ids] == expected_ids(files, 17)
+    # Batch gom chunk qua ranh giới file, chỉ batch cuối được thiếu
+    assert [len(batch.ids) for batch in batches] == [5] * 10 + [1]
+    for batch in batches:
+        assert batch.vectors == [embeddings.vector(text) for text in batch.texts]
+    assert set(builder.file_entries) == {source for source, _ in files}
+
+
+def test_blocked_embedding_bounds_chunks_in_memory(tmp_path):
+    release = threading.Event()
+
+    class BlockingEmbeddings(FakeEmbeddings):
+        def embed_documents(self, texts):
+            release.wait(timeout=10)
+            return super().embed_documents(texts)
+
+    files = fake_files(tmp_path, 20)
+    processor = FakeProcessor(50)
+    builder = StreamingIndexBuilder(BlockingEmbeddings(), processor, batch_size=10, queue_size=2, embed_workers=1)
+    collected = []
+    consumer = threading.Thread(target=lambda: collected.extend(builder.iter_batches(files)))
+    consumer.start()
+    try:
+        time.sleep(0.5)
+        # Tối đa: 2 batch đang embed + 2 batch trong queue + 1 batch đang chờ put + batch dở dang
+        assert processor.produced <= 10 * 6
+    finally:
+        release.set()
+        consumer.join(timeout=30)
+    assert not consumer.is_alive()
+    assert sum(len(batch.ids) for batch in collected) == 20 * 50 == processor.produced
+
+
+def test_embedding_error_is_raised_to_caller_and_stages_stop(tmp_path):
+    files = fake_files(tmp_path, 10)
+    builder = StreamingIndexBuilder(FakeEmbeddings(fail_on_call=3), FakeProcessor(20), batch_size=8,
+                                    queue_size=1, embed_workers=2)
+
+    with pytest.raises(RuntimeError, match="embedding call 3 failed"):
+        list(builder.iter_batches(files))
+    assert ingest_threads() == []
+
+
+def test_chunking_error_is_raised_after_earlier_batches(tmp_path):
+    files = fake_files(tmp_path, 3)
+    processor = FakeProcessor(10, fail_at=("file_1.txt", 4))
+    builder = StreamingIndexBuilder(FakeEmbeddings(), processor, batch_size=4, queue_size=2, embed_workers=2)
+
+    batches = []
+    with pytest.raises(ValueError, match="cannot chunk file_1.txt at 4"):
+        for batch in builder.iter_batches(files):
+            batches.append(batch)
+    ids = [doc_id for batch in batches for doc_id in batch.ids]
+    assert ids == expected_ids(files, 10)[:len(ids)]
+    assert ingest_threads() == []
+
+
+def test_streaming_build_matches_from_documents(workspace):
+    data = workspace / "data"
+    for number in range(1, 4):
+        write_law(data, f"luat_{number}.txt", number, articles=15)
+    write_law(data, "nghi-dinh/nd_1.txt", 9, articles=6)
+    files = kb_manifest.list_data_files(str(data))
+    embeddings = FakeEmbeddings()
+
+    builder = StreamingIndexBuilder(embeddings, LegalDocumentProcessor(file_workers=1), batch_size=7,
+                                    queue_size=2, embed_workers=3)
+    store = builder.add_to_store(None, files.items())
+
+    documents = LegalDocumentProcessor(file_workers=1).process_documents(str(data))
+    hashes = {source: hashlib.sha256(open(path, "rb").read()).hexdigest() for source, path in files.items()}
+    ids = [kb_manifest.chunk_id(hashes[doc.metadata["source"]], doc.metadata["source"], doc.metadata["chunk_index"])
+           for doc in documents]
+    reference = FAISS.from_documents(documents, FakeEmbeddings(), ids=ids)
+
+    assert store.index.ntotal == reference.index.ntotal == len(documents) == builder.total_chunks
+    assert list(store.index_to_docstore_id.values()) == ids
+    np.testing.assert_array_equal(store.index.reconstruct_n(0, store.index.ntotal),
+                                  reference.index.reconstruct_n(0, reference.index.ntotal))
+    for doc_id in ids:
+        built, expected = store.docstore.search(doc_id), reference.docstore.search(doc_id)
+        assert (built.page_content, built.metadata) == (expected.page_content, expected.metadata)
+    assert {source: entry["chunk_ids"] for source, entry in builder.file_entries.items()} == {
+        source: [doc_id for doc_id in ids if doc_id.split(":")[1] == source] for source in files
+    }
+    assert all(len(call) <= 7 for call in embeddings.calls)
+
+
+def test_reservoir_sample_is_uniform_over_the_whole_stream():
+    sampler = vector_index.ReservoirSample(500, seed=1)
+    for start in range(0, 10_000, 64):
+        sampler.add(np.arange(start, min(start + 64, 10_000), dtype=np.float32).reshape(-1, 1))
+
+    positions = sampler.sample()[:, 0]
+    assert sampler.seen == 10_000 and len(positions) == 500 == len(set(positions))
+    # Mỗi phần tư của luồng đóng góp khoảng 1/4 mẫu
+    quarters = np.bincount((positions // 2500).astype(int), minlength=4)
+    assert all(90 <= count <= 160 for count in quarters)
+
+    small = vector_index.ReservoirSample(500)
+    small.add(np.ones((30, 4)))
+    assert small.sample().shape == (30, 4)
+
+
+def test_ivf_is_trained_on_a_sample_of_the_whole_corpus(tmp_path, monkeypatch):
+    files = fake_files(tmp_path, 10)
+    embeddings = FakeEmbeddings()
+    trained = []
+    create_index = vector_index.create_index
+
+    def recording(settings, dim, training_vectors=None):
+        trained.append(np.asarray(training_vectors))
+        return create_index(settings, dim, training_vectors)
+
+    monkeypatch.setattr(vector_index, "create_index", recording)
+    settings = {**vector_index.index_settings(), "type": "ivf_flat", "nlist": 2, "train_size": 60}
+    builder = StreamingIndexBuilder(embeddings, FakeProcessor(30), batch_size=8, queue_size=2,
+                                    embed_workers=2, index_settings=settings)
+
+    store = builder.add_to_store(None, files)
+
+    assert list(store.index_to_docstore_id.values()) == expected_ids(files, 30)
+    assert store.index.ntotal == builder.total_chunks == 300
+    (sample,) = trained
+    assert len(sample) == 60
+    # 60 vector đầu tiên chỉ thuộc hai file đầu; mẫu đều phải có vector của các file sau
+    late = {tuple(np.float32(embeddings.vector(f"file_{i}.txt đoạn {j} quy định"))) for i in range(5, 10) for j in range(30)}
+    assert sum(tuple(vector) in late for vector in sample) >= 15
+
+
+class StubSentenceTransformer:
+    """Thay SentenceTransformer: ghi lại từng batch được encode."""
+
+    def __init__(self, embeddings: FakeEmbeddings):
+        self.embeddings = embeddings
+        self.batches = []
+
+    def encode(self, texts, **kwargs):
+        self.batches.append(list(texts))
+        return np.asarray([self.embeddings.vector(text) for text in texts])
+
+
+def test_huggingface_embeddings_are_called_in_batches(tmp_path, monkeypatch):
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    try:
+        import sentence_transformers  # noqa: F401
+    except ImportError:
+        # embed_documents chỉ import module này để dùng khi multi_process=True
+        monkeypatch.setitem(sys.modules, "sentence_transformers", types.ModuleType("sentence_transformers"))
+    reference = FakeEmbeddings()
+    client = StubSentenceTransformer(reference)
+    embeddings = HuggingFaceEmbeddings.construct(client=client, model_name="stub", encode_kwargs={},
+                                                 multi_process=False, show_progress=False)
+    files = fake_files(tmp_path, 3)
+    builder = StreamingIndexBuilder(embeddings, FakeProcessor(9), batch_size=4, queue_size=2, embed_workers=2)
+
+    store = builder.add_to_store(None, files)
+
+    assert sorted(len(batch) for batch in client.batches) == [3] + [4] * 6
+    assert store.index.ntotal == 27
+    first = store.docstore.search(store.index_to_docstore_id[0])
+    np.testing.assert_allclose(store.index.reconstruct(0), reference.vector(first.page_content), rtol=1e-6)
+
+
+def test_google_embeddings_are_called_in_batches(tmp_path, monkeypatch):
+    import langchain_google_genai.embeddings as google_embeddings
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    reference = FakeEmbeddings()
+    requests = []
+
+    def embed_content(model, content, task_type, title=None):
+        requests.append((model, task_type, list(content)))
+        return {"embedding": [reference.vector(text) for text in content]}
+
+    monkeypatch.setattr(google_embeddings.genai, "embed_content", embed_content)
+    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key="test-key")
+    files = fake_files(tmp_path, 2)
+    builder = StreamingIndexBuilder(embeddings, FakeProcessor(10), batch_size=6, queue_size=1, embed_workers=2)
+
+    store = builder.add_to_store(None, files)
+
+    assert sorted(len(texts) for _, _, texts in requests) == [2, 6, 6, 6]
+    assert {(model, task_type) for model, task_type, _ in requests} == {("models/embedding-001", "retrieval_document")}
+    assert store.index.ntotal == 20
@@ -0,0 +1,235 @@
+import re
+
+from langchain_community.vectorstores import FAISS
+
+from document_processor import LegalDocumentProcessor
+from legal_chunker import HierarchyIndex, LegalStructureChunker, ParseState, parse_structure
+
+from conftest import FakeEmbeddings, law_text
+
+LAW = """QUỐC HỘI
+Luật số 22/2023/QH15
+
+Căn cứ Hiến pháp nước Cộng hòa xã hội chủ nghĩa Việt Nam;
+
+Chương I
+QUY ĐỊNH CHUNG
+
+Điều 1. Phạm vi điều chỉnh
+Luật này quy định về hoạt động đấu thầu.
+
+Điều 2. Đối tượng áp dụng
+1. Cơ quan, tổ chức, cá nhân tham gia hoạt động đấu thầu.
+2. Tổ chức, cá nhân có hoạt động đấu thầu không thuộc phạm vi điều chỉnh của Luật này.
+
+Chương II
+LỰA CHỌN NHÀ THẦU
+
+Mục 1
+HÌNH THỨC LỰA CHỌN NHÀ THẦU
+
+Điều 3. Đấu thầu rộng rãi
+1. Đấu thầu rộng rãi được áp dụng cho các gói thầu, trừ trường hợp quy định tại
+Điều 2. Đối tượng áp dụng nêu trên và Điều 64 của Luật này.
+2. Khi thực hiện đấu thầu rộng rãi, bên mời thầu phải bảo đảm các yêu cầu sau đây:
+a) Không hạn chế số lượng nhà thầu tham dự;
+b) Đăng tải thông báo mời thầu trên Hệ thống mạng đấu thầu quốc gia;
+c) Bảo đảm thời gian chuẩn bị hồ sơ dự thầu theo quy định.
+3. Chính phủ quy định chi tiết Điều này.
+"""
+
+DECREE = """CHÍNH PHỦ
+Nghị định số 10/2024/NĐ-CP
+
+Điều 1. Ban hành kèm theo Nghị định này Quy định về quản lý đấu thầu qua mạng.
+
+Điều 2. Hiệu lực thi hành
+Nghị định này có hiệu lực từ ngày 01 tháng 7 năm 2024, thay thế
+Điều 1. Phạm vi của Nghị định số 25/2020/NĐ-CP.
+
+QUY ĐỊNH
+Về quản lý đấu thầu qua mạng
+(Ban hành kèm theo Nghị định số 10/2024/NĐ-CP)
+
+Chương I
+QUY ĐỊNH CHUNG
+
+Điều 1. Phạm vi điều chỉnh
+Quy định này áp dụng cho hoạt động đấu thầu qua mạng.
+
+Điều 2. Đối tượng áp dụng
+Cơ quan, tổ chức tham gia đấu thầu qua mạng.
+
+Chương II
+HỆ THỐNG MẠNG ĐẤU THẦU
+
+Điều 3. Chức năng của hệ thống
+Hệ thống bảo đảm công khai thông tin.
+
+PHỤ LỤC I
+MẪU BÁO CÁO
+
+Điều 1. Nội dung báo cáo
+Báo cáo gồm số gói thầu đã thực hiện.
+"""
+
+
+def non_space(text: str) -> str:
+    return re.sub(r"\s+", "", text)
+
+
+def test_parse_structure_reads_chapters_articles_clauses_and_points():
+    articles, first_heading = parse_structure(LAW)
+
+    assert first_heading == LAW.index("Chương I")
+    assert [(a.dieu, a.title, a.chuong, a.chuong_title, a.muc) for a in articles] == [
+        ("1", "Phạm vi điều chỉnh", "I", "QUY ĐỊNH CHUNG", None),
+        ("2", "Đối tượng áp dụng", "I", "QUY ĐỊNH CHUNG", None),
+        ("3", "Đấu thầu rộng rãi", "II", "LỰA CHỌN NHÀ THẦU", "1"),
+    ]
+    third = articles[2]
+    assert [clause.label for clause in third.clauses] == ["1", "2", "3"]
+    assert [point.label for point in third.clauses[1].children] == ["a", "b", "c"]
+    assert LAW[third.clauses[1].children[1].start:].startswith("b) Đăng tải")
+
+
+def test_wrapped_line_starting_with_lower_article_number_is_not_a_heading():
+    articles, _ = parse_structure(LAW)
+    # "Điều 2. Đối tượng áp dụng nêu trên..." là dòng bị ngắt giữa khoản 1 của Điều 3
+    assert [article.dieu for article in articles].count("2") == 1
+    third = articles[2]
+    assert "Điều 64 của Luật này" in LAW[third.clauses[0].start:third.clauses[0].end]
+
+
+def test_short_articles_of_one_chapter_are_merged():
+    chunks = LegalStructureChunker(chunk_size=1200).split(LAW)
+
+    assert [chunk.metadata.get("dieu") for chunk in chunks] == [None, "1-2", "3"]
+    merged = chunks[1]
+    assert merged.metadata["dieu_list"] == ["1", "2"]
+    assert merged.metadata["chuong"] == "I" and merged.metadata["chuong_title"] == "QUY ĐỊNH CHUNG"
+    assert merged.text.startswith("Điều 1. Phạm vi điều chỉnh") and merged.text.endswith("phạm vi điều chỉnh của Luật này.")
+    assert chunks[0].text.startswith("QUỐC HỘI")
+
+
+def test_long_article_is_split_by_clauses_with_repeated_heading():
+    chunks = [chunk for chunk in LegalStructureChunker(chunk_size=260).split(LAW) if chunk.metadata.get("dieu") == "3"]
+
+    assert len(chunks) > 1
+    assert chunks[0].text.startswith("Điều 3. Đấu thầu rộng rãi\n1. Đấu thầu rộng rãi")
+    assert chunks[0].metadata["khoan"] == "1"
+    for chunk in chunks[1:]:
+        prefix = chunk.text[:chunk.metadata["prefix_chars"]]
+        assert prefix.startswith("Điều 3. Đấu thầu rộng rãi\n")
+        assert chunk.metadata["muc"] == "1"
+    assert any("diem" in chunk.metadata for chunk in chunks)
+    for chunk in chunks:
+        content = chunk.text[chunk.metadata.get("prefix_chars", 0):]
+        assert LAW[chunk.start:chunk.end].strip() == content.strip()
+
+
+def test_chunks_cover_the_text_exactly_once():
+    text = law_text(3, articles=40)
+    chunker = LegalStructureChunker(chunk_size=600)
+    chunks = chunker.split(text)
+
+    spans = sorted((chunk.start, chunk.end) for chunk in chunks)
+    assert all(end <= next_start for (_, end), (next_start, _) in zip(spans, spans[1:]))
+    covered = "".join(text[start:end] for start, end in spans)
+    # Dòng Chương/Mục chỉ còn trong metadata; mọi thứ khác (lời văn đầu, nội dung các điều) nằm trong đúng một chunk
+    articles, first_heading = parse_structure(text)
+    assert non_space(covered) == non_space(text[:first_heading] + "".join(text[a.start:a.end] for a in articles))
+    assert max(len(chunk.text) for chunk in chunks) <= 600 * 1.25 + 100
+
+
+def test_split_stream_resumes_with_parse_state():
+    chunker = LegalStructureChunker(chunk_size=1200)
+    articles, first_heading = parse_structure(LAW)
+    chunks, cut, state = chunker.split_stream(LAW)
+
+    # Điều cuối có thể còn tiếp ở phần đọc sau nên chưa được chia
+    assert cut == LAW.index("Điều 3.")
+    assert non_space("".join(LAW[c.start:c.end] for c in chunks)) == non_space(
+        LAW[:first_heading] + "".join(LAW[a.start:a.end] for a in articles[:2]))
+    assert state == ParseState(chuong="II", chuong_title="LỰA CHỌN NHÀ THẦU", muc="1", last_dieu=2)
+    rest = chunker.split(LAW[cut:], state)
+    assert [chunk.metadata.get("dieu") for chunk in rest] == ["3"]
+    assert rest[0].metadata["chuong"] == "II"
+
+
+def test_hierarchy_index_maps_articles_to_chunks(tmp_path):
+    processor = LegalDocumentProcessor(file_workers=1)
+    processor.legal_chunker = LegalStructureChunker(chunk_size=260)
+    documents = processor.chunk_pages([LAW], "luat.txt")
+    ids = [f"id-{doc.metadata['chunk_index']}" for doc in documents]
+    store = FAISS.from_documents(documents, FakeEmbeddings(), ids=ids)
+
+    index = HierarchyIndex.from_store(store)
+    path = str(tmp_path / "hierarchy.json")
+    index.save(path)
+    loaded = HierarchyIndex.load(path)
+
+    article_3 = [doc_id for doc, doc_id in zip(documents, ids) if doc.metadata.get("dieu") == "3"]
+    assert loaded.article_chunk_ids("luat.txt", "3") == article_3
+    assert loaded.article_chunk_ids("luat.txt", "1") == loaded.article_chunk_ids("luat.txt", "2") != []
+    assert loaded.article("luat.txt", "3")["title"] == "Đấu thầu rộng rãi"
+    assert loaded.documents["luat.txt"]["chapters"]["II"]["articles"] == ["3"]
+    assert loaded.article_chunk_ids("khac.txt", "3") == []
+
+
+def test_article_numbering_restarts_in_attached_documents():
+    articles, _ = parse_structure(DECREE)
+
+    assert [(a.van_ban, a.dieu, a.chuong, a.title) for a in articles] == [
+        (0, "1", None, "Ban hành kèm theo Nghị định này Quy định về quản lý đấu thầu qua mạng."),
+        (0, "2", None, "Hiệu lực thi hành"),
+        (1, "1", "I", "Phạm vi điều chỉnh"),
+        (1, "2", "I", "Đối tượng áp dụng"),
+        (1, "3", "II", "Chức năng của hệ thống"),
+        (2, "1", None, "Nội dung báo cáo"),
+    ]
+    # Dòng "Điều 1. Phạm vi của Nghị định..." bị ngắt giữa câu, không có tiêu đề văn bản đi kèm đứng trước
+    assert "Điều 1. Phạm vi của Nghị định số 25/2020" in DECREE[articles[1].start:articles[1].end]
+    # Tiêu đề văn bản đi kèm vẫn nằm trong một chunk (cuối điều đứng trước)
+    assert "(Ban hành kèm theo Nghị định số 10/2024/NĐ-CP)" in DECREE[articles[1].start:articles[1].end]
+
+
+def test_chapter_one_after_another_chapter_starts_a_new_document():
+    text = "Chương I\nA\nĐiều 1. Một\nNội dung.\nChương II\nB\nĐiều 2. Hai\nNội dung.\n" \
+           "Chương I\nC\nĐiều 1. Ba\nNội dung.\nĐiều 1. Không phải tiêu đề\n"
+    articles, _ = parse_structure(text)
+
+    assert [(a.van_ban, a.dieu, a.chuong_title) for a in articles] == [(0, "1", "A"), (0, "2", "B"), (1, "1", "C")]
+
+
+def test_attached_document_articles_get_their_own_chunks_and_hierarchy_keys():
+    processor = LegalDocumentProcessor(file_workers=1)
+    processor.legal_chunker = LegalStructureChunker(chunk_size=1200)
+    documents = processor.chunk_pages([DECREE], "nd.txt")
+
+    assert [(doc.metadata.get("van_ban", 0), doc.metadata.get("dieu")) for doc in documents] == [
+        (0, None), (0, "1-2"), (1, "1-2"), (1, "3"), (2, "1")]
+    ids = [f"id-{doc.metadata['chunk_index']}" for doc in documents]
+    index = HierarchyIndex.from_store(FAISS.from_documents(documents, FakeEmbeddings(), ids=ids))
+
+    assert index.article_chunk_ids("nd.txt", "1") == ["id-1"]
+    assert index.article_chunk_ids("nd.txt", "1", van_ban=1) == ["id-2"]
+    assert index.article_chunk_ids("nd.txt", "1", van_ban=2) == ["id-4"]
+    assert index.article("nd.txt", "3", van_ban=1)["title"] == "Chức năng của hệ thống"
+    assert index.documents["nd.txt"]["chapters"]["1:II"]["articles"] == ["1:3"]
+
+
+def test_streamed_attached_documents_keep_their_numbering():
+    processor = LegalDocumentProcessor(file_workers=1)
+    processor.legal_chunker = LegalStructureChunker(chunk_size=1200)
+    expected = [(doc.metadata.get("van_ban", 0), doc.metadata.get("dieu_list") or [doc.metadata.get("dieu")])
+                for doc in processor.chunk_pages([DECREE], "nd.txt")]
+    articles = [(van_ban, dieu) for van_ban, dieus in expected for dieu in dieus if dieu]
+
+    for window in (60, 150, 400):
+        processor.stream_window = window
+        lines = DECREE.split("\n")
+        pages = ["\n".join(lines[i:i + 3]) for i in range(0, len(lines), 3)]
+        streamed = list(processor.iter_chunks(iter(pages), "nd.txt"))
+        assert [(doc.metadata.get("van_ban", 0), dieu) for doc in streamed
+                for dieu in doc.metadata.get("dieu_list") or [doc.metadata.get("dieu")] if dieu] == articles
@@ -0,0 +1,116 @@
+import gzip
+import json
+import math
+from collections import Counter
+
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from lexical_index import BM25Index, VietnameseTokenizer, reciprocal_rank_fusion
+
+from conftest import FakeEmbeddings, law_text
+
+TEXTS = {
+    "a": "Điều 35. Bảo đảm dự thầu theo Luật số 22/2023/QH15",
+    "b": "Điều 36. Bảo đảm thực hiện hợp đồng; bảo đảm dự thầu không áp dụng",
+    "c": "Nhà thầu nước ngoài phải liên danh với nhà thầu trong nước",
+    "d": "Điều 35 của Nghị định 63/2014/NĐ-CP quy định chi tiết",
+}
+
+
+def reference_scores(texts: dict, query: str, k1: float = 1.5, b: float = 0.75) -> dict:
+    """BM25 viết thẳng theo công thức, để đối chiếu."""
+    tokenizer = VietnameseTokenizer()
+    docs = {doc_id: Counter(tokenizer(text)) for doc_id, text in texts.items()}
+    avg_length = sum(sum(tf.values()) for tf in docs.values()) / len(docs)
+    scores = {}
+    for term in set(tokenizer(query)):
+        containing = [doc_id for doc_id, tf in docs.items() if term in tf]
+        idf = math.log(1 + (len(docs) - len(containing) + 0.5) / (len(containing) + 0.5))
+        for doc_id in containing:
+            tf, length = docs[doc_id][term], sum(docs[doc_id].values())
+            norm = k1 * (1 - b + b * length / avg_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * (k1 + 1) * tf / (tf + norm)
+    return scores
+
+
+def build(texts: dict) -> BM25Index:
+    index = BM25Index()
+    for doc_id, text in texts.items():
+        index.add(doc_id, text)
+    return index
+
+
+def test_tokenizer_keeps_document_numbers_and_adds_bigrams():
+    assert VietnameseTokenizer(ngram=2)("Điều 35 Luật 22/2023/QH15") == [
+        "điều", "35", "luật", "22/2023/qh15", "điều_35", "35_luật", "luật_22/2023/qh15"]
+
+
+@pytest.mark.parametrize("query", ["Điều 35 bảo đảm dự thầu", "22/2023/QH15", "nhà thầu nước ngoài", "không có"])
+def test_scores_match_bm25_formula(query):
+    results = build(TEXTS).search(query, k=10)
+    expected = reference_scores(TEXTS, query)
+
+    assert {doc_id: pytest.approx(score) for doc_id, score in results} == expected
+    assert [score for _, score in results] == sorted(expected.values(), reverse=True)
+
+
+def test_remove_and_readd_update_postings_and_lengths():
+    index = build(TEXTS)
+    index.search("điều", k=4)
+    index.remove(["a", "missing"])
+    index.add("d", "Nhà thầu phụ")
+    remaining = {"b": TEXTS["b"], "c": TEXTS["c"], "d": "Nhà thầu phụ"}
+
+    assert len(index) == 3 and "a" not in index
+    for query in ("Điều 35 bảo đảm", "nhà thầu"):
+        results = index.search(query, k=10)
+        assert {doc_id: pytest.approx(score) for doc_id, score in results} == reference_scores(remaining, query)
+    assert index.search("22/2023/QH15") == []
+
+
+def test_top_k_is_cut_after_ranking():
+    texts = {f"d{i}": law_text(i, articles=3) for i in range(40)}
+    expected = sorted(reference_scores(texts, "Điều 2 nhà thầu").items(), key=lambda item: -item[1])
+
+    results = build(texts).search("Điều 2 nhà thầu", k=5)
+
+    assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected[:5]]
+
+
+def test_save_and_load_keep_results_and_file_format(tmp_path):
+    index = build(TEXTS)
+    index.remove(["b"])
+    path = str(tmp_path / "bm25.json.gz")
+
+    index.save(path)
+    loaded = BM25Index.load(path)
+
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        payload = json.load(file)
+    # Slot đã xóa được nén lại; posting vẫn là [[slot, tf], ...] như định dạng cũ
+    assert payload["doc_ids"] == ["a", "c", "d"]
+    assert sorted(payload["postings"]["35"]) == [[0, 1], [2, 1]]
+    for query in ("Điều 35", "nhà thầu trong nước"):
+        assert loaded.search(query) == index.search(query)
+    loaded.add("e", "Điều 35 mới")
+    assert "e" in dict(loaded.search("Điều 35"))
+
+
+def test_sync_with_store_follows_docstore():
+    documents = [Document(page_content=text, metadata={}) for text in TEXTS.values()]
+    store = FAISS.from_documents(documents, FakeEmbeddings(), ids=list(TEXTS))
+    index = BM25Index()
+    index.sync_with_store(store)
+    store.delete(["c"])
+    store.add_texts(["Hợp đồng trọn gói"], ids=["e"])
+
+    index.sync_with_store(store)
+
+    assert sorted(index.ids()) == ["a", "b", "d", "e"]
+    assert [doc_id for doc_id, _ in index.search("hợp đồng trọn gói")][0] == "e"
+
+
+def test_reciprocal_rank_fusion_prefers_documents_ranked_by_both():
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60) == ["a", "c", "b"]
@@ -0,0 +1,52 @@
+from document_processor import LegalDocumentProcessor
+from extraction_cache import ExtractionCache
+
+from conftest import write_law
+
+
+def make_files(folder, count: int) -> list:
+    return [(f"luat_{i}.txt", write_law(str(folder), f"luat_{i}.txt", i, articles=5 + i)) for i in range(count)]
+
+
+def serial(files) -> list:
+    return list(LegalDocumentProcessor(file_workers=1).extract_many(files))
+
+
+def test_cached_files_are_read_only_when_their_turn_comes(tmp_path):
+    files = make_files(tmp_path / "data", 4)
+    cache = ExtractionCache(cache_dir=str(tmp_path / "cache"))
+    list(LegalDocumentProcessor(file_workers=1, extraction_cache=cache).extract_many(files))
+    reads = []
+    get = cache.get
+    cache.get = lambda key: reads.append(key) or get(key)
+    processor = LegalDocumentProcessor(file_workers=2, extraction_cache=cache)
+
+    results = []
+    for result in processor.extract_many(files):
+        # Mỗi lần trả về chỉ đọc đúng một entry cache, không nạp trước cả lô vào RAM
+        assert len(reads) == len(results) + 1
+        results.append(result)
+
+    assert results == serial(files)
+
+
+def test_buffer_limit_bounds_files_held_ahead_of_their_turn(tmp_path, monkeypatch):
+    files = make_files(tmp_path / "data", 5)
+    processor = LegalDocumentProcessor(file_workers=2, buffer_limit_mb=0)
+    held = []
+    submit = LegalDocumentProcessor._submit_file
+
+    def recording(pool, item, files, in_flight, reserved):
+        submit(pool, item, files, in_flight, reserved)
+        held.append(len(reserved))
+
+    monkeypatch.setattr(LegalDocumentProcessor, "_submit_file", staticmethod(recording))
+
+    assert list(processor.extract_many(files)) == serial(files)
+    # Ngân sách 0: chỉ file đang tới lượt được gửi đi, không có file nào xong sớm rồi nằm chờ
+    assert held == [1] * len(files)
+
+    held.clear()
+    processor.buffer_limit = 1024 * 1024
+    assert list(processor.extract_many(files)) == serial(files)
+    assert max(held) > 1
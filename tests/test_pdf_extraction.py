@@ -0,0 +1,34 @@
+import sys
+
+from document_processor import LegalDocumentProcessor
+from synthetic_corpus import write_scanned_pdf, write_text_pdf
+
+from conftest import law_text
+
+
+def test_text_pdf_is_read_without_ocr_packages(tmp_path, monkeypatch):
+    path = str(tmp_path / "luat.pdf")
+    write_text_pdf(path, law_text(1, articles=10))
+    # None trong sys.modules làm mọi lệnh import gói đó lỗi ImportError
+    monkeypatch.setitem(sys.modules, "pytesseract", None)
+    monkeypatch.setitem(sys.modules, "pdfplumber", None)
+    processor = LegalDocumentProcessor(file_workers=1)
+
+    text, pages = processor.read_pdf(path, return_pages=True)
+
+    assert len(pages) > 1 and "Điều 1." in text
+    assert processor.last_failed_pages == []
+
+
+def test_scanned_page_without_pytesseract_fails_only_that_page(tmp_path, monkeypatch):
+    text_pdf = str(tmp_path / "luat.pdf")
+    write_text_pdf(text_pdf, law_text(2, articles=4))
+    scanned = str(tmp_path / "scan.pdf")
+    write_scanned_pdf(scanned, text_pdf, dpi=50)
+    monkeypatch.setitem(sys.modules, "pytesseract", None)
+    processor = LegalDocumentProcessor(file_workers=1)
+
+    _, pages = processor.read_pdf(scanned, return_pages=True)
+
+    # Trang ảnh được chuyển sang OCR, lỗi import chỉ làm hỏng trang đó chứ không làm hỏng cả file
+    assert processor.last_failed_pages == list(range(len(pages)))
@@ -0,0 +1,45 @@
+from query_cache import SemanticAnswerCache, legal_references
+
+from conftest import write_law
+
+
+def test_legal_references_are_extracted_and_normalized():
+    assert legal_references("Điều 35 Luật Đấu thầu 22/2023/QH15 quy định gì?") == ("22/2023/qh15", "điều 35")
+    assert legal_references("điểm  a khoản 2 Điều 3 Nghị định 63/2014/NĐ-CP") == (
+        "63/2014/nđ-cp", "khoản 2", "điều 3", "điểm a")
+    assert legal_references("Chương II và Phụ lục 1") == ("chương ii", "phụ lục 1")
+    assert legal_references("Điều kiện dự thầu là gì? Mục đích của luật?") == ()
+    assert legal_references("Bảo đảm dự thầu từ 1% đến 3% giá gói thầu") == ("1", "3")
+
+
+def test_semantic_hit_requires_the_same_legal_references():
+    cache = SemanticAnswerCache(threshold=0.95, ttl_seconds=60, capacity=8)
+    vector = [1.0, 0.0, 0.0]
+    cache.store(vector, "Điều 35 quy định gì?", {"answer": "Điều 35 ..."})
+    cache.store([0.99, 0.01, 0.0], "Điều 36 quy định gì?", {"answer": "Điều 36 ..."})
+
+    # Cùng embedding nhưng khác số điều: chỉ trúng entry có đúng tham chiếu
+    assert cache.lookup(vector, "Điều 36 quy định gì?") == {"answer": "Điều 36 ..."}
+    assert cache.lookup(vector, "Nội dung Điều 35?") == {"answer": "Điều 35 ..."}
+    assert cache.lookup(vector, "Điều 37 quy định gì?") is None
+    assert cache.lookup(vector, "Khoản 2 Điều 35 quy định gì?") is None
+    assert cache.lookup([0.0, 1.0, 0.0], "Điều 35 quy định gì?") is None
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_answer_cache_is_off_by_default(rag, workspace, monkeypatch):
+    from legal_rag import LegalRAGSystem
+
+    monkeypatch.delenv("ANSWER_CACHE")
+    assert LegalRAGSystem().answer_cache is None
+    monkeypatch.setenv("ANSWER_CACHE", "1")
+    system = LegalRAGSystem()
+    system._embeddings = rag._embeddings
+    write_law(str(workspace / "data"), "luat_1.txt", 1)
+    system.build_knowledge_base(str(workspace / "data"))
+    first = system.query("Điều 3 Luật số 1 quy định gì?")
+
+    assert system.query("Điều 3 Luật số 1 quy định gì ?") == first
+    assert system.answer_cache.hits == 1
+    system.query("Điều 4 Luật số 1 quy định gì?")
+    assert system.answer_cache.hits == 1
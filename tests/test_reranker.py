@@ -0,0 +1,81 @@
+import time
+
+from langchain_core.documents import Document
+
+from reranker import CrossEncoderReranker
+
+from conftest import write_law
+
+QUESTION = "Phạm vi điều chỉnh của Luật số 1 là gì?"
+
+
+class FakeCrossEncoder:
+    """Cross-encoder giả: điểm là số lần từ khóa xuất hiện trong chunk; delay giả lập model chậm."""
+
+    def __init__(self, keyword: str, delay: float = 0.0):
+        self.keyword = keyword
+        self.delay = delay
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay)
+        return [float(text.count(self.keyword)) for _, text in pairs]
+
+
+def reranker(model: FakeCrossEncoder, **kwargs) -> CrossEncoderReranker:
+    instance = CrossEncoderReranker(model_name="fake", quantize=False, **kwargs)
+    instance._model = model
+    return instance
+
+
+def docs(*texts):
+    return [Document(page_content=text, metadata={"chunk_index": i}) for i, text in enumerate(texts)]
+
+
+def test_scores_reorder_candidates_and_leave_originals_untouched():
+    candidates = docs("không", "thầu", "thầu thầu", "thầu")
+    model = FakeCrossEncoder("thầu")
+
+    (top,) = reranker(model, batch_size=3, budget_ms=0).rerank_batch(["q"], [candidates], k=3)
+
+    # Điểm bằng nhau giữ thứ tự tìm kiếm
+    assert [doc.metadata["chunk_index"] for doc in top] == [2, 1, 3]
+    assert [doc.metadata["rerank_score"] for doc in top] == [2.0, 1.0, 1.0]
+    assert "rerank_score" not in candidates[2].metadata
+    assert model.batches == [3, 1]
+
+
+def test_budget_exhausted_between_batches_keeps_retrieval_order():
+    candidates = [docs("a", "thầu", "thầu thầu"), docs("thầu", "b", "c")]
+    model = FakeCrossEncoder("thầu", delay=0.05)
+    instance = reranker(model, batch_size=2, budget_ms=10, stats_window=2)
+
+    results = instance.rerank_batch(["q1", "q2"], candidates, k=2)
+
+    # Lô đầu đã chấm xong thì hết giờ: các lô còn lại không được chấm, thứ tự tìm kiếm được giữ
+    assert model.batches == [2]
+    assert results == [candidates[0][:2], candidates[1][:2]]
+    assert all("rerank_score" not in doc.metadata for result in results for doc in result)
+    assert instance.stats()["fallbacks"] == 1
+    for _ in range(3):
+        instance.rerank_batch(["q"], [docs("x")], k=1)
+    assert len(instance.latencies_ms) == 2
+
+
+def test_search_batch_orders_by_cross_encoder_score(rag, workspace):
+    write_law(str(workspace / "data"), "luat_1.txt", 1)
+    write_law(str(workspace / "data"), "luat_2.txt", 2)
+    rag.build_knowledge_base(str(workspace / "data"))
+    candidates = rag._search(QUESTION, k=10)
+    model = FakeCrossEncoder("nhà thầu")
+    rag.reranker = reranker(model, candidates=10, budget_ms=0)
+
+    reranked = rag._search_batch([QUESTION], k=4)[0]
+
+    # Top-4 theo điểm cross-encoder trong 10 ứng viên tìm kiếm; điểm bằng nhau giữ thứ tự tìm kiếm
+    expected = sorted(candidates, key=lambda doc: -doc.page_content.count("nhà thầu"))[:4]
+    assert [doc.page_content for doc in reranked] == [doc.page_content for doc in expected]
+    assert [doc.page_content for doc in reranked] != [doc.page_content for doc in candidates[:4]]
+    assert [doc.metadata["rerank_score"] for doc in reranked] == [float(doc.page_content.count("nhà thầu")) for doc in expected]
+    assert sum(model.batches) == 10
@@ -0,0 +1,49 @@
+from langchain_core.documents import Document
+
+from legal_rag import LegalRAGSystem
+from synthetic_corpus import write_text_pdf
+
+from conftest import FakeEmbeddings, law_text
+
+QUESTION = "Phạm vi điều chỉnh của Luật số 5 là gì?"
+
+
+def pdf_chunks(rag):
+    store = rag.vector_store
+    return [store.docstore.search(store.index_to_docstore_id[i]) for i in range(store.index.ntotal)]
+
+
+def test_sources_open_at_the_page_of_their_chunk(rag, workspace):
+    write_text_pdf(str(workspace / "data" / "luat.pdf"), law_text(5, articles=25))
+    rag.build_knowledge_base(str(workspace / "data"))
+    chunks = pdf_chunks(rag)
+    assert max(chunk.metadata["page_number"] for chunk in chunks) > 1
+
+    for chunk in chunks:
+        first = chunk.metadata["page_number"]
+        assert rag.source_pages(chunk.metadata) == (first, chunk.metadata.get("page_end", first))
+    # Đoạn ghép từ chunk đầu tới chunk cuối trải từ trang đầu tới trang cuối của file
+    merged = {**chunks[0].metadata, "start_offset": chunks[0].metadata["start_offset"],
+              "end_offset": chunks[-1].metadata["end_offset"]}
+    merged.pop("page_end", None)
+    last = chunks[-1].metadata.get("page_end", chunks[-1].metadata["page_number"])
+    assert rag.related_articles_from([Document(page_content="…", metadata=merged)])[0]["page"] == 1
+    assert rag.related_articles_from([Document(page_content="…", metadata=merged)])[0]["page_end"] == last
+
+    result = rag.query(QUESTION)
+    assert result["sources"] and all(isinstance(source["page"], int) for source in result["sources"])
+
+
+def test_page_table_is_loaded_with_the_index(rag, workspace):
+    write_text_pdf(str(workspace / "data" / "luat.pdf"), law_text(6, articles=25))
+    rag.build_knowledge_base(str(workspace / "data"))
+    loaded = LegalRAGSystem()
+    loaded._embeddings = FakeEmbeddings()
+
+    assert loaded.load_knowledge_base()
+
+    assert loaded.page_offsets == rag.page_offsets and "luat.pdf" in loaded.page_offsets
+    chunk = pdf_chunks(loaded)[-1]
+    # Metadata không còn số trang (ví dụ chunk cũ): số trang vẫn suy ra được từ offset
+    bare = {key: value for key, value in chunk.metadata.items() if key not in ("page_number", "page_end")}
+    assert loaded.source_pages(bare) == rag.source_pages(chunk.metadata)
@@ -0,0 +1,113 @@
+import re
+
+import pytest
+
+from document_processor import LegalDocumentProcessor
+from legal_chunker import parse_structure
+from synthetic_corpus import _pages, write_text_pdf
+
+from conftest import law_text
+
+
+def non_space(text: str) -> str:
+    return re.sub(r"\s+", "", text)
+
+
+def page_table(pages):
+    """[số trang, offset đầu, offset cuối] của các trang có text trong text đã ghép bằng "\n"."""
+    table, offset = [], 0
+    for number, page in enumerate(pages, start=1):
+        if page.strip():
+            table.append([number, offset, offset + len(page)])
+            offset += len(page) + 1
+    return table
+
+
+def counting(pages):
+    """Iterator trang ghi lại số trang đã bị đọc."""
+    state = {"pulled": 0}
+
+    def generate():
+        for page in pages:
+            state["pulled"] += 1
+            yield page
+    return generate(), state
+
+
+@pytest.mark.parametrize("chunker", ["legal", "recursive"])
+def test_streamed_chunks_point_back_into_the_joined_text(monkeypatch, chunker):
+    monkeypatch.setenv("CHUNKER", chunker)
+    pages = _pages(law_text(1, articles=60), 700)
+    processor = LegalDocumentProcessor(file_workers=1)
+    processor.stream_window = 1500
+    table = []
+
+    documents = list(processor.iter_chunks(iter(pages), "luat.pdf", page_table=table))
+
+    joined = "\n".join(pages)
+    assert table == page_table(pages)
+    assert [doc.metadata["chunk_index"] for doc in documents] == list(range(len(documents)))
+    for doc in documents:
+        start, end = doc.metadata["start_offset"], doc.metadata["end_offset"]
+        assert joined[start:end].strip() == doc.page_content[doc.metadata.get("prefix_chars", 0):].strip()
+        first_page = next(number for number, page_start, page_end in table if page_start <= start < page_end + 1)
+        assert doc.metadata["page_number"] == first_page
+        last_page = next(number for number, page_start, page_end in table if page_start <= end - 1 < page_end + 1)
+        assert doc.metadata.get("page_end", first_page) == last_page
+    if chunker == "legal":
+        # Không overlap và không mất nội dung điều nào dù bị cắt ở ranh giới cửa sổ
+        articles, first_heading = parse_structure(joined)
+        covered = "".join(joined[d.metadata["start_offset"]:d.metadata["end_offset"]] for d in documents)
+        assert non_space(covered) == non_space(joined[:first_heading] + "".join(joined[a.start:a.end] for a in articles))
+
+
+def test_chunks_are_yielded_before_the_last_page_is_read():
+    pages = _pages(law_text(2, articles=80), 600)
+    processor = LegalDocumentProcessor(file_workers=1)
+    processor.stream_window = 2000
+    page_iter, state = counting(pages)
+
+    chunks = processor.iter_chunks(page_iter, "luat.pdf")
+    next(chunks)
+
+    assert state["pulled"] < len(pages) // 4
+    remaining = list(chunks)
+    assert state["pulled"] == len(pages) and remaining
+
+
+def test_unsplit_buffer_stays_bounded(monkeypatch):
+    pages = _pages(law_text(3, articles=150), 800)
+    processor = LegalDocumentProcessor(file_workers=1)
+    processor.stream_window = 3000
+    sizes = []
+    split_stream = processor._split_stream
+
+    def recording(text, state, final):
+        sizes.append(len(text))
+        return split_stream(text, state, final)
+
+    monkeypatch.setattr(processor, "_split_stream", recording)
+    list(processor.iter_chunks(iter(pages), "luat.pdf"))
+
+    assert len(sizes) > 10
+    assert max(sizes) <= 4 * processor.stream_window + max(len(page) for page in pages)
+
+
+def test_large_pdf_is_streamed_with_page_numbers(tmp_path):
+    text = law_text(4, articles=25)
+    path = str(tmp_path / "luat.pdf")
+    write_text_pdf(path, text)
+    processor = LegalDocumentProcessor(file_workers=1)
+    _, pages = processor.read_pdf(path, return_pages=True)
+
+    eager = processor.process_file(path)
+    processor.stream_min_bytes = 0
+    (source, _, _, lazy_pages, error), = processor.extract_many([("luat.pdf", path)])
+    streamed = list(processor.iter_chunks(lazy_pages, source))
+
+    assert error is None and not isinstance(lazy_pages, list)
+    assert [(d.page_content, d.metadata) for d in streamed] == [(d.page_content, d.metadata) for d in eager]
+    assert len(pages) > 3 and eager[-1].metadata["page_number"] > 1
+    for doc in streamed:
+        first_line = doc.page_content[doc.metadata.get("prefix_chars", 0):].strip().split("\n")[0]
+        assert non_space(first_line) in non_space(pages[doc.metadata["page_number"] - 1])
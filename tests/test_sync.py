@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+
+import kb_manifest
+import legal_rag
+from document_processor import LegalDocumentProcessor
+from legal_rag import LegalRAGSystem
+
+from conftest import FakeEmbeddings, write_law
+
+
+def chunk_texts(path: str, source: str) -> list:
+    return [doc.page_content for doc in LegalDocumentProcessor(file_workers=1).process_file(path, source)]
+
+
+def stored_chunks(system: LegalRAGSystem) -> dict:
+    """{id: (text, metadata, vector)} của index đang phục vụ."""
+    store = system.vector_store
+    chunks = {}
+    for position, doc_id in store.index_to_docstore_id.items():
+        document = store.docstore.search(doc_id)
+        chunks[doc_id] = (document.page_content, document.metadata, store.index.reconstruct(position))
+    return chunks
+
+
+def test_sync_embeds_only_new_and_changed_files(rag, fake_embeddings, workspace):
+    data = str(workspace / "data")
+    write_law(data, "a.txt", 1)
+    write_law(data, "b.txt", 2)
+    write_law(data, "c.txt", 3)
+    rag.build_knowledge_base(data)
+    before = kb_manifest.load_manifest(legal_rag.VECTORSTORE_PATH)["files"]
+    fake_embeddings.calls.clear()
+
+    b_path = write_law(data, "b.txt", 2, seed=7)
+    os.remove(os.path.join(data, "c.txt"))
+    d_path = write_law(data, "sub/d.txt", 4)
+    summary = rag.sync_knowledge_base(data)
+
+    assert summary == {"mode": "incremental", "added": ["sub/d.txt"], "updated": ["b.txt"],
+                       "removed": ["c.txt"], "unchanged": ["a.txt"]}
+    assert sorted(fake_embeddings.embedded_texts) == sorted(chunk_texts(b_path, "b.txt") + chunk_texts(d_path, "sub/d.txt"))
+
+    files = kb_manifest.load_manifest(legal_rag.VECTORSTORE_PATH)["files"]
+    assert sorted(files) == ["a.txt", "b.txt", "sub/d.txt"]
+    assert files["a.txt"] == before["a.txt"]
+    manifest_ids = {doc_id for entry in files.values() for doc_id in entry["chunk_ids"]}
+    assert set(rag.vector_store.index_to_docstore_id.values()) == manifest_ids
+    assert rag.vector_store.index.ntotal == len(manifest_ids)
+    assert not manifest_ids & set(before["c.txt"]["chunk_ids"])
+    assert not manifest_ids & set(before["b.txt"]["chunk_ids"])
+    sources = {doc.metadata["source"] for doc in rag._search("Điều 1 quy định về nhà thầu", k=20)}
+    assert "c.txt" not in sources
+
+
+def test_sync_result_matches_full_rebuild(rag, workspace, monkeypatch):
+    data = str(workspace / "data")
+    for number in range(1, 5):
+        write_law(data, f"luat_{number}.txt", number)
+    rag.build_knowledge_base(data)
+    write_law(data, "luat_2.txt", 2, seed=3)
+    os.remove(os.path.join(data, "luat_4.txt"))
+    write_law(data, "luat_5.txt", 5)
+    rag.sync_knowledge_base(data)
+
+    # Load lại từ đĩa để so cả phần đã lưu (chunk store, index.faiss)
+    synced = LegalRAGSystem()
+    synced._embeddings = FakeEmbeddings()
+    assert synced.load_knowledge_base()
+    monkeypatch.setattr(legal_rag, "VECTORSTORE_PATH", str(workspace / "rebuilt"))
+    rebuilt = LegalRAGSystem()
+    rebuilt._embeddings = FakeEmbeddings()
+    rebuilt.build_knowledge_base(data)
+
+    synced_chunks, rebuilt_chunks = stored_chunks(synced), stored_chunks(rebuilt)
+    assert synced_chunks.keys() == rebuilt_chunks.keys()
+    for doc_id, (text, metadata, vector) in rebuilt_chunks.items():
+        assert synced_chunks[doc_id][:2] == (text, metadata)
+        np.testing.assert_array_equal(synced_chunks[doc_id][2], vector)
+
+
+def test_sync_without_changes_embeds_nothing(rag, fake_embeddings, workspace):
+    data = str(workspace / "data")
+    path = write_law(data, "a.txt", 1)
+    write_law(data, "b.txt", 2)
+    rag.build_knowledge_base(data)
+    fake_embeddings.calls.clear()
+    index_mtime = os.path.getmtime(os.path.join(legal_rag.VECTORSTORE_PATH, "index.faiss"))
+    # Chỉ đổi mtime: hash giống nên không embed lại, manifest ghi mtime mới
+    os.utime(path, (1_000_000_000, 1_000_000_000))
+
+    summary = rag.sync_knowledge_base(data)
+
+    assert summary["unchanged"] == ["a.txt", "b.txt"] and not summary["added"] + summary["updated"] + summary["removed"]
+    assert fake_embeddings.calls == []
+    assert kb_manifest.load_manifest(legal_rag.VECTORSTORE_PATH)["files"]["a.txt"]["mtime"] == 1_000_000_000
+    assert os.path.getmtime(os.path.join(legal_rag.VECTORSTORE_PATH, "index.faiss")) == index_mtime
+
+
+def test_sync_without_manifest_builds_everything(rag, workspace):
+    data = str(workspace / "data")
+    write_law(data, "a.txt", 1)
+    write_law(data, "b.txt", 2)
+
+    summary = rag.sync_knowledge_base(data)
+
+    assert summary["mode"] == "full" and summary["added"] == ["a.txt", "b.txt"]
+    assert rag.vector_store.index.ntotal == sum(
+        len(entry["chunk_ids"]) for entry in kb_manifest.load_manifest(legal_rag.VECTORSTORE_PATH)["files"].values()
+    )
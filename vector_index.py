@@ -0,0 +1,138 @@
+import os
+import json
+from typing import Optional
+
+import faiss
+import numpy as np
+
+INDEX_PARAMS_FILE = "index_params.json"
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+
+def index_settings() -> dict:
+    """Cấu hình index FAISS lấy từ biến môi trường."""
+    index_type = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported FAISS_INDEX_TYPE '{index_type}'. Use one of: {', '.join(INDEX_TYPES)}.")
+    return {
+        "type": index_type,
+        "nlist": int(os.getenv("FAISS_NLIST", "1024")),
+        "nprobe": int(os.getenv("FAISS_NPROBE", "16")),
+        "pq_m": int(os.getenv("FAISS_PQ_M", "16")),
+        "pq_nbits": int(os.getenv("FAISS_PQ_NBITS", "8")),
+        "hnsw_m": int(os.getenv("FAISS_HNSW_M", "32")),
+        "ef_construction": int(os.getenv("FAISS_EF_CONSTRUCTION", "80")),
+        "ef_search": int(os.getenv("FAISS_EF_SEARCH", "64")),
+        "train_size": int(os.getenv("FAISS_TRAIN_SIZE", "20000")),
+    }
+
+
+def training_size(settings: dict) -> int:
+    """Số vector cần gom trước khi tạo index (0 nếu index không cần train)."""
+    return settings["train_size"] if settings["type"] in ("ivf_flat", "ivf_pq") else 0
+
+
+class ReservoirSample:
+    """Mẫu ngẫu nhiên đều (reservoir sampling) gồm tối đa `size` vector trên toàn bộ luồng vector.
+
+    Dùng để train IVF khi vector được sinh ra theo batch: mỗi vector đã thấy đều có cùng xác suất
+    nằm trong mẫu, kể cả khi corpus lớn hơn nhiều so với mẫu (không lệch về các file đầu tiên).
+    """
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+        self._sample: Optional[np.ndarray] = None
+
+    def add(self, vectors) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        if self._sample is None:
+            self._sample = np.empty((self.size, vectors.shape[1]), dtype=np.float32)
+        # Điền cho đủ mẫu trước, sau đó vector thứ t (đếm từ 0) thay vào vị trí j ~ U[0, t] nếu j < size
+        fill = max(0, min(self.size - self.seen, len(vectors)))
+        self._sample[self.seen:self.seen + fill] = vectors[:fill]
+        positions = np.arange(self.seen + fill, self.seen + len(vectors))
+        slots = self._rng.integers(0, positions + 1) if len(positions) else positions
+        for row, slot in zip(range(fill, len(vectors)), slots):
+            if slot < self.size:
+                self._sample[slot] = vectors[row]
+        self.seen += len(vectors)
+
+    def sample(self) -> np.ndarray:
+        if self._sample is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._sample[:min(self.seen, self.size)]
+
+
+def _pq_subquantizers(dim: int, requested: int) -> int:
+    # PQ yêu cầu số sub-quantizer chia hết số chiều
+    for m in range(min(requested, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def create_index(settings: dict, dim: int, training_vectors: Optional[np.ndarray] = None):
+    """Tạo index FAISS rỗng theo cấu hình; IVF được train trên mẫu vector của corpus."""
+    index_type = settings["type"]
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, settings["hnsw_m"])
+        index.hnsw.efConstruction = settings["ef_construction"]
+        apply_search_params(index, settings)
+        return index
+
+    if training_vectors is None or len(training_vectors) == 0:
+        raise ValueError(f"{index_type} index needs training vectors.")
+    training_vectors = np.ascontiguousarray(training_vectors, dtype=np.float32)
+    # FAISS cần khoảng 39 điểm train cho mỗi centroid
+    nlist = max(1, min(settings["nlist"], len(training_vectors) // 39))
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+    else:
+        nbits = settings["pq_nbits"]
+        # Mỗi codebook PQ cần ít nhất 2^nbits điểm train
+        while nbits > 4 and len(training_vectors) < (1 << nbits):
+            nbits -= 1
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim, settings["pq_m"]), nbits)
+    index.train(training_vectors)
+    apply_search_params(index, settings)
+    return index
+
+
+def apply_search_params(index, settings: dict):
+    """Áp nprobe/efSearch (không được lưu trong index.faiss nên phải áp lại khi load)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(settings["nprobe"], ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings["ef_search"]
+
+
+def supports_removal(index) -> bool:
+    # HNSW của FAISS không hỗ trợ remove_ids
+    return not isinstance(index, faiss.IndexHNSW)
+
+
+def save_params(vectorstore_path: str, settings: dict):
+    with open(os.path.join(vectorstore_path, INDEX_PARAMS_FILE), "w", encoding="utf-8") as file:
+        json.dump(settings, file, indent=2)
+
+
+def load_params(vectorstore_path: str) -> Optional[dict]:
+    """Đọc cấu hình index đã lưu; FAISS_NPROBE/FAISS_EF_SEARCH trong env được ưu tiên."""
+    try:
+        with open(os.path.join(vectorstore_path, INDEX_PARAMS_FILE), "r", encoding="utf-8") as file:
+            settings = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if os.getenv("FAISS_NPROBE"):
+        settings["nprobe"] = int(os.environ["FAISS_NPROBE"])
+    if os.getenv("FAISS_EF_SEARCH"):
+        settings["ef_search"] = int(os.environ["FAISS_EF_SEARCH"])
+    return settings